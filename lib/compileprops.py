@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Compiles a properties file into the memory-mapped format read by
+# dbdoc.props.CompiledProperties, which the doc generators accept in
+# place of the text file
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import dbdoc.props
+import getopt, sys, os
+
+def usage_exit(progname, msg=None):
+    if msg:
+        print msg
+        print
+    print "usage: %s propsfile compiledfile" % progname
+    sys.exit(2)
+
+def main(argv):
+    progname = os.path.basename(argv[0])
+    try:
+        opts, args = getopt.getopt(argv[1:], 'h', ['help'])
+        for opt, value in opts:
+            if opt in ('-h','--help'):
+                usage_exit(progname)
+    except getopt.error, e:
+        usage_exit(progname, e)
+    if len(args) != 2:
+        usage_exit(progname)
+
+    props_file, compiled_file = args
+    properties = dbdoc.props.Properties()
+    f = open(props_file, 'r')
+    try:
+        properties.load(f)
+    finally:
+        f.close()
+    properties.save_compiled(compiled_file)
+    print "compiled %d properties into %s" % (len(properties), compiled_file)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
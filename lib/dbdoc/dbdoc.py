@@ -6,7 +6,8 @@
 #
 
 #
-# Generates HTML information from a schema and a properties file
+# Generates documentation from a schema and a properties file, as HTML
+# or in the format of another renderer (see render.py)
 #
 
 #
@@ -17,182 +18,587 @@
 #   table.<tablename>.notes
 #   table.<tablename>.column.<columnname>.shortdesc
 #   table.<tablename>.index.<indexname>.shortdesc
+# Keys are not case-sensitive.  The file may also be one compiled by
+# compileprops.py.
 #
 
-import props, os, string, datetime
+import descriptions, erdiagram, fkgraph, render, spool, stats, progress, os, string, time, datetime, hashlib, itertools, multiprocessing, json
 
 class StandardDoclet:
-    heading_bg_colour = "#CCCCFF" # like javadoc...
+    # Change this whenever the pages' contents change, so that incremental
+    # runs know to regenerate every page
+    page_format = 4
+    manifest_name = '.dbdoc-manifest'
+    # Symbol index entries held in memory before being spilled to disk
+    index_spool_size = 100000
+    # Pages too big to build in memory are written in blocks of this size
+    page_block_size = 1 << 20
+    # Most tables listed as indirect dependencies or dependents on a page
+    dependency_list_size = 20
+    # Groups of more tables than this joined by foreign keys are drawn as a
+    # diagram of clusters of tables, each with a diagram of its own
+    diagram_cluster_size = 50
+    # Most referred-to and referring tables drawn in a table page's diagram
+    neighbourhood_size = 10
 
-    def __init__(self, schema, outdir, descr_file, tables=None):
+    def __init__(self, schema, outdir, descr_file, tables=None, incremental=0,
+                 jobs=1, atomic=0, renderer=render.HTMLRenderer):
+        """renderer is the render.Renderer class that gives the pages their
+           format.
+
+           If incremental is true, pages whose content would not change
+           since the last incremental run into outdir are left alone, and
+           pages for tables that no longer exist are removed.  When only
+           some tables are documented, the schema may not know about the
+           others, so no pages are removed and those written before are
+           kept in the manifest.
+
+           If jobs is more than 1, table pages are rendered by that many
+           forked worker processes (where the platform supports fork).
+
+           If atomic is true, each page is written to a temporary file and
+           renamed into place.
+
+           If the schema has an iter_tables() method (see
+           introspect.SchemaStream), its tables are read, written and
+           dropped one at a time, in a single process, so that only their
+           names and foreign keys are held for the whole run.
+        """
         self.outdir = outdir
+        self.incremental = incremental
+        self.jobs = jobs
+        self.atomic = atomic
         self.descr_file = descr_file
-        self.descs = props.Properties()
+        self.subset = bool(tables)
         if descr_file:
-            f = open(descr_file, 'r')
-            self.descs.load(f)
-            f.close()
+            self.descs = stats.timed('phase', 'load descriptions',
+                                     descriptions.load_file, descr_file)
+        else:
+            self.descs = descriptions.Descriptions()
         self.schema = schema
-        if not tables:
-            self.tables = sorted(schema.get_tables(), None, lambda t: t.name)
+        if hasattr(schema, 'iter_tables'):
+            self.tables = None
+            self.table_names = schema.get_table_names()
+            if tables:
+                known = dict.fromkeys(self.table_names)
+                for tablename in tables:
+                    if not known.has_key(tablename):
+                        raise ValueError, "no such table in schema: %s" % tablename
         else:
-            self.tables = []
-            for tablename in tables:
-                table = schema.get_table(tablename)
-                if not table:
-                    raise ValueError, "no such table in schema: %s" % tablename
-                self.tables.append(table)
-        self._get_fkeys()
-        self._index_items = []  # list of (name, descr, href) tuples
-        self._schema_name = self._get_desc('schema.name', None) or \
+            if not tables:
+                self.tables = sorted(schema.get_tables(), None, lambda t: t.name)
+            else:
+                self.tables = []
+                for tablename in tables:
+                    table = schema.get_table(tablename)
+                    if not table:
+                        raise ValueError, "no such table in schema: %s" % tablename
+                    self.tables.append(table)
+            self.table_names = [table.name for table in self.tables]
+        stats.timed('phase', 'foreign keys', self._get_fkeys)
+        stats.timed('phase', 'plan diagrams', self._plan_diagrams)
+        # (lowercased name, name, descr, href) for every symbol
+        self._index_spool = spool.SortSpool(self.index_spool_size)
+        self._schema_name = self.descs.get_schema('name') or \
                             self.schema.name
+        self.renderer = renderer(self._schema_name)
+        self._extension = self.renderer.extension
         self._generate_pages()
 
     def _get_fkeys(self):
         self._fkeys = {}
+        builder = fkgraph.GraphBuilder(self.table_names)
+        for table, col, other_table, other_col in self._foreign_keys():
+            refs = self._fkeys.get(other_table, None)
+            if not refs:
+                self._fkeys[other_table] = refs = []
+            refs.append((table, col))
+            builder.add(table, other_table)
+        for refs in self._fkeys.values():
+            refs.sort()
+        self._fkgraph = builder.graph()
+
+    def _plan_diagrams(self):
+        """Find the groups of tables joined by foreign keys, each of which
+           gets a diagram, splitting big groups into clusters, and note
+           which diagram each table is in
+        """
+        self._diagrams = []     # (diagram name, table names, clusters or None)
+        self._diagram_of = {}   # {table name: diagram name}
+        self._undrawn = 0       # tables with no foreign keys
+        graph = self._fkgraph
+        for names in graph.components():
+            if len(names) == 1 and not graph.references(names[0]):
+                self._undrawn = self._undrawn + 1
+                continue
+            name = 'component-%s' % names[0]
+            if len(names) <= self.diagram_cluster_size:
+                self._diagrams.append((name, names, None))
+                for tablename in names:
+                    self._diagram_of[tablename] = name
+            else:
+                clusters = erdiagram.clusters(graph, names,
+                                              self.diagram_cluster_size)
+                self._diagrams.append((name, names, clusters))
+                for cluster in clusters:
+                    for tablename in cluster:
+                        self._diagram_of[tablename] = 'cluster-%s' % cluster[0]
+
+    def _foreign_keys(self):
+        """Return (table, column, referenced table, referenced column) for
+           every foreign key.  Schemas that can list their foreign keys
+           directly don't need to build every table to find them, which
+           matters when only a few tables are being documented.
+        """
+        if hasattr(self.schema, 'get_foreign_keys'):
+            return self.schema.get_foreign_keys()
+        fkeys = []
         for table in self.schema.get_tables():
             for col in table.get_columns():
                 if col.references:
                     other_table, other_col = col.references
-                    refs = self._fkeys.get(other_table, None)
-                    if not refs:
-                        self._fkeys[other_table] = refs = []
-                    refs.append((table.name, col.name))
-
-    def _get_desc(self, str, default):
-        return self.descs.get(string.lower(str), default)
-
-    def _standard_header(self, title, nav):
-        return '''<html><head><title>DBDoc: %s (%s)</title></head>
-        <body bgcolor="#ffffff">
-        <table width="100%%" border=0>
-        <tr><td align="left"><small>%s</small></td>
-        <td align="right"><strong>%s</strong></td></tr></table>\n''' % (title, self._schema_name, nav, self._schema_name)
-
-    def _standard_footer(self):
-        return '''<br><hr size=1 noshade>
-        <small>Generated by <a href="https://github.com/purcell/dbdoc">dbdoc</a>,
-        (c) 2001-%d Steve Purcell</small>\n</body></html>\n''' % (datetime.date.today().year,)
+                    fkeys.append((table.name, col.name, other_table, other_col))
+        return fkeys
 
     def _generate_pages(self):
-        self._generate_table_pages()
-        self._generate_front_page()
-        self._generate_index()
+        stats.timed('phase', 'read manifest', self._read_manifest)
+        stats.timed('phase', 'table pages', self._generate_table_pages)
+        stats.timed('phase', 'front page', self._generate_front_page)
+        stats.timed('phase', 'symbol index', self._generate_index)
+        stats.timed('phase', 'diagrams', self._generate_diagrams)
+        stats.timed('phase', 'foreign key graph', self._write_fkgraph)
+        stats.timed('phase', 'write manifest', self._write_manifest)
+
+    def _read_manifest(self):
+        """Load the page digests recorded by the last incremental run.  A
+           non-incremental run rewrites everything, so it discards them.
+        """
+        self._old_manifest = {}
+        self._manifest = {}
+        path = os.path.join(self.outdir, self.manifest_name)
+        if not self.incremental:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if not os.path.exists(path):
+            return
+        f = open(path, 'r')
+        for line in f:
+            digest, filename = string.split(line.rstrip('\n'), ' ', 1)
+            self._old_manifest[filename] = digest
+        f.close()
+
+    def _write_manifest(self):
+        if not self.incremental:
+            return
+        for filename, digest in self._old_manifest.items():
+            if self._manifest.has_key(filename):
+                continue
+            if self.subset:
+                self._manifest[filename] = digest
+                continue
+            path = os.path.join(self.outdir, filename)
+            if os.path.exists(path):
+                progress.reporter.message("removing %s" % filename)
+                os.remove(path)
+        path = os.path.join(self.outdir, self.manifest_name)
+        f = open(path + '.tmp', 'w')
+        for filename, digest in sorted(self._manifest.items()):
+            f.write('%s %s\n' % (digest, filename))
+        f.close()
+        os.rename(path + '.tmp', path)
+
+    def _page_needed(self, filename, inputs):
+        """Record a digest of everything that goes into a page, and return
+           true unless that page is already on disk with the same digest.
+           Only used in incremental mode.
+        """
+        digest = self._page_digest(inputs)
+        self._manifest[filename] = digest
+        return self._page_changed(filename, digest)
+
+    def _page_digest(self, inputs):
+        "Digest the given page-specific inputs plus the common page layout"
+        common = (self.__class__.__name__, self.page_format,
+                  self.renderer.layout(), self._schema_name,
+                  datetime.date.today().year)
+        return hashlib.md5(repr((common, inputs))).hexdigest()
+
+    def _page_changed(self, filename, digest):
+        return (self._old_manifest.get(filename) != digest or
+                not os.path.exists(os.path.join(self.outdir, filename)))
+
+    def _table_page_inputs(self, table):
+        columns = [(col.name, col.type, col.length, col.nullable,
+                    col.default_value, col.references)
+                   for col in table.get_columns()]
+        indexes = [(index.name, index.unique, list(index.get_column_names()))
+                   for index in table.get_indexes()]
+        refs = self._fkeys.get(table.name, [])
+        ref_descs = [self.descs.get_table(other_table).get_column(other_col, 'shortdesc')
+                     for other_table, other_col in refs]
+        diagram = self._neighbourhood_diagram(table.name)
+        return (table.name, table.primary_key_name, columns, indexes,
+                refs, ref_descs, self._table_dependencies(table.name),
+                diagram and diagram.digest(), self._diagram_of.get(table.name),
+                self.descs.get_table(table.name).items())
+
+    def _table_dependencies(self, tablename):
+        """Return ((dependencies, complete), (dependents, complete),
+           (cycle, cycle size) or None) for a table page, as from the
+           foreign key graph.  A table's place in the load order depends on
+           every other table, so it is left to fkgraph.json rather than
+           shown on (and rewriting) every page when any table is added.
+        """
+        graph = self._fkgraph
+        return (graph.dependencies(tablename, self.dependency_list_size),
+                graph.dependents(tablename, self.dependency_list_size),
+                graph.cycle_of(tablename, self.dependency_list_size))
+
+    def _neighbourhood_diagram(self, tablename):
+        "Return the Diagram for a table page, or None if it has no foreign keys"
+        if not self._diagram_of.has_key(tablename):
+            return None
+        return erdiagram.neighbourhood_diagram(self._fkgraph, tablename,
+                                               self.neighbourhood_size, '',
+                                               self._extension)
+
+    def _table_index_items(self, table):
+        page = "table-%s%s" % (table.name, self._extension)
+        items = [(table.name, "table", page)]
+        for col in table.get_columns():
+            items.append((col.name, "column in table %s" % table.name,
+                          "%s#col-%s" % (page, col.name)))
+        for index in table.get_indexes():
+            items.append((index.name, "index on table %s" % table.name,
+                          "%s#ind-%s" % (page, index.name)))
+        return items
 
     def _href_to_column(self, tablename, columnname):
-        return "table-%s.html#col-%s" % (tablename, columnname)
+        return "table-%s%s#col-%s" % (tablename, self._extension, columnname)
 
     def _generate_table_pages(self):
-        for table in self.tables:
-            print "doing table", table.name
-            tablefilename = os.path.join(self.outdir, "table-%s.html" % table.name)
-            self._index_items.append((table.name, "table", "table-%s.html" % table.name))
-            f = open(tablefilename, 'w')
-            nav = '<a href="index.html">Table index</a> | <a href="symbol-index.html">Symbol index</a> | %s' % table.name
-            f.write(self._standard_header(table.name, nav))
-            f.write('<h1>Table %s</h1>\n' % table.name)
-            f.write('<hr noshade size=1>\n')
-            shortdesc = self._get_desc('table.%s.shortdesc' % table.name, None)
-            if shortdesc:
-                f.write('<p>%s</p>\n' % shortdesc)
-            notes = self._get_desc('table.%s.notes' % table.name, None)
-            if notes:
-                f.write('<h2>Notes</h2>\n')
-                f.write(notes) # allows html
-            f.write('<h2>Columns</h2>\n')
-            f.write('<table border=1>\n<tr bgcolor="%s"><th>Column</th><th>Type</th><th>Nullable</th><th>Default</th><th>Description</th></tr>\n' % self.heading_bg_colour)
-            for col in table.get_columns():
-                self._index_items.append((col.name, "column in table %s" % table.name,
-                                          "table-%s.html#col-%s" % (table.name, col.name)))
-                f.write('<tr>')
-                pkey = (col.name == table.primary_key_name)
-                if pkey:
-                    name_str = '<strong>%s</strong>' % col.name
-                else:
-                    name_str = col.name
-                if col.references is not None:
-                    other_table, other_col = col.references
-                    f.write('<td><a href="table-%s.html#col-%s">%s</a></td>' % (other_table, other_col, name_str))
-                else:
-                    f.write('<td>%s</td>' % name_str)
-                f.write('<td>%s (%s)</td>' % (col.type, col.length))
-                f.write('<td>%s</td>' % (col.nullable and 'yes' or 'no'))
-                f.write('<td>%s</td>' % (col.default_value))
-                col_desc = self._get_desc('table.%s.column.%s.shortdesc' % (table.name, col.name), "&nbsp;")
-                f.write('<td>%s</td>' % col_desc)
-                f.write('</tr>\n')
-
-            f.write('</table>\n')
-            if table.primary_key_name:
-                f.write('<p>(primary key column name in <strong>bold</strong>)</p>\n')
-
-            f.write('<h2>Referenced by</h2>\n')
-            refs = self._fkeys.get(table.name, None)
-            if refs:
-                f.write('<table border=1>\n<tr bgcolor="%s"><th>Table</th><th>Column</th><th>Description</th></tr>\n' % self.heading_bg_colour)
-                for other_table, other_col in refs:
-                    ref_table = self.schema.get_table(other_table)
-                    ref_col = ref_table.get_column(other_col)
-                    col_desc = self._get_desc('table.%s.column.%s.shortdesc' % (other_table, other_col), "&nbsp;")
-                    f.write('<tr><td><a href="table-%s.html">%s</a></td><td>%s</td><td>%s</td></tr>\n' % (other_table, other_table, other_col, col_desc))
-                f.write('</table>\n')
-            else:
-                f.write('<p>None.</p>\n')
-
-            f.write('<h2>Indexes</h2>\n')
-            indexes = table.get_indexes()
-            if indexes:
-                f.write('<table border=1>\n<tr bgcolor="%s"><th>Index name</th><th>Unique</th><th>Columns</th><th>Description</th></tr>\n' % self.heading_bg_colour)
-                for index in indexes:
-                    self._index_items.append((index.name, "index on table %s" % table.name,
-                                              "table-%s.html#ind-%s" % (table.name, index.name)))
-                    descr = self._get_desc('table.%s.index.%s.shortdesc' % (table.name, index.name), '&nbsp;')
-                    uniquestr = index.unique and 'yes' or 'no'
-                    f.write('<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>\n' %
-                            (index.name, uniquestr, string.join(index.get_column_names(), ', '), descr))
-                f.write('</table>\n')
-            else:
-                f.write('<p>None.</p>\n')
+        if self.tables is None:
+            results = itertools.imap(self._process_table, self.schema.iter_tables())
+        elif self.jobs > 1 and len(self.tables) > 1 and hasattr(os, 'fork'):
+            results = self._process_tables_in_pool()
+        else:
+            results = itertools.imap(self._process_table, self.tables)
+        task = progress.reporter.task('table pages', len(self.table_names), 'tables')
+        unchanged = 0
+        for filename, items, digest, written in results:
+            self._index_spool.add_run([(string.lower(item[0]),) + item
+                                       for item in items])
+            if digest:
+                self._manifest[filename] = digest
+            if not written:
+                unchanged = unchanged + 1
+            task.update()
+        task.finish()
+        if unchanged:
+            progress.reporter.message("%d of %d table pages unchanged" %
+                                      (unchanged, len(self.table_names)))
+
+    def _process_tables_in_pool(self):
+        """Yield the results of _process_table for each of self.tables, in
+           order, having shared the tables out in runs between self.jobs
+           worker processes.  The workers are forked, so they inherit this
+           doclet (and the schema) rather than having it pickled to them.
+        """
+        global _pool_doclet
+        _pool_doclet = self
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            n = len(self.tables)
+            run = max(1, min(64, n // (self.jobs * 4)))
+            for results in pool.imap(_process_table_range,
+                                     [(i, min(i + run, n)) for i in range(0, n, run)]):
+                for result in results:
+                    yield result
+        except:
+            pool.terminate()
+            pool.join()
+            _pool_doclet = None
+            raise
+        pool.close()
+        pool.join()
+        _pool_doclet = None
 
-            f.write(self._standard_footer())
+    def _process_table(self, table):
+        """Write the page for table, unless an incremental run finds it
+           unchanged.  Returns a tuple of (page filename, symbol index items
+           for the table, page digest or None if not incremental, whether
+           the page was written), so that it can run in a worker process.
+        """
+        items = self._table_index_items(table)
+        filename = "table-%s%s" % (table.name, self._extension)
+        digest = None
+        if self.incremental:
+            digest = self._page_digest(self._table_page_inputs(table))
+            if not self._page_changed(filename, digest):
+                return filename, items, digest, 0
+        stats.timed('page', filename, self._write_table_page, table, filename)
+        return filename, items, digest, 1
+
+    def _write_table_page(self, table, filename):
+        dependencies, dependents, cycle = self._table_dependencies(table.name)
+        refs = [(other_table, other_col, self.descs.get_table(other_table))
+                for other_table, other_col in self._fkeys.get(table.name, ())]
+        page = render.TablePage(table, self.descs.get_table(table.name), refs,
+                                dependencies, dependents, cycle,
+                                self._neighbourhood_diagram(table.name),
+                                self._diagram_of.get(table.name))
+        self._write_page(filename, [self.renderer.table_page(page)])
+
+    def _write_page(self, filename, chunks):
+        """Write the concatenated chunks of text to filename with a single
+           write() call.  In atomic mode the text goes to a temporary file
+           which is then renamed over filename, so that anything reading
+           the output directory never sees a partly written page.
+        """
+        path = os.path.join(self.outdir, filename)
+        if self.atomic:
+            write_path = '%s.%d.tmp' % (path, os.getpid())
+        else:
+            write_path = path
+        text = string.join(chunks, '')
+        start = time.time()
+        f = open(write_path, 'w', 0) # unbuffered: one write(2) per page
+        try:
+            f.write(text)
+        finally:
             f.close()
+        if self.atomic:
+            os.rename(write_path, path)
+        stats.add('write', filename, start, time.time() - start,
+                  {'bytes': len(text)})
+
+    def _open_page(self, filename):
+        """Return a _PageWriter for writing filename a piece at a time,
+           for pages too big to build in memory
+        """
+        return _PageWriter(self, filename)
 
     def _generate_front_page(self):
-        print "doing front page"
-        f = open(os.path.join(self.outdir, 'index.html'), 'w')
-        nav = 'Table index | <a href="symbol-index.html">Symbol index</a>'
-        f.write(self._standard_header("Table index", nav))
-        f.write('<h1>Table index</h1>\n')
-        f.write('<hr noshade size=1>\n')
-        notes = self._get_desc('schema.notes', None)
-        if notes:
-            f.write('<h2>Notes</h2>\n')
-            f.write(notes)
-        f.write('<h2>Tables</h2>\n')
-        f.write('<table border=1><tr bgcolor="%s"><th>Table</th><th>Summary</th></tr>\n' % self.heading_bg_colour)
-        for table in self.tables:
-            tabledesc = self._get_desc('table.%s.shortdesc' % table.name, "no summary available")
-            f.write('<tr><td><a href="table-%s.html">%s</a></td><td>%s</td></tr>\n' % (table.name, table.name, tabledesc))
-        f.write('</table>')
-        f.write(self._standard_footer())
-        f.close()
+        filename = 'index' + self._extension
+        notes = self.descs.get_schema('notes')
+        if self.incremental:
+            inputs = (notes,
+                      [(name, self.descs.get_table(name).get('shortdesc'))
+                       for name in self.table_names])
+            if not self._page_needed(filename, inputs):
+                return
+        self._write_page(filename, [self.renderer.front_page(
+            notes, self.table_names, self.descs)])
 
     def _generate_index(self):
-        print "doing index of all symbols"
-        f = open(os.path.join(self.outdir, 'symbol-index.html'), 'w')
-        nav = '<a href="index.html">Table index</a> | Symbol index'
-        f.write(self._standard_header("Symbol index", nav))
-        f.write('<h1>Symbol index</h1>\n')
-        f.write('<hr noshade size=1>\n')
-        self._index_items.sort()
-        section_headings_done = {}
-        for item, descr, href in self._index_items:
-            firstchar = item[0]
-            if not section_headings_done.has_key(firstchar):
-                section_headings_done[firstchar] = 1
-                f.write('<h3>%s</h3>\n' % string.upper(firstchar))
-            f.write('<a href="%s">%s</a> (%s)<br>\n' % (href, item, descr))
-        f.write(self._standard_footer())
-        f.close()
+        """Write the symbol index as one page per initial letter, linked
+           from symbol-index.html, along with the search shards used by
+           search.js if the renderer has a search box.  The symbols are
+           merged from the spool and written out a block at a time, so
+           they never all have to be in memory.
+        """
+        search = self.renderer.search
+        search_dir = os.path.join(self.outdir, 'search')
+        if search and not os.path.isdir(search_dir):
+            os.mkdir(search_dir)
+        letters = []    # (initial, page filename, number of symbols)
+        task = progress.reporter.task('symbol index', len(self._index_spool), 'symbols')
+        try:
+            for initial, entries in itertools.groupby(self._index_spool,
+                                                      lambda entry: entry[0][:1]):
+                filename = 'symbol-index-%s%s' % (_search_token(initial),
+                                                  self._extension)
+                page = self._open_page(filename)
+                page.write(self.renderer.symbol_page_start(string.upper(initial)))
+                count = 0
+                for prefix, shard_entries in itertools.groupby(entries,
+                                                               lambda entry: entry[0][:2]):
+                    if search:
+                        token = _search_token(prefix)
+                        shard = self._open_page('search/%s.js' % token)
+                        shard.write('dbdocSearch.load("%s",[' % token)
+                    separator = ''
+                    for block in _blocks(shard_entries, 4096):
+                        block = [entry[1:] for entry in block]
+                        if search:
+                            shard.write(separator + _json_array(block)[1:-1])
+                        separator = ','
+                        page.write(self.renderer.symbol_entries(block, count == 0))
+                        count = count + len(block)
+                        task.update(len(block))
+                    if search:
+                        shard.write(']);\n')
+                        shard.close()
+                page.write(self.renderer.symbol_page_end())
+                page.close()
+                letters.append((initial, filename, count))
+        finally:
+            self._index_spool.close()
+        task.finish()
+        self._write_symbol_index(letters)
+        if search:
+            self._write_search_script()
+
+    def _write_symbol_index(self, letters):
+        filename = 'symbol-index' + self._extension
+        if self.incremental and not self._page_needed(filename, letters):
+            return
+        self._write_page(filename, [self.renderer.symbol_index(letters)])
+
+    def _generate_diagrams(self):
+        """Write an SVG and a DOT diagram of each group of tables joined by
+           foreign keys into the er directory, or for big groups a diagram
+           of their clusters and one of each cluster, and list them on the
+           diagrams page.  Diagrams unchanged since the last run are left
+           alone, without being laid out again.
+        """
+        directory = os.path.join(self.outdir, 'er')
+        if not os.path.isdir(directory):
+            os.mkdir(directory)
+        graph = self._fkgraph
+        cache = erdiagram.LayoutCache(directory)
+        task = progress.reporter.task('diagrams', len(self._diagrams), 'diagrams')
+        for name, names, clusters in self._diagrams:
+            if clusters is None:
+                self._write_diagram(cache, name, erdiagram.table_diagram(
+                    graph, names, names[0], '../', self._extension))
+            else:
+                self._write_diagram(cache, name, erdiagram.cluster_diagram(
+                    graph, clusters, names[0], 'cluster-%s.svg'))
+                for cluster in clusters:
+                    self._write_diagram(cache, 'cluster-%s' % cluster[0],
+                                        erdiagram.table_diagram(
+                                            graph, cluster, cluster[0], '../',
+                                            self._extension))
+            task.update()
+        task.finish()
+        # A subset's diagrams leave out the other tables' groups, which
+        # are still wanted
+        cache.close(self.subset)
+        self._write_diagram_index()
+
+    def _write_diagram(self, cache, name, diagram):
+        if cache.unchanged(name, diagram.digest()):
+            return
+        self._write_page('er/%s.svg' % name, [diagram.svg()])
+        self._write_page('er/%s.dot' % name, [diagram.dot()])
+
+    def _write_diagram_index(self):
+        page = self._open_page('diagrams' + self._extension)
+        page.write(self.renderer.diagrams_page_start(self.diagram_cluster_size))
+        first = 1
+        for name, names, clusters in self._diagrams:
+            page.write(self.renderer.diagram_entry(name, names, clusters, first))
+            first = 0
+        page.write(self.renderer.diagrams_page_end(self._undrawn))
+        page.close()
+
+    def _write_fkgraph(self):
+        """Export the foreign key graph, with the load order and cycles,
+           as fkgraph.json (see fkgraph.FKGraph.to_json)
+        """
+        # Names are treated as Latin-1, as for the search shards
+        text = json.dumps(self._fkgraph.to_json(), separators=(',', ':'),
+                          encoding='latin-1')
+        if self.incremental and not self._page_needed('fkgraph.json', text):
+            return
+        self._write_page('fkgraph.json', [text, '\n'])
+
+    def _write_search_script(self):
+        f = open(os.path.join(os.path.dirname(__file__), 'search.js'), 'r')
+        try:
+            text = f.read()
+        finally:
+            f.close()
+        if self.incremental and not self._page_needed('search.js', text):
+            return
+        self._write_page('search.js', [text])
+
+class _PageWriter:
+    """Writes a page in blocks of about doclet.page_block_size bytes.  In
+       incremental mode the page is written to a temporary file and only
+       kept if its digest shows that it has changed; in atomic mode it is
+       written to a temporary file and renamed into place.
+    """
+
+    def __init__(self, doclet, filename):
+        self.doclet = doclet
+        self.filename = filename
+        self.path = os.path.join(doclet.outdir, filename)
+        if doclet.incremental or doclet.atomic:
+            self.write_path = '%s.%d.tmp' % (self.path, os.getpid())
+        else:
+            self.write_path = self.path
+        self.digest = hashlib.md5()
+        self.file = open(self.write_path, 'w', 0) # unbuffered, as for _write_page
+        self.block = []
+        self.block_size = 0
+        self.write_start = None     # when the first block was written
+        self.write_seconds = 0.0    # time spent writing blocks
+        self.written = 0            # bytes written
+
+    def write(self, text):
+        self.block.append(text)
+        self.block_size = self.block_size + len(text)
+        if self.block_size >= self.doclet.page_block_size:
+            self._flush()
+
+    def _flush(self):
+        text = string.join(self.block, '')
+        self.digest.update(text)
+        start = time.time()
+        if self.write_start is None:
+            self.write_start = start
+        self.file.write(text)
+        self.write_seconds = self.write_seconds + (time.time() - start)
+        self.written = self.written + len(text)
+        self.block = []
+        self.block_size = 0
+
+    def close(self):
+        "Finish the page, and return whether it was written (or left as it was)"
+        try:
+            self._flush()
+        finally:
+            self.file.close()
+        stats.add('write', self.filename, self.write_start, self.write_seconds,
+                  {'bytes': self.written})
+        if self.doclet.incremental and \
+               not self.doclet._page_needed(self.filename, self.digest.hexdigest()):
+            os.remove(self.write_path)
+            return 0
+        if self.write_path != self.path:
+            os.rename(self.write_path, self.path)
+        return 1
+
+def _blocks(iterable, size):
+    "Yield successive lists of up to size items from iterable"
+    iterator = iter(iterable)
+    while 1:
+        block = list(itertools.islice(iterator, size))
+        if not block:
+            return
+        yield block
+
+def _json_array(entries):
+    # Names are treated as Latin-1, so that search.js sees one character
+    # per byte
+    return render.dumps_json(entries, separators=(',', ':'))
+
+def _search_token(prefix):
+    """Return a file name for a lowercased symbol prefix, spelling out any
+       character other than a-z or 0-9 in hex (as search.js does)
+    """
+    return string.join([c in _TOKEN_CHARS and c or '_%02x' % ord(c)
+                        for c in prefix], '')
+
+_TOKEN_CHARS = string.ascii_lowercase + string.digits
+
+_pool_doclet = None # the doclet whose pages pool workers are writing
+
+def _process_table_range(bounds):
+    start, end = bounds
+    return map(_pool_doclet._process_table, _pool_doclet.tables[start:end])
 
 main = StandardDoclet
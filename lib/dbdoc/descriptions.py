@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Indexes the entries of a descriptions properties file by schema, table,
+# column and index, so that doclets can look them up directly instead of
+# building and lowercasing a key string for every cell they render.
+#
+# The recognised keys are
+#   schema.<attribute>
+#   table.<tablename>.<attribute>
+#   table.<tablename>.column.<columnname>.<attribute>
+#   table.<tablename>.index.<indexname>.<attribute>
+# where table names may contain dots.  Keys are case-insensitive: they are
+# lowercased when the file is loaded, and names are lowercased when looked
+# up.  Any other keys are kept, and can still be fetched with get().
+#
+# A compiled properties file (see props.CompiledProperties) is read on
+# demand instead, one table at a time, by CompiledDescriptions.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import string, props
+
+class TableDescriptions(object):
+    "The descriptions of one table and of its columns and indexes"
+    __slots__ = ('attrs', 'columns', 'indexes')
+
+    def __init__(self):
+        self.attrs = {}     # {attribute: value}
+        self.columns = {}   # {lowercased column name: {attribute: value}}
+        self.indexes = {}   # {lowercased index name: {attribute: value}}
+
+    def get(self, attr, default=None):
+        return self.attrs.get(attr, default)
+
+    def get_column(self, column, attr, default=None):
+        attrs = self.columns.get(string.lower(column))
+        if attrs is None:
+            return default
+        return attrs.get(attr, default)
+
+    def get_index(self, index, attr, default=None):
+        attrs = self.indexes.get(string.lower(index))
+        if attrs is None:
+            return default
+        return attrs.get(attr, default)
+
+    def items(self):
+        """Return a sorted list of (kind, name, attribute, value) for every
+           description, kind being 'table', 'column' or 'index'.
+        """
+        items = [('table', None, attr, value)
+                 for attr, value in self.attrs.items()]
+        for kind, named in (('column', self.columns), ('index', self.indexes)):
+            for name, attrs in named.items():
+                for attr, value in attrs.items():
+                    items.append((kind, name, attr, value))
+        items.sort()
+        return items
+
+# Shared by every table that has no descriptions; never modified
+_NO_DESCRIPTIONS = TableDescriptions()
+
+class Descriptions:
+    def __init__(self):
+        self.schema = {}    # {attribute: value}
+        self.tables = {}    # {lowercased table name: TableDescriptions}
+        self.other = {}     # {lowercased key: value} for unrecognised keys
+
+    def load(self, stream):
+        "Read and index the entries of the properties file stream"
+        properties = props.Properties()
+        properties.load(stream)
+        tables = self.tables
+        for key, value in properties.data.iteritems():
+            parts = key.lower().split('.')
+            # Inline the commonest case, a column or index of a table whose
+            # name has no dots, since files can have millions of these
+            if len(parts) == 5 and parts[0] == 'table' and \
+                   parts[2] in ('column', 'index'):
+                descs = tables.get(parts[1])
+                if descs is None:
+                    descs = tables[parts[1]] = TableDescriptions()
+                if parts[2] == 'column':
+                    named = descs.columns
+                else:
+                    named = descs.indexes
+                attrs = named.get(parts[3])
+                if attrs is None:
+                    attrs = named[parts[3]] = {}
+                attrs[parts[4]] = value
+            else:
+                self.add(key, value)
+
+    def add(self, key, value):
+        table, kind, name, attr = _parse_key(string.lower(key))
+        if kind is None:
+            self.other[attr] = value
+        elif kind == 'schema':
+            self.schema[attr] = value
+        else:
+            descs = self.tables.get(table)
+            if descs is None:
+                descs = self.tables[table] = TableDescriptions()
+            if kind == 'table':
+                descs.attrs[attr] = value
+            else:
+                if kind == 'column':
+                    named = descs.columns
+                else:
+                    named = descs.indexes
+                attrs = named.get(name)
+                if attrs is None:
+                    attrs = named[name] = {}
+                attrs[attr] = value
+
+    def get_schema(self, attr, default=None):
+        return self.schema.get(attr, default)
+
+    def get_table(self, table):
+        "Return the TableDescriptions for the named table (possibly empty)"
+        return self.tables.get(string.lower(table), _NO_DESCRIPTIONS)
+
+    def get(self, key, default=None):
+        "Look up a description by its full properties file key"
+        table, kind, name, attr = _parse_key(string.lower(key))
+        if kind is None:
+            return self.other.get(attr, default)
+        elif kind == 'schema':
+            return self.schema.get(attr, default)
+        descs = self.get_table(table)
+        if kind == 'table':
+            return descs.get(attr, default)
+        elif kind == 'column':
+            return descs.get_column(name, attr, default)
+        return descs.get_index(name, attr, default)
+
+class CompiledDescriptions(Descriptions):
+    """Descriptions looked up in a props.CompiledProperties store.  Each
+       table's descriptions are read from the store the first time the
+       table is asked for, so only the documented tables' entries are ever
+       held in memory.
+    """
+    def __init__(self, store):
+        Descriptions.__init__(self)
+        self.store = store
+        for key, value in store.iter_prefix('schema.'):
+            self.add(key, value)
+
+    def get_table(self, table):
+        table = string.lower(table)
+        descs = self.tables.get(table)
+        if descs is None:
+            # The prefix also takes in tables whose names carry on after a
+            # dot, all of whose entries it covers, so they are cached too
+            for key, value in self.store.iter_prefix('table.%s.' % table):
+                self.add(key, value)
+            descs = self.tables.get(table)
+            if descs is None:
+                descs = self.tables[table] = TableDescriptions()
+        return descs
+
+    def get(self, key, default=None):
+        lowered = string.lower(key)
+        if _parse_key(lowered)[1] is None:
+            for other_key, value in self.store.iter_prefix(lowered):
+                if string.lower(other_key) == lowered:
+                    return value
+            return default
+        return Descriptions.get(self, key, default)
+
+def load_file(path):
+    """Return the Descriptions in the properties file at path, which may
+       be a text properties file or a compiled one.
+    """
+    if props.is_compiled(path):
+        return CompiledDescriptions(props.CompiledProperties(path))
+    descs = Descriptions()
+    f = open(path, 'r')
+    try:
+        descs.load(f)
+    finally:
+        f.close()
+    return descs
+
+def _parse_key(key):
+    """Split a lowercased key into (table, kind, name, attribute).  kind is
+       'schema', 'table', 'column' or 'index', or None for a key that is
+       none of those, in which case the attribute is the whole key.
+    """
+    parts = string.split(key, '.')
+    if parts[0] == 'table' and len(parts) >= 3:
+        if len(parts) >= 5 and parts[-3] in ('column', 'index'):
+            return string.join(parts[1:-3], '.'), parts[-3], parts[-2], parts[-1]
+        return string.join(parts[1:-1], '.'), 'table', None, parts[-1]
+    elif parts[0] == 'schema' and len(parts) == 2:
+        return None, 'schema', None, parts[1]
+    return None, None, None, key
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import tempfile, os
+    from StringIO import StringIO
+    text = ('schema.name=Shop\n'
+            'table.orders.shortdesc=Orders\n'
+            'table.Orders.column.Customer_ID.shortdesc=Who\n'
+            'table.orders.index.orders_pk.shortdesc=PK\n'
+            'table.sales.orders.shortdesc=Dotted\n'
+            'table.sales.orders.column.id.shortdesc=Dotted column\n'
+            'Misc.Key=other\n')
+    d = Descriptions()
+    d.load(StringIO(text))
+    _check(d)
+    p = props.Properties()
+    p.load(StringIO(text))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        p.save_compiled(path)
+        _check(load_file(path))
+        d = load_file(path)
+        assert d.get_table('SALES.orders').get_column('ID', 'shortdesc') == 'Dotted column'
+        assert d.get_table('sales').items() == []
+        d.store.close()
+    finally:
+        os.remove(path)
+
+def _check(d):
+    assert d.get_schema('name') == 'Shop'
+    orders = d.get_table('ORDERS')
+    assert orders.get('shortdesc') == 'Orders'
+    assert orders.get_column('customer_id', 'shortdesc') == 'Who'
+    assert orders.get_column('CUSTOMER_ID', 'notes', 'none') == 'none'
+    assert orders.get_index('ORDERS_PK', 'shortdesc') == 'PK'
+    assert d.get_table('sales.orders').get('shortdesc') == 'Dotted'
+    assert d.get_table('sales.orders').get_column('id', 'shortdesc') == 'Dotted column'
+    assert d.get_table('missing').get_column('id', 'shortdesc', 1) == 1
+    assert d.get('table.orders.column.customer_id.shortdesc') == 'Who'
+    assert d.get('TABLE.ORDERS.SHORTDESC') == 'Orders'
+    assert d.get('misc.key') == 'other'
+    assert d.get('schema.notes', 'x') == 'x'
+    assert orders.items() == [('column', 'customer_id', 'shortdesc', 'Who'),
+                              ('index', 'orders_pk', 'shortdesc', 'PK'),
+                              ('table', None, 'shortdesc', 'Orders')]
+
+
+if __name__ == '__main__':
+    test()
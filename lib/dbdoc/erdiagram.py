@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Draws entity-relationship diagrams from the foreign key graph (see
+# fkgraph.py), as SVG laid out here and as Graphviz DOT for anyone who
+# wants to lay them out with dot(1) instead.
+#
+# The layout is a simple layered one which takes time linear in the size
+# of the diagram: each box goes in the row below the lowest of the boxes
+# it refers to (ignoring references which would go back up, as in a
+# cycle), boxes in a row are ordered by the mean position of the boxes
+# they refer to, and wide rows are wrapped.  Big groups of tables are
+# split into clusters (see clusters()) so that no diagram of tables gets
+# too big to read.
+#
+# A LayoutCache remembers the digest of each diagram written into a
+# directory, so that a diagram whose content hasn't changed is neither
+# laid out nor written again.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import hashlib, os, string
+
+# Change this whenever the drawing changes, so that cached diagrams are
+# redrawn
+LAYOUT_VERSION = 1
+
+# Sizes in pixels
+CHAR_WIDTH = 7.5        # of the 12px monospace font
+BOX_HEIGHT = 22
+BOX_PADDING = 8
+BOX_GAP = 16
+ROW_GAP = 48
+MARGIN = 10
+ROW_LENGTH = 8          # boxes in a row before it is wrapped
+HIGHLIGHT = '#CCCCFF'   # like the page headings
+
+class Diagram:
+    """Boxes joined by arrows, each arrow going from a box to one it
+       refers to.  Each box has a sort key which orders it after the boxes
+       it refers to, such as a table's position in the load order.
+    """
+
+    def __init__(self, title, highlight=None):
+        self.title = title
+        self.highlight = highlight  # the node to draw highlighted, if any
+        self.nodes = []
+        self._labels = {}
+        self._hrefs = {}
+        self._keys = {}
+        self._edges = {}        # {(node, referenced node): 1}
+
+    def add_node(self, node, key, label=None, href=None):
+        self.nodes.append(node)
+        self._keys[node] = key
+        self._labels[node] = label or node
+        self._hrefs[node] = href
+
+    def add_edge(self, node, referenced):
+        self._edges[(node, referenced)] = 1
+
+    def digest(self):
+        """Return a digest of everything that goes into the diagram.  Only
+           the relative order of the sort keys counts, so that the digest
+           changes only when the diagram would.
+        """
+        nodes = [(node, self._labels[node], self._hrefs[node])
+                 for node in self._ordered()]
+        return hashlib.md5(repr((LAYOUT_VERSION, self.title, self.highlight,
+                                 nodes, sorted(self._edges.keys())))).hexdigest()
+
+    def layout(self):
+        """Return ({node: (x, y, width)}, width, height), giving the top
+           left corner and width of each node's box
+        """
+        references = {}
+        for node, referenced in self._edges.keys():
+            if node != referenced:
+                references.setdefault(node, []).append(referenced)
+        rank = {}
+        layers = {}
+        for node in self._ordered():
+            r = 0
+            for referenced in references.get(node, ()):
+                if rank.has_key(referenced) and rank[referenced] >= r:
+                    r = rank[referenced] + 1
+            rank[node] = r
+            layers.setdefault(r, []).append(node)
+
+        positions = {}
+        centres = {}
+        def barycentre(node):
+            xs = [centres[referenced] for referenced in references.get(node, ())
+                  if centres.has_key(referenced)]
+            if not xs:
+                return (1, 0)
+            return (0, sum(xs) / len(xs))
+        y = MARGIN
+        width = 0
+        for r in sorted(layers.keys()):
+            layer = sorted(layers[r], None, lambda node: (barycentre(node), node))
+            for start in range(0, len(layer), ROW_LENGTH):
+                x = MARGIN
+                for node in layer[start:start + ROW_LENGTH]:
+                    box_width = int(len(self._labels[node]) * CHAR_WIDTH) + 2 * BOX_PADDING
+                    positions[node] = (x, y, box_width)
+                    centres[node] = x + box_width / 2.0
+                    x = x + box_width + BOX_GAP
+                width = max(width, x - BOX_GAP + MARGIN)
+                y = y + BOX_HEIGHT + ROW_GAP
+        return positions, width, y - ROW_GAP + MARGIN
+
+    def svg(self, standalone=1):
+        """Return the diagram laid out as SVG, as a file of its own or (if
+           standalone is false) for including in an HTML page
+        """
+        positions, width, height = self.layout()
+        out = []
+        w = out.append
+        if standalone:
+            w('<?xml version="1.0" encoding="iso-8859-1"?>\n')
+        w('<svg xmlns="http://www.w3.org/2000/svg" '
+          'xmlns:xlink="http://www.w3.org/1999/xlink" width="%d" height="%d" '
+          'font-family="monospace" font-size="12">\n' % (width, height))
+        w('<title>%s</title>\n' % _escape(self.title))
+        w('<defs><marker id="arrow" markerWidth="8" markerHeight="8" refX="8" '
+          'refY="4" orient="auto"><path d="M0,0 L8,4 L0,8 z"/></marker></defs>\n')
+        for node, referenced in sorted(self._edges.keys()):
+            if node == referenced:
+                continue
+            x1, y1, x2, y2 = _arrow(positions[node], positions[referenced])
+            w('<line x1="%.1f" y1="%d" x2="%.1f" y2="%d" stroke="#666666" '
+              'marker-end="url(#arrow)"/>\n' % (x1, y1, x2, y2))
+        for node in self.nodes:
+            x, y, box_width = positions[node]
+            fill = (node == self.highlight) and HIGHLIGHT or '#FFFFFF'
+            box = ('<rect x="%d" y="%d" width="%d" height="%d" fill="%s" '
+                   'stroke="#000000"/><text x="%d" y="%d">%s</text>' %
+                   (x, y, box_width, BOX_HEIGHT, fill, x + BOX_PADDING,
+                    y + BOX_HEIGHT - 7, _escape(self._labels[node])))
+            href = self._hrefs[node]
+            if href:
+                box = '<a xlink:href="%s">%s</a>' % (_escape(href), box)
+            w(box + '\n')
+        w('</svg>\n')
+        return string.join(out, '')
+
+    def dot(self):
+        "Return the diagram as Graphviz DOT, for laying out with dot(1)"
+        out = []
+        w = out.append
+        w('digraph %s {\n' % _quote(self.title))
+        w('  rankdir=BT;\n')
+        w('  node [shape=box, fontname="monospace", fontsize=12];\n')
+        for node in self.nodes:
+            attributes = ['label=%s' % _quote(self._labels[node])]
+            if self._hrefs[node]:
+                attributes.append('URL=%s' % _quote(self._hrefs[node]))
+            if node == self.highlight:
+                attributes.append('style=filled, fillcolor="%s"' % HIGHLIGHT)
+            w('  %s [%s];\n' % (_quote(node), string.join(attributes, ', ')))
+        for node, referenced in sorted(self._edges.keys()):
+            w('  %s -> %s;\n' % (_quote(node), _quote(referenced)))
+        w('}\n')
+        return string.join(out, '')
+
+    def _ordered(self):
+        return sorted(self.nodes, None, lambda node: (self._keys[node], node))
+
+def table_diagram(graph, names, title, href_prefix='', extension='.html'):
+    """Return a Diagram of the given tables and the references between
+       them, linking to their pages (with the given file extension)
+    """
+    diagram = Diagram(title)
+    wanted = set(names)
+    for name in names:
+        diagram.add_node(name, graph.load_position(name),
+                         href='%stable-%s%s' % (href_prefix, name, extension))
+    for name in names:
+        for referenced in graph.references(name):
+            if referenced in wanted:
+                diagram.add_edge(name, referenced)
+    return diagram
+
+def cluster_diagram(graph, clusters, title, href=None):
+    """Return a Diagram with a box for each cluster (a list of table
+       names), joined wherever a table in one refers to a table in another.
+       The boxes link to href % (first table in the cluster), if given.
+    """
+    diagram = Diagram(title)
+    cluster_of = {}
+    for cluster in clusters:
+        for name in cluster:
+            cluster_of[name] = cluster[0]
+        label = '%s (%d tables)' % (cluster[0], len(cluster))
+        diagram.add_node(cluster[0], min(map(graph.load_position, cluster)),
+                         label, href and href % cluster[0])
+    for cluster in clusters:
+        for name in cluster:
+            for referenced in graph.references(name):
+                other = cluster_of.get(referenced)
+                if other is not None and other != cluster[0]:
+                    diagram.add_edge(cluster[0], other)
+    return diagram
+
+def neighbourhood_diagram(graph, name, limit, href_prefix='', extension='.html'):
+    """Return a Diagram of table name with (up to 'limit' each of) the
+       tables it refers to and the tables that refer to it
+    """
+    diagram = Diagram(name, name)
+    diagram.add_node(name, graph.load_position(name),
+                     href='%stable-%s%s' % (href_prefix, name, extension))
+    added = {name: 1}
+    for neighbours, outwards in ((graph.references(name), 1),
+                                 (graph.referrers(name), 0)):
+        for other in neighbours[:limit]:
+            if not added.has_key(other):
+                added[other] = 1
+                diagram.add_node(other, graph.load_position(other),
+                                 href='%stable-%s%s' % (href_prefix, other,
+                                                         extension))
+            if outwards:
+                diagram.add_edge(name, other)
+            else:
+                diagram.add_edge(other, name)
+    return diagram
+
+def clusters(graph, names, size):
+    """Split a sorted list of table names joined by references into
+       clusters of at most 'size' tables.  Each cluster is grown breadth
+       first from the first table not yet in a cluster, so that most
+       references stay within a cluster.  Returns the clusters as sorted
+       lists of names, in order of their first names.
+    """
+    unassigned = set(names)
+    result = []
+    for root in names:
+        if root not in unassigned:
+            continue
+        unassigned.remove(root)
+        cluster = [root]
+        for name in cluster:
+            if len(cluster) >= size:
+                break
+            for other in graph.references(name) + graph.referrers(name):
+                if other in unassigned:
+                    unassigned.remove(other)
+                    cluster.append(other)
+                    if len(cluster) >= size:
+                        break
+        cluster.sort()
+        result.append(cluster)
+    return result
+
+class LayoutCache:
+    """Remembers the digest of each diagram written into a directory (as
+       name.svg and name.dot), in a file in that directory, so that later
+       runs can leave unchanged diagrams alone and remove unwanted ones
+    """
+    index_name = '.layouts'
+    suffixes = ('.svg', '.dot')
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._old = {}      # {diagram name: digest} from the last run
+        self._new = {}
+        path = os.path.join(directory, self.index_name)
+        if os.path.exists(path):
+            f = open(path, 'r')
+            try:
+                for line in f:
+                    digest, name = string.split(line.rstrip('\n'), ' ', 1)
+                    self._old[name] = digest
+            finally:
+                f.close()
+
+    def unchanged(self, name, digest):
+        """Record that diagram name is wanted with the given digest, and
+           return whether it is already on disk with that digest
+        """
+        self._new[name] = digest
+        if self._old.get(name) != digest:
+            return 0
+        for suffix in self.suffixes:
+            if not os.path.exists(os.path.join(self.directory, name + suffix)):
+                return 0
+        return 1
+
+    def close(self, keep_unwanted=0):
+        """Remove the diagrams no longer wanted (or, if keep_unwanted is
+           true, keep them and their digests), and save the digests
+        """
+        for name, digest in self._old.items():
+            if self._new.has_key(name):
+                continue
+            if keep_unwanted:
+                self._new[name] = digest
+            else:
+                for suffix in self.suffixes:
+                    path = os.path.join(self.directory, name + suffix)
+                    if os.path.exists(path):
+                        os.remove(path)
+        path = os.path.join(self.directory, self.index_name)
+        f = open(path + '.tmp', 'w')
+        try:
+            for name, digest in sorted(self._new.items()):
+                f.write('%s %s\n' % (digest, name))
+        finally:
+            f.close()
+        os.rename(path + '.tmp', path)
+
+def _arrow(box, target):
+    "Return the ends of an arrow from one box (x, y, width) to another"
+    x1, y1, width1 = box
+    x2, y2, width2 = target
+    if y1 > y2:
+        return x1 + width1 / 2.0, y1, x2 + width2 / 2.0, y2 + BOX_HEIGHT
+    if y1 < y2:
+        return x1 + width1 / 2.0, y1 + BOX_HEIGHT, x2 + width2 / 2.0, y2
+    if x1 < x2:
+        return x1 + width1, y1 + BOX_HEIGHT / 2, x2, y2 + BOX_HEIGHT / 2
+    return x1, y1 + BOX_HEIGHT / 2, x2 + width2, y2 + BOX_HEIGHT / 2
+
+def _escape(text):
+    for c in '&<>"':
+        if c in text:
+            break
+    else:
+        return text     # the usual case, and much quicker
+    return string.replace(string.replace(string.replace(string.replace(
+        text, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'), '"', '&quot;')
+
+def _quote(text):
+    return '"%s"' % string.replace(string.replace(text, '\\', '\\\\'), '"', '\\"')
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import fkgraph, tempfile
+    builder = fkgraph.GraphBuilder(['lonely'])
+    for table, referenced in [('order_line', 'orders'), ('order_line', 'product'),
+                              ('orders', 'customer'), ('customer', 'address'),
+                              ('address', 'customer'), ('product', 'product')]:
+        builder.add(table, referenced)
+    graph = builder.graph()
+    names = list(graph.components())[0]
+    diagram = table_diagram(graph, names, 'orders', '../')
+    positions, width, height = diagram.layout()
+    # Referred-to tables are drawn above the tables referring to them
+    assert positions['orders'][1] > positions['customer'][1]
+    assert positions['order_line'][1] > positions['orders'][1]
+    assert positions['order_line'][1] > positions['product'][1]
+    svg = diagram.svg()
+    assert svg.count('<rect ') == 5 and svg.count('<line ') == 5, svg
+    assert '../table-orders.html' in svg
+    assert diagram.dot().count(' -> ') == 6
+
+    # Only the relative order of the keys matters to the digest
+    other = Diagram('orders')
+    for node in diagram.nodes:
+        other.add_node(node, 10 * graph.load_position(node),
+                       href='../table-%s.html' % node)
+    for edge in diagram._edges.keys():
+        other.add_edge(*edge)
+    assert other.digest() == diagram.digest()
+    other.add_edge('orders', 'address')
+    assert other.digest() != diagram.digest()
+
+    assert clusters(graph, names, 2) == [['address', 'customer'],
+                                         ['order_line', 'orders'], ['product']]
+    overview = cluster_diagram(graph, clusters(graph, names, 2), 'orders',
+                               'cluster-%s.svg')
+    assert sorted(overview._edges.keys()) == [('order_line', 'address'),
+                                              ('order_line', 'product')]
+    around = neighbourhood_diagram(graph, 'orders', 10)
+    assert sorted(around.nodes) == ['customer', 'order_line', 'orders']
+    assert HIGHLIGHT in around.svg(0)
+
+    directory = tempfile.mkdtemp()
+    try:
+        cache = LayoutCache(directory)
+        assert not cache.unchanged('a', '1')
+        for name in ('a', 'b'):
+            for suffix in LayoutCache.suffixes:
+                open(os.path.join(directory, name + suffix), 'w').close()
+        cache.unchanged('b', '2')
+        cache.close()
+        cache = LayoutCache(directory)
+        assert cache.unchanged('a', '1') and not cache.unchanged('c', '3')
+        cache.close()
+        assert sorted(os.listdir(directory)) == [LayoutCache.index_name,
+                                                 'a.dot', 'a.svg']
+        LayoutCache(directory).close(keep_unwanted=1)
+        assert LayoutCache(directory).unchanged('a', '1')
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    test()
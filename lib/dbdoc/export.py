@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Exports a schema as newline-delimited JSON (NDJSON): one record per
+# table, on a line of its own, for loading into a warehouse or data
+# catalog.  Every record has the same keys:
+#
+#   schema, table, primary_key, shortdesc, notes,
+#   columns: [{name, position, type, length, nullable, default,
+#              references: {table, column} or null, shortdesc}],
+#   indexes: [{name, unique, columns, shortdesc}]
+#
+# Tables are written as they are read, so with a schema stream (see
+# introspect.SchemaStream) only one batch of tables is ever in memory.
+# The output is plain ASCII (anything else is \u-escaped), optionally
+# gzip-compressed.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import progress, stats, render, json, gzip, os, sys, time
+
+def table_record(table, descs, schema_name):
+    """Return the export record (a dict) for table, given its
+       descriptions.TableDescriptions
+    """
+    columns = []
+    position = 0
+    for col in table.get_columns():
+        position = position + 1
+        references = None
+        if col.references is not None:
+            references = {'table': col.references[0],
+                          'column': col.references[1]}
+        columns.append({'name': col.name, 'position': position,
+                        'type': col.type, 'length': col.length,
+                        'nullable': bool(col.nullable),
+                        'default': col.default_value,
+                        'references': references,
+                        'shortdesc': descs.get_column(col.name, 'shortdesc')})
+    indexes = [{'name': index.name, 'unique': bool(index.unique),
+                'columns': list(index.get_column_names()),
+                'shortdesc': descs.get_index(index.name, 'shortdesc')}
+               for index in table.get_indexes()]
+    return {'schema': schema_name, 'table': table.name,
+            'primary_key': table.primary_key_name,
+            'shortdesc': descs.get('shortdesc'), 'notes': descs.get('notes'),
+            'columns': columns, 'indexes': indexes}
+
+def iter_tables(schema, table_names=None):
+    """Yield the tables of schema (or those named) in name order, a batch
+       at a time if it is a schema stream
+    """
+    if hasattr(schema, 'iter_tables'):
+        # A stream restricted to table_names was created with them
+        return schema.iter_tables()
+    if table_names:
+        return (schema.get_table(name) for name in sorted(table_names))
+    return iter(sorted(schema.get_tables(), None, lambda t: t.name))
+
+def write_ndjson(f, schema, descs, table_names=None):
+    """Write a record for each table of schema (or those named) to the
+       file object f, and return the number of tables written
+    """
+    schema_name = descs.get_schema('name') or schema.name
+    if hasattr(schema, 'get_table_names'):
+        total = len(schema.get_table_names())
+    elif table_names:
+        total = len(table_names)
+    else:
+        total = None
+    task = progress.reporter.task('export', total, 'tables')
+    count = 0
+    start = time.time()
+    written = 0
+    for table in iter_tables(schema, table_names):
+        if table is None:
+            continue
+        record = table_record(table, descs.get_table(table.name), schema_name)
+        line = render.dumps_json(record, separators=(',', ':')) + '\n'
+        f.write(line)
+        written = written + len(line)
+        count = count + 1
+        task.update()
+    task.finish()
+    stats.add('write', 'export', start, time.time() - start,
+              {'bytes': written, 'tables': count})
+    return count
+
+def export(path, schema, descs, table_names=None, compress=0):
+    """Write the NDJSON export of schema to path ('-' for standard
+       output), gzip-compressed if compress is true or path ends in .gz,
+       and return the number of tables written.  A file is written under
+       a temporary name and renamed into place when complete.
+    """
+    compress = compress or path.endswith('.gz')
+    if path == '-':
+        out = sys.stdout
+        tmp_path = None
+    else:
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        out = open(tmp_path, 'wb')
+    try:
+        try:
+            if compress:
+                # mtime=0 so that an unchanged schema gives an identical file
+                f = gzip.GzipFile(os.path.basename(path), 'wb', 6, out, 0)
+            else:
+                f = out
+            count = write_ndjson(f, schema, descs, table_names)
+            if compress:
+                f.close()
+        finally:
+            if tmp_path:
+                out.close()
+    except:
+        if tmp_path:
+            os.remove(tmp_path)
+        raise
+    if tmp_path:
+        os.rename(tmp_path, path)
+    else:
+        out.flush()
+    return count
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import fakedb, pgschema, descriptions, tempfile, StringIO
+    catalog = fakedb.SyntheticCatalog('postgres', 30, 6, indexes=2)
+    schema = pgschema.PostgresSchema(fakedb.connect(catalog), 'test')
+    descs = descriptions.Descriptions()
+    descs.add('schema.name', 'shop')
+    descs.add('table.tab_000003.shortdesc', 'Caf\xe9s')
+    descs.add('table.tab_000003.column.id.shortdesc', 'Key')
+    progress.reporter = progress.Quiet()
+
+    f = StringIO.StringIO()
+    assert write_ndjson(f, schema, descs) == 30
+    lines = f.getvalue().split('\n')
+    assert lines[-1] == '' and len(lines) == 31
+    records = map(json.loads, lines[:-1])
+    assert [r['table'] for r in records] == sorted([r['table'] for r in records])
+    record = records[3]
+    assert record['table'] == 'tab_000003' and record['schema'] == 'shop'
+    assert record['shortdesc'] == u'Caf\xe9s', record['shortdesc']
+    assert record['columns'][0]['shortdesc'] == 'Key'
+    assert record['columns'][0]['position'] == 1
+    table = schema.get_table('tab_000003')
+    assert len(record['indexes']) == len(table.get_indexes()) > 0
+    for col, exported in zip(table.get_columns(), record['columns']):
+        assert exported['name'] == col.name and exported['type'] == col.type
+        if col.references:
+            assert exported['references'] == {'table': col.references[0],
+                                               'column': col.references[1]}
+    assert sorted(record.keys()) == sorted(records[0].keys())
+    for line in lines:
+        line.decode('ascii')
+
+    stream = pgschema.PostgresSchemaStream(fakedb.connect(catalog), 'test',
+                                           batch_size=7)
+    f = StringIO.StringIO()
+    assert write_ndjson(f, stream, descs) == 30
+    assert f.getvalue() == '\n'.join(lines)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'schema.ndjson.gz')
+        assert export(path, schema, descs, ['tab_000003', 'tab_000001']) == 2
+        data = gzip.open(path).read()
+        assert data.split('\n')[0] == lines[1], data
+        first = open(path, 'rb').read()
+        export(path, schema, descs, ['tab_000003', 'tab_000001'])
+        assert open(path, 'rb').read() == first
+        assert os.listdir(directory) == ['schema.ndjson.gz']
+        class Broken:
+            name = 'broken'
+            def get_tables(self):
+                raise RuntimeError, "lost the connection"
+        try:
+            export(os.path.join(directory, 'broken.ndjson'), Broken(), descs)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError, "no error from a broken schema"
+        assert os.listdir(directory) == ['schema.ndjson.gz']
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    test()
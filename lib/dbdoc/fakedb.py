@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# A minimal in-process DB API 2.0 driver for exercising the schema
+# implementations without a database.  Query results come from a
+# 'responder' function, and an artificial latency can be injected to
+# mimic the round trip to a remote server.
+#
+# SyntheticCatalog is a responder which answers the catalog queries issued
+# by pgschema and oraschema with a made-up schema of any size, generating
+# each table's rows when they are asked for.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import time, itertools, random, re, string, zlib
+
+apilevel = '2.0'
+threadsafety = 1
+paramstyle = 'pyformat'
+
+class Error(StandardError): pass
+class InterfaceError(Error): pass
+
+def no_rows(querystr):
+    return ()
+
+def connect(responder=no_rows, latency=0.0, fetch_latency=0.0):
+    """Return a connection whose cursors answer each executed query with
+       the rows from responder(querystr), sleeping for 'latency' seconds
+       per execute() and 'fetch_latency' seconds per fetch call to
+       simulate the round trips.
+    """
+    return Connection(responder, latency, fetch_latency)
+
+class Connection:
+    def __init__(self, responder, latency, fetch_latency=0.0):
+        self.responder = responder
+        self.latency = latency
+        self.fetch_latency = fetch_latency
+        self.queries = []   # every query string executed, in order
+        self.closed = 0
+
+    def cursor(self):
+        if self.closed:
+            raise InterfaceError, "connection is closed"
+        return Cursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+class Cursor:
+    arraysize = 1
+    description = None
+    rowcount = -1
+
+    def __init__(self, conn):
+        self.connection = conn
+        self._rows = None
+
+    def execute(self, operation, parameters=None):
+        conn = self.connection
+        conn.queries.append(operation)
+        if conn.latency:
+            time.sleep(conn.latency)
+        self._rows = iter(conn.responder(operation))
+
+    def fetchone(self):
+        for row in self._check_rows():
+            return row
+        return None
+
+    def fetchmany(self, size=None):
+        return list(itertools.islice(self._check_rows(), size or self.arraysize))
+
+    def fetchall(self):
+        return list(self._check_rows())
+
+    def close(self):
+        self._rows = None
+
+    def _check_rows(self):
+        if self._rows is None:
+            raise Error, "no query has been executed"
+        if self.connection.fetch_latency:
+            time.sleep(self.connection.fetch_latency)
+        return self._rows
+
+class SyntheticCatalog:
+    """A responder answering the catalog queries of pgschema (dialect
+       'postgres'), pgcatalog (dialect 'pgcatalog', with every table in
+       the 'public' schema) or oraschema (dialect 'oracle') for a synthetic schema
+       of 'tables' tables with 'columns' columns each.  The first column
+       of every table is its primary key 'id'; each other column is a
+       foreign key to some table's 'id' with probability fk_density, and
+       each table has 'indexes' indexes besides that of its primary key.
+
+       Every table is generated afresh from the seed whenever a query
+       needs it, so the same arguments always give the same schema and
+       the catalog holds nothing in memory however large it is.  Queries
+       restricted with IN lists (as for pgschema/oraschema's 'tables'
+       argument) only generate the tables named.
+    """
+
+    def __init__(self, dialect='postgres', tables=100, columns=10,
+                 fk_density=0.2, indexes=1, seed=1):
+        if dialect not in ('postgres', 'pgcatalog', 'oracle'):
+            raise ValueError, "unknown dialect: %s" % dialect
+        self.dialect = dialect
+        self.ntables = tables
+        self.ncolumns = max(columns, 1)
+        self.fk_density = fk_density
+        self.nindexes = indexes
+        self.seed = seed
+        if dialect == 'oracle':
+            self._name_format = 'TAB_%06d'
+            self._column_format = 'COL_%03d'
+            self._id = 'ID'
+        else:
+            self._name_format = 'tab_%06d'
+            self._column_format = 'col_%03d'
+            self._id = 'id'
+        # Column j of table i refers to table (i + offset[j]) % ntables,
+        # so the tables referring to a given one can be found directly
+        self._offsets = [1 + _hash(seed, 'offset', j) % max(tables - 1, 1)
+                         for j in range(self.ncolumns)]
+
+    def table_names(self):
+        return [self._name_format % i for i in range(self.ntables)]
+
+    def _number(self, name):
+        try:
+            number = int(name[4:])
+        except ValueError:
+            return None
+        if self._name_format % number != name or number >= self.ntables:
+            return None
+        return number
+
+    def _has_fk(self, i, j):
+        return j > 0 and self.fk_density > 0 and \
+               _hash(self.seed, i, j) < self.fk_density * 0xffffffffL
+
+    def _table(self, i):
+        "Return (name, [(column, type, notnull, default, length)], {column: referenced table}, [(index, unique, [columns])])"
+        rnd = random.Random('%s-%d' % (self.seed, i))
+        name = self._name_format % i
+        columns = [(self._id, 'id', 1, None, 10)]
+        fkeys = {}
+        for j in range(1, self.ncolumns):
+            column = self._column_format % j
+            if self._has_fk(i, j):
+                fkeys[column] = self._name_format % ((i + self._offsets[j]) % self.ntables)
+                columns.append((column, 'id', rnd.random() < 0.5, None, 10))
+                continue
+            kind = rnd.choice(('int', 'string', 'number', 'date'))
+            default = None
+            if rnd.random() < 0.2:
+                default = {'int': '0', 'string': "'x'", 'number': '1.5',
+                           'date': 'now()'}[kind]
+            columns.append((column, kind, rnd.random() < 0.3, default,
+                            rnd.randint(1, 200)))
+        indexes = [(name + '_pkey', 1, [self._id])]
+        for k in range(self.nindexes):
+            cols = rnd.sample(columns[1:], min(rnd.randint(1, 2), len(columns) - 1))
+            indexes.append(('%s_idx%d' % (name, k), rnd.random() < 0.2,
+                            [c[0] for c in cols]))
+        return name, columns, fkeys, indexes
+
+    def _wanted(self, querystr):
+        """Return the sorted table numbers named in IN lists of table names,
+           or None if there are none
+        """
+        lists = _IN_LIST_RE.findall(querystr)
+        if not lists:
+            return None
+        numbers = {}
+        for values in lists:
+            for value in _LITERAL_RE.findall(values):
+                number = self._number(value.replace("''", "'"))
+                if number is not None:
+                    numbers[number] = 1
+        return sorted(numbers.keys())
+
+    def _referring(self, numbers):
+        "Return the numbers of the tables with foreign keys to the given tables"
+        referring = {}
+        for i in numbers:
+            for j in range(1, self.ncolumns):
+                owner = (i - self._offsets[j]) % self.ntables
+                if self._has_fk(owner, j):
+                    referring[owner] = 1
+        return referring.keys()
+
+    def __call__(self, querystr):
+        if self.dialect == 'oracle':
+            return self._oracle(querystr)
+        elif self.dialect == 'pgcatalog':
+            return self._pgcatalog(querystr)
+        return self._postgres(querystr)
+
+    def _tables(self, querystr):
+        numbers = self._wanted(querystr)
+        if numbers is None:
+            numbers = xrange(self.ntables)
+        for i in numbers:
+            yield self._table(i)
+
+    def _foreign_keys(self, querystr):
+        """Yield (table, column, referenced table) for the foreign keys from
+           or to the tables named in the query (or for all of them)
+        """
+        numbers = self._wanted(querystr)
+        if numbers is None:
+            owners = xrange(self.ntables)
+            wanted = None
+        else:
+            owners = sorted(dict.fromkeys(numbers + self._referring(numbers)).keys())
+            wanted = dict.fromkeys([self._name_format % i for i in numbers])
+        for i in owners:
+            name, columns, fkeys, indexes = self._table(i)
+            for column, other in sorted(fkeys.items()):
+                if wanted is None or wanted.has_key(name) or wanted.has_key(other):
+                    yield name, column, other
+
+    def _postgres(self, q):
+        types = {'id': ('int4', 4), 'int': ('int4', 4), 'string': ('varchar', -1),
+                 'number': ('numeric', -1), 'date': ('timestamp', 8)}
+        if 'current_database()' in q:
+            yield ('synthetic', 0, 0)
+            yield ('pg_class', self.ntables, self.seed)
+        elif 'atttypmod' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    typ, attlen = types[kind]
+                    yield (name, column, typ, attlen, notnull and 't' or 'f',
+                           default is not None and 't' or 'f', length + 4)
+        elif 'tgargs' in q:
+            for name, column, other in self._foreign_keys(q):
+                yield ('<unnamed>\\000%s\\000%s\\000UNSPECIFIED\\000%s\\000id\\000'
+                       % (name, other, column),)
+        elif 'pg_attrdef' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    if default is not None:
+                        yield (name, column, default)
+        elif 'indisprimary' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                yield (name, self._id)
+        elif 'indisunique' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for index, unique, cols in indexes:
+                    for column in cols:
+                        yield (name, index, unique and 't' or 'f', column)
+        elif 'relkind' in q:
+            for name in self.table_names():
+                yield (name,)
+        else:
+            raise InterfaceError, "unrecognised catalog query: %s" % q
+
+    def _pgcatalog(self, q):
+        types = {'id': ('int4', 4), 'int': ('int4', 4), 'string': ('varchar', -1),
+                 'number': ('numeric', -1), 'date': ('timestamp', 8)}
+        if 'current_database()' in q:
+            yield ('synthetic', 0, 0)
+            yield ('pg_class', self.ntables, self.seed)
+        elif 'atttypmod' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    typ, attlen = types[kind]
+                    typmod = -1
+                    if kind == 'string':
+                        typmod = length + 4
+                    elif kind == 'number':
+                        typmod = ((min(length, 1000) << 16) | 2) + 4
+                    yield ('public', name, column, typ, attlen, notnull,
+                           default is not None, typmod)
+        elif "contype = 'f'" in q:
+            for name, column, other in self._foreign_keys(q):
+                yield ('public', name, column, 'public', other, 'id')
+        elif 'pg_get_expr' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    if default is not None:
+                        yield ('public', name, column, default)
+        elif "contype = 'p'" in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                yield ('public', name, self._id)
+        elif 'indisunique' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for index, unique, cols in indexes:
+                    for column in cols:
+                        yield ('public', name, index, bool(unique), column)
+        elif 'relkind' in q:
+            for name in self.table_names():
+                yield ('public', name)
+        else:
+            raise InterfaceError, "unrecognised catalog query: %s" % q
+
+    def _oracle(self, q):
+        types = {'id': 'NUMBER', 'int': 'NUMBER', 'string': 'VARCHAR2',
+                 'number': 'NUMBER', 'date': 'DATE'}
+        if 'user_objects' in q:
+            yield ('SYNTHETIC', self.ntables, '%014d' % self.seed)
+        elif 'data_precision' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    if kind == 'date':
+                        length = '11'
+                    elif kind in ('id', 'int'):
+                        length = '10.0'
+                    elif kind == 'number':
+                        length = '%d.2' % min(length, 38)
+                    yield (name, column, types[kind], notnull and 'N' or 'Y',
+                           default is not None and 1 or 0, str(length))
+        elif 'r_constraint_name' in q:
+            for name, column, other in self._foreign_keys(q):
+                yield (name, column, other, other + '_PK')
+        elif 'default_length' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for column, kind, notnull, default, length in columns:
+                    if default is not None:
+                        yield (name, column, default)
+        elif 'user_ind_columns' in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                for index, unique, cols in indexes:
+                    for column in cols:
+                        yield (name, string.upper(index),
+                               unique and 'UNIQUE' or 'NONUNIQUE', column)
+        elif "constraint_type = 'P'" in q:
+            for name, columns, fkeys, indexes in self._tables(q):
+                yield (name, self._id)
+        elif 'DISTINCT table_name' in q:
+            for name in self.table_names():
+                yield (name,)
+        else:
+            raise InterfaceError, "unrecognised catalog query: %s" % q
+
+# An IN list of table names (relname or table_name, possibly qualified)
+_IN_LIST_RE = re.compile(r"(?:relname|table_name) IN \(((?:'(?:[^']|'')*'(?:, )?)*)\)")
+_LITERAL_RE = re.compile(r"'((?:[^']|'')*)'")
+
+def _hash(*args):
+    "Return a number in [0, 2**32) depending only on the arguments"
+    return zlib.crc32(string.join(map(str, args), '\0')) & 0xffffffffL
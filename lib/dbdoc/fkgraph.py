@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# The graph of foreign keys between tables, for questions such as "which
+# tables does this one depend on, directly or not", "which tables are in
+# a reference cycle" and "in what order can the tables be loaded".
+#
+# Tables are numbered in name order and the references are held in
+# compressed sparse row form: the tables referred to by table i are
+# targets[offsets[i]:offsets[i+1]], with a second pair of arrays for the
+# reverse direction.  Apart from the table names (and a dictionary from
+# name to number), the graph and everything worked out from it are held
+# in arrays of machine integers, so its size grows linearly with the
+# number of tables and foreign keys.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import array, itertools
+
+class GraphBuilder:
+    "Collects foreign key references one at a time to build an FKGraph"
+
+    def __init__(self, table_names=()):
+        self._ids = {}          # {table name: number in order of appearance}
+        self._names = []
+        self._sources = array.array('i')
+        self._targets = array.array('i')
+        for name in table_names:
+            self._id(name)
+
+    def add(self, table, referenced_table):
+        "Record that table has a foreign key referring to referenced_table"
+        self._sources.append(self._id(table))
+        self._targets.append(self._id(referenced_table))
+
+    def _id(self, name):
+        id = self._ids.get(name)
+        if id is None:
+            id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return id
+
+    def graph(self):
+        "Return the FKGraph of the references added so far"
+        # Renumber the tables in name order, reusing the dictionary
+        ids = self._ids
+        names = sorted(self._names)
+        renumber = array.array('i', [0]) * len(names)
+        for new_id in xrange(len(names)):
+            name = names[new_id]
+            renumber[ids[name]] = new_id
+            ids[name] = new_id
+        sources = array.array('i', itertools.imap(renumber.__getitem__,
+                                                  self._sources))
+        targets = array.array('i', itertools.imap(renumber.__getitem__,
+                                                  self._targets))
+        del renumber
+        self._names = self._ids = self._sources = self._targets = None
+        return FKGraph(names, ids, _csr(len(names), sources, targets),
+                       _csr(len(names), targets, sources))
+
+class FKGraph:
+    """The tables and the references between them, with one reference for
+       each foreign key (so two tables may be joined more than once)
+    """
+
+    def __init__(self, names, ids, references, referrers):
+        "Use GraphBuilder rather than constructing these directly"
+        self.names = names      # table names, sorted
+        self._ids = ids         # {table name: position in names}
+        self._references = references   # (offsets, targets)
+        self._referrers = referrers
+        # Worked out when first needed by _find_components: the ids in load
+        # order, with component i being order[starts[i]:starts[i+1]]
+        self._order = None
+        self._starts = None
+        self._component_of = None   # component numbers by id
+        self._positions = None      # positions in load order by id
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return self._ids.has_key(name)
+
+    def edge_count(self):
+        return len(self._references[1])
+
+    def references(self, name):
+        "Return the names of the tables table name refers to directly"
+        return self._neighbours(self._references, name)
+
+    def referrers(self, name):
+        "Return the names of the tables that refer to table name directly"
+        return self._neighbours(self._referrers, name)
+
+    def dependencies(self, name, limit=None):
+        """Return (names, complete): the names of the tables that table name
+           refers to, directly or through other tables, and whether that is
+           all of them.  If limit is given, at most that many of the nearest
+           are found, so that the cost is bounded however large the graph.
+        """
+        return self._closure(self._references, name, limit)
+
+    def dependents(self, name, limit=None):
+        "As dependencies(), but for the tables that refer to table name"
+        return self._closure(self._referrers, name, limit)
+
+    def components(self):
+        """Yield each group of tables joined by references (in either
+           direction) as a sorted list of names, in order of their first
+           names; a table with no references is a group of one
+        """
+        seen = array.array('b', [0]) * len(self.names)
+        for root in xrange(len(self.names)):
+            if seen[root]:
+                continue
+            seen[root] = 1
+            queue = [root]
+            for id in queue:
+                for offsets, targets in (self._references, self._referrers):
+                    for target in targets[offsets[id]:offsets[id + 1]]:
+                        if not seen[target]:
+                            seen[target] = 1
+                            queue.append(target)
+            queue.sort()
+            yield map(self.names.__getitem__, queue)
+
+    def load_order(self):
+        """Return every table name, each after the tables it refers to, with
+           the tables of any cycle next to each other (in name order)
+        """
+        self._find_components()
+        return map(self.names.__getitem__, self._order)
+
+    def load_position(self, name):
+        "Return the position of table name in load_order(), from 0"
+        if self._positions is None:
+            self._find_components()
+            positions = array.array('i', [0]) * len(self.names)
+            for position in xrange(len(self._order)):
+                positions[self._order[position]] = position
+            self._positions = positions
+        return self._positions[self._ids[name]]
+
+    def cycles(self):
+        """Return a list of the reference cycles, each being a sorted list of
+           the names of the tables in it; a table referring to itself is a
+           cycle of one
+        """
+        return [map(self.names.__getitem__, component)
+                for component in self._cycles()]
+
+    def cycle_of(self, name, limit=None):
+        """Return (names, size): the sorted names of the tables in table
+           name's cycle (or at most the first 'limit' of them) and the
+           number of tables in it, or None if it isn't in a cycle
+        """
+        self._find_components()
+        number = self._component_of[self._ids[name]]
+        start, end = self._starts[number], self._starts[number + 1]
+        if end - start == 1 and not self._is_cycle(self._order[start:end]):
+            return None
+        if limit is not None:
+            end = min(end, start + limit)
+        return (map(self.names.__getitem__, self._order[start:end]),
+                self._starts[number + 1] - start)
+
+    def to_json(self):
+        """Return the graph as a dictionary of plain values: the table
+           names, the references in compressed sparse row form, the load
+           order and the cycles, with tables given by their position in
+           'tables'
+        """
+        offsets, targets = self._references
+        self._find_components()
+        return {'tables': self.names,
+                'reference_offsets': offsets.tolist(),
+                'references': targets.tolist(),
+                'load_order': self._order.tolist(),
+                'cycles': [component.tolist() for component in self._cycles()]}
+
+    def _neighbours(self, edges, name):
+        offsets, targets = edges
+        id = self._ids[name]
+        ids = sorted(set(targets[offsets[id]:offsets[id + 1]]))
+        return [self.names[i] for i in ids]
+
+    def _closure(self, edges, name, limit):
+        offsets, targets = edges
+        if limit is None:
+            limit = len(self.names)
+        start = self._ids[name]
+        seen = set([start])
+        queue = [start]         # breadth first, so the nearest come first
+        complete = 1
+        for id in queue:
+            for target in targets[offsets[id]:offsets[id + 1]]:
+                if target not in seen:
+                    if len(queue) > limit:
+                        complete = 0
+                        break
+                    seen.add(target)
+                    queue.append(target)
+            if not complete:
+                break
+        del queue[0]
+        queue.sort()            # ids are in name order
+        return map(self.names.__getitem__, queue), complete
+
+    def _cycles(self):
+        "Yield the components which are cycles, as arrays of ids"
+        self._find_components()
+        order, starts = self._order, self._starts
+        for number in xrange(len(starts) - 1):
+            component = order[starts[number]:starts[number + 1]]
+            if self._is_cycle(component):
+                yield component
+
+    def _is_cycle(self, component):
+        if len(component) > 1:
+            return 1
+        offsets, targets = self._references
+        id = component[0]
+        return id in targets[offsets[id]:offsets[id + 1]]
+
+    def _find_components(self):
+        """Find the strongly connected components with Tarjan's algorithm,
+           iteratively so that long reference chains can't overflow the
+           stack.  Components come out with everything they refer to ahead
+           of them, which is load order.
+        """
+        if self._order is not None:
+            return
+        offsets, targets = self._references
+        n = len(self.names)
+        index = array.array('i', [-1]) * n
+        lowlink = array.array('i', [0]) * n
+        on_stack = array.array('b', [0]) * n
+        component_of = array.array('i', [0]) * n
+        stack = array.array('i')
+        order = array.array('i')
+        starts = array.array('i')
+        work_ids = array.array('i')     # the depth-first path being followed,
+        work_next = array.array('i')    # and the next reference of each
+        counter = 0
+        for root in xrange(n):
+            if index[root] != -1:
+                continue
+            index[root] = lowlink[root] = counter
+            counter = counter + 1
+            stack.append(root)
+            on_stack[root] = 1
+            work_ids.append(root)
+            work_next.append(offsets[root])
+            while work_ids:
+                id = work_ids[-1]
+                i = work_next[-1]
+                if i < offsets[id + 1]:
+                    work_next[-1] = i + 1
+                    target = targets[i]
+                    if index[target] == -1:
+                        index[target] = lowlink[target] = counter
+                        counter = counter + 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work_ids.append(target)
+                        work_next.append(offsets[target])
+                    elif on_stack[target] and index[target] < lowlink[id]:
+                        lowlink[id] = index[target]
+                    continue
+                work_ids.pop()
+                work_next.pop()
+                if work_ids:
+                    parent = work_ids[-1]
+                    if lowlink[id] < lowlink[parent]:
+                        lowlink[parent] = lowlink[id]
+                if lowlink[id] == index[id]:
+                    # The component is everything on the stack down to id
+                    bottom = len(stack) - 1
+                    while stack[bottom] != id:
+                        bottom = bottom - 1
+                    component = sorted(stack[bottom:])
+                    del stack[bottom:]
+                    for member in component:
+                        on_stack[member] = 0
+                        component_of[member] = len(starts)
+                    starts.append(len(order))
+                    order.extend(component)
+        starts.append(len(order))
+        self._order = order
+        self._starts = starts
+        self._component_of = component_of
+
+def _csr(n, sources, targets):
+    """Return (offsets, sorted targets) for the edges sources[i] ->
+       targets[i] between n nodes, by counting sort
+    """
+    offsets = array.array('i', [0]) * (n + 1)
+    for source in sources:
+        offsets[source + 1] = offsets[source + 1] + 1
+    for i in xrange(n):
+        offsets[i + 1] = offsets[i + 1] + offsets[i]
+    fill = offsets[:-1]
+    result = array.array('i', [0]) * len(targets)
+    for i in xrange(len(sources)):
+        source = sources[i]
+        result[fill[source]] = targets[i]
+        fill[source] = fill[source] + 1
+    for i in xrange(n):
+        start, end = offsets[i], offsets[i + 1]
+        if end - start > 1:
+            result[start:end] = array.array('i', sorted(result[start:end]))
+    return offsets, result
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    builder = GraphBuilder(['lonely'])
+    for table, referenced in [('order_line', 'orders'), ('order_line', 'product'),
+                              ('orders', 'customer'), ('customer', 'address'),
+                              ('address', 'customer'), ('product', 'product'),
+                              ('order_line', 'orders')]:
+        builder.add(table, referenced)
+    graph = builder.graph()
+    assert graph.names == ['address', 'customer', 'lonely', 'order_line',
+                           'orders', 'product'], graph.names
+    assert graph.edge_count() == 7
+    assert graph.references('order_line') == ['orders', 'product']
+    assert graph.referrers('customer') == ['address', 'orders']
+    assert graph.dependencies('order_line') == \
+           (['address', 'customer', 'orders', 'product'], 1)
+    names, complete = graph.dependencies('order_line', 2)
+    assert names == ['orders', 'product'] and not complete, names
+    assert graph.dependents('address') == (['customer', 'order_line', 'orders'], 1)
+    assert graph.dependents('lonely') == ([], 1)
+    assert graph.cycles() == [['address', 'customer'], ['product']]
+    assert list(graph.components()) == \
+           [['address', 'customer', 'order_line', 'orders', 'product'], ['lonely']]
+    assert graph.cycle_of('customer') == (['address', 'customer'], 2)
+    assert graph.cycle_of('address', 1) == (['address'], 2)
+    assert graph.cycle_of('orders') is None
+    order = graph.load_order()
+    assert sorted(order) == graph.names
+    for table, referenced in [('order_line', 'orders'), ('order_line', 'product'),
+                              ('orders', 'customer')]:
+        assert order.index(referenced) < order.index(table), order
+    assert [order[graph.load_position(name)] for name in graph.names] == graph.names
+    data = graph.to_json()
+    assert data['reference_offsets'][-1] == 7
+    assert sorted(data['load_order']) == range(6)
+
+    # A chain far deeper than the recursion limit
+    builder = GraphBuilder()
+    for i in range(20000):
+        builder.add('t%05d' % i, 't%05d' % (i + 1))
+    graph = builder.graph()
+    assert graph.load_order()[:2] == ['t20000', 't19999']
+    assert not graph.cycles()
+    assert len(graph.dependents('t20000')[0]) == 20000
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Runs a schema implementation's catalog loaders, optionally in parallel
+# over several database connections, and reads very large schemas a batch
+# of tables at a time
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import threading, Queue, sys, string, time
+import stats, progress
+
+def run_loaders(conn, loaders, connect=None, workers=None, args=()):
+    """Call each loader(conn, *args) and return a list of their results,
+       in order.
+
+       If connect is None, the loaders run one after another on conn.
+       Otherwise connect() is called to open one new connection per worker
+       thread, the loaders are shared out between up to 'workers' threads
+       (default: one per loader), and each connection is closed when its
+       worker is done.  connect may instead be a ConnectionPool, whose
+       connections are borrowed for the workers and handed back to it
+       still open rather than being closed.  The first exception raised by any loader is
+       re-raised here once all the workers have finished.
+    """
+    if connect is None:
+        return [loader(conn, *args) for loader in loaders]
+
+    tasks = Queue.Queue()
+    for i, loader in enumerate(loaders):
+        tasks.put((i, loader))
+    results = [None] * len(loaders)
+    errors = []
+
+    if isinstance(connect, ConnectionPool):
+        pool = connect
+    else:
+        pool = None
+
+    def work():
+        try:
+            if pool is not None:
+                worker_conn = pool.borrow()
+            else:
+                worker_conn = connect()
+        except:
+            errors.append(sys.exc_info())
+            return
+        try:
+            while not errors:
+                try:
+                    i, loader = tasks.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    results[i] = loader(worker_conn, *args)
+                except:
+                    errors.append(sys.exc_info())
+        finally:
+            if pool is not None:
+                pool.give_back(worker_conn)
+            else:
+                worker_conn.close()
+
+    threads = []
+    for n in range(min(workers or len(loaders), len(loaders))):
+        thread = threading.Thread(target=work, name="dbdoc-loader-%d" % n)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        exc_type, exc_value, tb = errors[0]
+        raise exc_type, exc_value, tb
+    return results
+
+class ConnectionPool:
+    """Connections opened with connect() as run_loaders() first needs them
+       and then kept open, so that it can be run again and again (once per
+       batch of a SchemaStream, say) without connecting afresh each time.
+       close() closes all of them.
+    """
+    def __init__(self, connect):
+        self.connect = connect
+        self._lock = threading.Lock()
+        self._idle = []
+        self._all = []
+
+    def borrow(self):
+        self._lock.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+        finally:
+            self._lock.release()
+        conn = self.connect()
+        self._lock.acquire()
+        try:
+            self._all.append(conn)
+        finally:
+            self._lock.release()
+        return conn
+
+    def give_back(self, conn):
+        self._lock.acquire()
+        try:
+            self._idle.append(conn)
+        finally:
+            self._lock.release()
+
+    def close(self):
+        conns, self._all, self._idle = self._all, [], []
+        for conn in conns:
+            conn.close()
+
+class SchemaStream:
+    """Base class for schema objects which read the catalog a batch of
+       tables at a time, for schemas too large to hold in memory at once.
+       Rather than get_tables(), they offer get_table_names() and
+       iter_tables(), which yields each table in name order, reading the
+       next batch (with the implementation's ordinary schema class
+       restricted to those tables) only once the previous one has been
+       used up.  Only the table names are kept between batches; foreign
+       keys are read afresh each time get_foreign_keys() is called.  When
+       the stream was given a connect function, the worker connections
+       are opened once by the first batch and kept open for the rest,
+       being closed when iter_tables() finishes.
+
+       Tables named when the stream is created are checked against the
+       catalog, as for the ordinary schema classes: a name that isn't
+       there raises ValueError.
+
+       Subclasses supply _read_table_names(conn), returning the names of
+       all tables, _read_foreign_keys(conn, tables), returning an iterable
+       of foreign keys as for get_foreign_keys(), and _read_batch(tables,
+       connect), returning a schema object covering the given tables, read
+       with connect passed on as the schema class's connect argument.
+    """
+    schema_api_version = 1
+
+    def __init__(self, conn, name, connect=None, workers=None, tables=None,
+                 batch_size=500):
+        self.name = name
+        self.conn = conn
+        self.connect = connect
+        self.workers = workers
+        self.batch_size = batch_size
+        self._restricted = tables is not None
+        known = self._read_table_names(conn)
+        if tables is None:
+            tables = known
+        else:
+            known = set(known)
+            for name in tables:
+                if name not in known:
+                    raise ValueError, "no such table in schema: %s" % name
+        self._table_names = sorted(tables)
+
+    def get_table_names(self):
+        return self._table_names
+
+    def get_foreign_keys(self):
+        tables = None
+        if self._restricted:
+            tables = self._table_names
+        return self._read_foreign_keys(self.conn, tables)
+
+    def iter_tables(self):
+        names = self._table_names
+        pool = None
+        if self.connect is not None:
+            pool = ConnectionPool(self.connect)
+        try:
+            for i in range(0, len(names), self.batch_size):
+                batch = names[i:i+self.batch_size]
+                schema = self._read_batch(batch, pool)
+                for name in batch:
+                    table = schema.get_table(name)
+                    if table is not None:
+                        yield table
+        finally:
+            if pool is not None:
+                pool.close()
+
+def query(conn, querystr, arraysize, label=None):
+    """Execute querystr and yield the result rows one at a time, fetching
+       them from the cursor in batches of arraysize so that the whole
+       result set is never held in memory at once.
+
+       When stats are being recorded, the time spent in the driver and the
+       number of rows and (roughly) bytes fetched are recorded as a query
+       event named label.  Queries that take a while are also reported
+       as progress tasks, from the time they start executing.
+    """
+    recorder = stats.recorder
+    task = progress.reporter.task(label or 'query', unit='rows', brief=1)
+    cur = conn.cursor()
+    if recorder is None:
+        try:
+            cur.arraysize = arraysize
+            task.waiting('executing')
+            cur.execute(querystr)
+            while 1:
+                rows = cur.fetchmany(arraysize)
+                if not rows: break
+                task.update(len(rows))
+                for row in rows:
+                    yield row
+        finally:
+            task.stop_waiting()
+            cur.close()
+        task.finish()
+        return
+
+    start = time.time()
+    seconds = 0.0
+    nrows = nbytes = 0
+    try:
+        cur.arraysize = arraysize
+        task.waiting('executing')
+        cur.execute(querystr)
+        seconds = time.time() - start
+        while 1:
+            before = time.time()
+            rows = cur.fetchmany(arraysize)
+            seconds = seconds + (time.time() - before)
+            if not rows: break
+            nrows = nrows + len(rows)
+            task.update(len(rows))
+            for row in rows:
+                for value in row:
+                    if value is not None:
+                        nbytes = nbytes + len(str(value))
+            for row in rows:
+                yield row
+    finally:
+        task.stop_waiting()
+        cur.close()
+        recorder.add('query', label or 'query', start, seconds,
+                     {'rows': nrows, 'bytes': nbytes})
+    task.finish()
+
+def sql_in(column, values):
+    """Return an SQL condition testing whether column is one of the given
+       string values, quoting them as SQL literals.  Long lists are split
+       into several IN clauses, since Oracle allows at most 1000 items in
+       each one.
+    """
+    literals = ["'%s'" % string.replace(value, "'", "''") for value in values]
+    if not literals:
+        return '1 = 0'
+    clauses = []
+    for i in range(0, len(literals), 1000):
+        clauses.append('%s IN (%s)' % (column, string.join(literals[i:i+1000], ', ')))
+    return '(%s)' % string.join(clauses, ' OR ')
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import time, fakedb, pgschema, oraschema
+    latency = 0.2
+    def connect():
+        return fakedb.connect(latency=latency)
+    for schema_class in (pgschema.PostgresSchema, oraschema.OracleSchema):
+        start = time.time()
+        schema_class(connect(), 'serial')
+        serial = time.time() - start
+        start = time.time()
+        schema_class(None, 'parallel', connect=connect)
+        parallel = time.time() - start
+        assert serial >= 5 * latency, serial
+        assert parallel < 2 * latency, parallel
+        print "%s: serial %.2fs, parallel %.2fs" % (schema_class.__name__,
+                                                   serial, parallel)
+
+    assert sql_in('t', ["a", "o'k"]) == "(t IN ('a', 'o''k'))"
+    assert sql_in('t', []) == '1 = 0'
+    assert string.count(sql_in('t', map(str, range(2500))), ' IN ') == 3
+
+    # A stream restricted to named tables checks that they exist
+    catalog = fakedb.SyntheticCatalog('postgres', 5, 3)
+    stream = pgschema.PostgresSchemaStream(fakedb.connect(catalog), 'stream',
+                                           tables=['tab_000001'])
+    assert stream.get_table_names() == ['tab_000001']
+    try:
+        pgschema.PostgresSchemaStream(fakedb.connect(catalog), 'stream',
+                                      tables=['tab_000001', 'nosuch'])
+    except ValueError, e:
+        assert 'nosuch' in str(e), e
+    else:
+        raise AssertionError, "unknown table in a stream was not reported"
+
+    # A stream with worker connections opens them once, not once a batch
+    opened = []
+    def counting_connect():
+        conn = fakedb.connect(catalog)
+        opened.append(conn)
+        return conn
+    stream = pgschema.PostgresSchemaStream(fakedb.connect(catalog), 'stream',
+                                           counting_connect, 2, batch_size=2)
+    assert len(list(stream.iter_tables())) == 5
+    assert len(opened) == 2, len(opened)
+
+    def broken(conn):
+        raise RuntimeError, "boom"
+    try:
+        run_loaders(None, (broken, broken), connect)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError, "loader exception was not propagated"
+
+
+if __name__ == '__main__':
+    test()
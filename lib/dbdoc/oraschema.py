@@ -15,62 +15,120 @@ __author__ = 'Andy Todd <andy47@halfcooked.com>'
 __version__ = '$Version: $'[11:-2]
 
 import string
+import introspect
+
+# Number of rows fetched per round trip by _query; cx_Oracle's default of
+# 100 makes the larger catalog queries needlessly chatty
+ARRAYSIZE = 1000
 
 class OracleSchema:
     schema_api_version = 1
 
-    def __init__(self, conn, name):
+    def __init__(self, conn, name, connect=None, workers=None, tables=None):
+        """Read the catalog using conn, or if a connect function returning
+           new connections is supplied, run the catalog queries
+           concurrently on up to 'workers' connections of their own.
+
+           If a sequence of table names is given, only those tables are
+           read, along with the foreign keys that refer to them.
+        """
         self.name = name
-        self._column_info = _get_column_info(conn)
-        self._foreign_keys = _get_foreign_keys(conn)
-        self._column_defaults = _get_column_defaults(conn)
-        self._primary_keys = _get_primary_keys(conn)
-        self._indexes = _get_indexes(conn)
+        if tables is not None:
+            tables = list(tables)
+        self._tables = {}   # table objects, built on first use
+        (self._column_info, self._foreign_keys, self._column_defaults,
+         self._primary_keys, self._indexes) = introspect.run_loaders(
+            conn, (_get_column_info, _get_foreign_keys, _get_column_defaults,
+                   _get_primary_keys, _get_indexes), connect, workers,
+            (tables,))
 
     def get_tables(self):
         return map(self.get_table, self._column_info.keys())
 
     def get_table(self, name):
-        cols = self._column_info.get(name)
-        if not cols: return None
-        indexes = self._indexes.get(name, {})
-        fkeys = self._foreign_keys.get(name, {})
-        pkey = self._primary_keys.get(name, None)
-        defaults = self._column_defaults.get(name, {})
-        return _OracleTable(name, cols, pkey, fkeys, defaults, indexes)
-
-class _OracleTable:
+        table = self._tables.get(name)
+        if table is None:
+            cols = self._column_info.get(name)
+            if not cols: return None
+            indexes = self._indexes.get(name, {})
+            fkeys = self._foreign_keys.get(name, {})
+            pkey = self._primary_keys.get(name, None)
+            defaults = self._column_defaults.get(name, {})
+            table = _OracleTable(name, cols, pkey, fkeys, defaults, indexes)
+            self._tables[name] = table
+        return table
+
+    def __getstate__(self):
+        # the table objects are cheap to rebuild, so leave them out of
+        # pickles (such as snapshot files)
+        state = self.__dict__.copy()
+        state['_tables'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_tables', {})
+
+    def get_foreign_keys(self):
+        for table, fkeys in self._foreign_keys.items():
+            for column, (other_table, other_column) in fkeys.items():
+                yield table, column, other_table, other_column
+
+class OracleSchemaStream(introspect.SchemaStream):
+    """Reads an Oracle catalog a batch of tables at a time; see
+       introspect.SchemaStream
+    """
+
+    def _read_table_names(self, conn):
+        return [name for (name,) in _query(conn, """SELECT DISTINCT table_name
+              FROM   user_tab_columns""", label='table names')]
+
+    def _read_foreign_keys(self, conn, tables):
+        return _iter_foreign_keys(conn, tables)
+
+    def _read_batch(self, tables, connect):
+        return OracleSchema(self.conn, self.name, connect, self.workers,
+                            tables=tables)
+
+class _OracleTable(object):
+    __slots__ = ('name', 'primary_key_name', '_columns', '_coldict',
+                 '_indexes', '_indexdict')
+
     def __init__(self, name, cols, pkey, fkeys, defaults, indexes):
         self.name = name
+        self.primary_key_name = pkey
+        self._columns = []
         self._coldict = {}
         for attr, typ, nullable, hasdef, length in cols:
-            self._coldict[attr] = (typ, nullable, hasdef, length)
-        self._colnames = map(lambda c: c[0], cols)
-        self.primary_key_name = pkey
-        self._fkeys = fkeys
-        self._defaults = defaults
-        self._indexes = indexes
+            col = _OracleColumn(attr, name, (typ, nullable, hasdef, length),
+                                fkeys.get(attr, None), defaults.get(attr))
+            self._columns.append(col)
+            self._coldict[attr] = col
+        self._indexes = []
+        self._indexdict = {}
+        for index_name, (colnames, unique) in indexes.items():
+            index = _OracleIndex(index_name, name, colnames, unique)
+            self._indexes.append(index)
+            self._indexdict[index_name] = index
+
+    # The sequences returned are shared, and must not be modified
 
     def get_columns(self):
-        return map(self.get_column, self._colnames)
+        return self._columns
 
     def get_column(self, name):
-        colinfo = self._coldict.get(name, None)
-        if not colinfo: return None
-        return _OracleColumn(name, self.name, colinfo,
-                               self._fkeys.get(name, None),
-                               self._defaults.get(name))
+        return self._coldict.get(name, None)
 
     def get_indexes(self):
-        return map(self.get_index, self._indexes.keys())
+        return self._indexes
 
     def get_index(self, name):
-        index_info = self._indexes.get(name, None)
-        if not index_info: return None
-        colnames, unique = index_info
-        return _OracleIndex(name, self.name, colnames, unique)
+        return self._indexdict.get(name, None)
+
+class _OracleColumn(object):
+    __slots__ = ('name', 'table_name', 'type', 'nullable', 'length',
+                 'references', 'default_value')
 
-class _OracleColumn:
     def __init__(self, name, table_name, colinfo, references, default):
         self.name = name
         self.table_name = table_name
@@ -78,7 +136,9 @@ class _OracleColumn:
         self.references = references
         self.default_value = default
 
-class _OracleIndex:
+class _OracleIndex(object):
+    __slots__ = ('name', 'table_name', '_col_names', 'unique')
+
     def __init__(self, name, table_name, col_names, unique):
         self.name = name
         self.table_name = table_name
@@ -88,7 +148,23 @@ class _OracleIndex:
     def get_column_names(self):
         return self._col_names
 
-def _get_column_info(conn):
+def get_fingerprint(conn):
+    """Return a cheap summary of the user's schema objects which changes
+       whenever any of them is created, dropped or altered.
+    """
+    stmt = """SELECT user, COUNT(*),
+                     TO_CHAR(MAX(last_ddl_time), 'YYYYMMDDHH24MISS')
+              FROM   user_objects"""
+    return tuple(map(tuple, _query(conn, stmt, label='fingerprint')))
+
+
+def _restrict(column, tables, keyword='AND'):
+    "Return an extra WHERE condition limiting a query to the given tables"
+    if tables is None:
+        return ''
+    return '\n              %-6s %s' % (keyword, introspect.sql_in(column, tables))
+
+def _get_column_info(conn, tables=None):
     "Get a dictionary of (table, [list of column details]) tuples for all tables"
     # AJT 13.11.2001 - Note date is hard coded to '11'. Probably should special
     # case this in the documentation class to ignore the length of dates.
@@ -97,9 +173,10 @@ def _get_column_info(conn):
                      decode(data_type, 'DATE', '11',
                                        'NUMBER', nvl(data_precision,38)||'.'||data_scale,
                                        data_length) data_length
-              FROM   user_tab_columns"""
+              FROM   user_tab_columns""" + _restrict('table_name', tables, 'WHERE')
     tables = {}
-    for table, attr, typ, nullable, hasdef, length in _query(conn, stmt):
+    results = _query(conn, stmt, label='column info')
+    for table, attr, typ, nullable, hasdef, length in results:
         t = tables.get(table, None)
         if not t:
             t = []
@@ -110,12 +187,23 @@ def _get_column_info(conn):
         t.append((attr, typ, nullable, hasdef, length))
     return tables
 
-def _get_foreign_keys(conn):
+def _get_foreign_keys(conn, tables=None):
     """Get a dictionary of {table: {column name:
                                    (referenced table, referenced key)}}
     """
-    # AJT 14.11.2001 - Changed order of tables in from clause to speed up query
     fkeys = {}
+    for owner_table, column, referenced_table, referenced_table_pkey in \
+            _iter_foreign_keys(conn, tables):
+        t = fkeys.get(owner_table, None)
+        if not t:
+            t = {}
+            fkeys[owner_table] = t
+        t[column] = (referenced_table, referenced_table_pkey)
+    return fkeys
+
+def _iter_foreign_keys(conn, tables=None):
+    "Yield (table, column, referenced table, referenced key) for each foreign key"
+    # AJT 14.11.2001 - Changed order of tables in from clause to speed up query
     stmt = """SELECT uc.table_name
                     ,ucc.column_name
                     ,fc.table_name
@@ -126,59 +214,58 @@ def _get_foreign_keys(conn):
               WHERE  uc.constraint_type = 'R'
               AND    uc.constraint_name = ucc.constraint_name
               AND    fc.constraint_name = uc.r_constraint_name"""
+    if tables is not None:
+        stmt = stmt + """
+              AND    (%s OR %s)""" % (introspect.sql_in('uc.table_name', tables),
+                                      introspect.sql_in('fc.table_name', tables))
 
-    for owner_table, column, referenced_table, referenced_table_pkey in _query(conn, stmt):
-        t = fkeys.get(owner_table, None)
-        if not t:
-            t = {}
-            fkeys[owner_table] = t
-        t[column] = (referenced_table, referenced_table_pkey)
-    return fkeys
+    return _query(conn, stmt, label='foreign keys')
 
-def _get_column_defaults(conn):
+def _get_column_defaults(conn, tables=None):
     "Get a dictionary of {table: {column name: default value}}"
     # AJT 08.11.2001
     # It might be necessary to remove the where clause here.
     stmt = """SELECT table_name, column_name, data_default
               FROM   user_tab_columns
-              WHERE  default_length IS NOT NULL"""
+              WHERE  default_length IS NOT NULL""" + _restrict('table_name', tables)
     defaults = {}
-    for table, attr, default in _query(conn, stmt):
+    for table, attr, default in _query(conn, stmt, label='column defaults'):
         t = defaults.get(table, None)
         if not t: defaults[table] = t = {}
         t[attr] = default
     return defaults
 
-def _get_indexes(conn):
-    # AJT 08.11.2001
-    stmt = """SELECT ui.table_name, ui.index_name, ui.uniqueness
+def _get_indexes(conn, tables=None):
+    "Get a dictionary of {table: {index name: ([column names], unique)}}"
+    # Fetch every index column in one pass, in column_position order, and
+    # group the rows here rather than querying user_ind_columns per index
+    stmt = """SELECT ui.table_name, ui.index_name, ui.uniqueness, uic.column_name
               FROM   user_indexes ui
-              ORDER BY ui.table_name"""
+                    ,user_ind_columns uic
+              WHERE  uic.index_name = ui.index_name%s
+              ORDER BY ui.table_name, ui.index_name, uic.column_position""" % _restrict('ui.table_name', tables)
     indices = {}
-    for table, index_name, unique in _query(conn, stmt):
+    results = _query(conn, stmt, label='indexes')
+    for table, index_name, unique, column in results:
         t = indices.get(table, None)
         if not t:
             indices[table] = t = {}
-        stmt = """SELECT column_name
-                  FROM   user_ind_columns
-                  WHERE  index_name = '%s'""" % index_name
-        columns = []
-        # AJT - Could replace this with a list comprehension
-        for columnName in _query(conn, stmt):
-            columns.append(columnName[0])
-        t[index_name] = (columns, unique == 'UNIQUE')
+        index = t.get(index_name, None)
+        if not index:
+            t[index_name] = index = ([], unique == 'UNIQUE')
+        index[0].append(column)
     return indices
 
-def _get_primary_keys(conn):
+def _get_primary_keys(conn, tables=None):
     # AJT 08.11.2001
     pkeys = {}
     stmt = """SELECT uc.table_name, ucc.column_name
               FROM   user_constraints uc
                     ,user_cons_columns ucc
               WHERE  uc.constraint_name = ucc.constraint_name
-              AND    uc.constraint_type = 'P'
-              ORDER BY uc.table_name, ucc.position"""
-    for table, column in _query(conn, stmt):
+              AND    uc.constraint_type = 'P'%s
+              ORDER BY uc.table_name, ucc.position""" % _restrict('uc.table_name', tables)
+    for table, column in _query(conn, stmt, label='primary keys'):
         pkey = pkeys.get(table, None)
         if not pkey:
             pkeys[table] = column
@@ -186,12 +273,12 @@ def _get_primary_keys(conn):
             pkeys[table] = pkey + ', ' + column
     return pkeys
 
-def _query(conn, querystr):
-    cur = conn.cursor()
-    cur.execute(querystr)
-    results = cur.fetchall()
-    cur.close()
-    return results
+def _query(conn, querystr, label, arraysize=None):
+    """Execute querystr and yield the result rows one at a time, fetching
+       them from the cursor in batches of arraysize (default ARRAYSIZE).
+       The query is labelled in any stats as label.
+    """
+    return introspect.query(conn, querystr, arraysize or ARRAYSIZE, label)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+# Postgres 9.4+ implementation of the database schema API
+#
+# Unlike pgschema, which targets Postgres 7.x, this reads foreign keys and
+# primary keys from pg_constraint (so multi-column keys are understood),
+# column defaults with pg_get_expr (pg_attrdef.adsrc went in Postgres 12),
+# and knows about namespaces: only the chosen schemas are read, and table
+# names are qualified with their schema ("sales.orders") unless exactly one
+# schema is being documented.  Every query joins pg_class to pg_namespace
+# and filters on relname/nspname, which the catalog indexes cover.
+#
+# designed for DB API 2.0 compliant DB interfaces, such as
+# - psycopg2
+# - pygresql (pgdb module)
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import string
+import introspect, pgschema
+
+# Number of rows fetched per round trip by _query
+ARRAYSIZE = 1000
+
+# Schemas left out unless asked for by name
+SYSTEM_SCHEMAS = ('pg_catalog', 'information_schema')
+
+class PgCatalogSchema(pgschema.PostgresSchema):
+
+    def __init__(self, conn, name, connect=None, workers=None, tables=None,
+                 schemas=None):
+        """As for pgschema.PostgresSchema, except that only the tables in
+           the named schemas (by default, all but the system ones) are
+           read.  Table names, including any given in 'tables', are
+           qualified with their schema unless just one schema is named.
+        """
+        self.name = name
+        if tables is not None:
+            tables = list(tables)
+        self._tables = {}   # table objects, built on first use
+        (self._column_info, self._foreign_keys, self._column_defaults,
+         self._primary_keys, self._indexes) = introspect.run_loaders(
+            conn, (_get_column_info, _get_foreign_keys, _get_column_defaults,
+                   _get_primary_keys, _get_indexes), connect, workers,
+            (tables, schemas))
+
+class PgCatalogSchemaStream(introspect.SchemaStream):
+    """Reads a Postgres catalog a batch of tables at a time; see
+       introspect.SchemaStream
+    """
+
+    def __init__(self, conn, name, connect=None, workers=None, tables=None,
+                 batch_size=500, schemas=None):
+        self.schemas = schemas
+        introspect.SchemaStream.__init__(self, conn, name, connect, workers,
+                                         tables, batch_size)
+
+    def _read_table_names(self, conn):
+        return _get_table_names(conn, self.schemas)
+
+    def _read_foreign_keys(self, conn, tables):
+        return _iter_foreign_keys(conn, tables, self.schemas)
+
+    def _read_batch(self, tables, connect):
+        return PgCatalogSchema(self.conn, self.name, connect,
+                               self.workers, tables=tables,
+                               schemas=self.schemas)
+
+
+class _Scope:
+    """The schemas and tables being read, which knows how to restrict a
+       query to them and what to call each table
+    """
+    def __init__(self, schemas, tables):
+        if schemas is not None:
+            schemas = list(schemas)
+        self.schemas = schemas
+        self.qualify = schemas is None or len(schemas) != 1
+        self.tables = None      # {table name: 1}
+        self.relnames = None    # unqualified names of those tables
+        if tables is not None:
+            self.tables = dict.fromkeys(tables, 1)
+            relnames = {}
+            for table in tables:
+                if self.qualify:
+                    table = string.split(table, '.', 1)[-1]
+                relnames[table] = 1
+            self.relnames = relnames.keys()
+
+    def name(self, nspname, relname):
+        if self.qualify:
+            return '%s.%s' % (nspname, relname)
+        return relname
+
+    def wanted(self, name):
+        return self.tables is None or self.tables.has_key(name)
+
+    def schema_condition(self, nspname):
+        "Return an SQL condition selecting the schemas in scope"
+        if self.schemas is None:
+            return "%s NOT IN ('%s') AND %s !~ '^pg_(toast|temp_)'" % \
+                   (nspname, string.join(SYSTEM_SCHEMAS, "', '"), nspname)
+        return introspect.sql_in(nspname, self.schemas)
+
+    def condition(self, nspname, relname):
+        """Return an SQL condition selecting the schemas and (if any were
+           given) tables in scope.  Qualified names are matched on their
+           table names only, so rows must also be checked with wanted().
+        """
+        where = self.schema_condition(nspname)
+        if self.relnames is not None:
+            where = where + ' AND ' + introspect.sql_in(relname, self.relnames)
+        return where
+
+
+def get_fingerprint(conn):
+    """Return a cheap summary of the catalog tables read by PgCatalogSchema
+       which changes whenever any of them does: the row count and newest
+       row version (xmin) of each, since DDL inserts or updates rows in them.
+    """
+    catalogs = ('pg_namespace', 'pg_class', 'pg_attribute', 'pg_attrdef',
+                'pg_constraint', 'pg_index', 'pg_type')
+    Q = string.join(["""SELECT '%s', count(*), max(xmin::text::bigint)
+                        FROM %s""" % (catalog, catalog)
+                     for catalog in catalogs], ' UNION ALL ')
+    Q = "SELECT current_database(), 0, 0 UNION ALL " + Q
+    return tuple(map(tuple, _query(conn, Q, label='fingerprint')))
+
+def _get_table_names(conn, schemas=None):
+    scope = _Scope(schemas, None)
+    return [scope.name(nspname, relname) for nspname, relname in _query(conn, """
+        SELECT n.nspname, c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p')
+        AND %s""" % scope.schema_condition('n.nspname'), label='table names')]
+
+def _get_column_info(conn, tables=None, schemas=None):
+    """Get a dictionary of {table: [(column, type, nullable, has default,
+       length)]}, with the columns in table order
+    """
+    scope = _Scope(schemas, tables)
+    Q = """SELECT n.nspname, c.relname, a.attname, t.typname, a.attlen,
+                  a.attnotnull, a.atthasdef, a.atttypmod
+           FROM pg_attribute a
+           JOIN pg_class c ON c.oid = a.attrelid
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           JOIN pg_type t ON t.oid = a.atttypid
+           WHERE c.relkind IN ('r', 'p')
+           AND a.attnum > 0 AND NOT a.attisdropped
+           AND %s
+           ORDER BY n.nspname, c.relname, a.attnum""" % \
+        scope.condition('n.nspname', 'c.relname')
+    tables = {}
+    last = None     # the (schema, table) of the previous row
+    t = None        # its list of columns, or None if it isn't wanted
+    for nspname, relname, attr, typ, attlen, notnull, hasdef, typmod in \
+            _query(conn, Q, label='column info'):
+        # The rows come a table at a time, so only look the table up when
+        # it changes
+        if (nspname, relname) != last:
+            last = (nspname, relname)
+            table = scope.name(nspname, relname)
+            t = None
+            if scope.wanted(table):
+                t = tables[table] = []
+        if t is None:
+            continue
+        if typmod < 0 and attlen > 0:
+            length = attlen     # the commonest case, as in _length
+        else:
+            length = _length(typ, attlen, typmod)
+        t.append((attr, typ, notnull not in ('t', 1, True),
+                  hasdef in ('t', 1, True), length))
+    return tables
+
+def _length(typ, attlen, typmod):
+    "Return a column's length as the schema API describes it"
+    if typmod is None or typmod < 0:
+        if attlen is None or attlen < 0:
+            return None
+        return attlen
+    if typ in ('varchar', 'bpchar'):
+        return typmod - 4
+    if typ == 'numeric':
+        return '%d.%d' % ((typmod - 4) >> 16, (typmod - 4) & 0xffff)
+    return typmod
+
+def _get_foreign_keys(conn, tables=None, schemas=None):
+    fkeys = {}
+    for owner_table, column, referenced_table, referenced_column in \
+            _iter_foreign_keys(conn, tables, schemas):
+        t = fkeys.get(owner_table, None)
+        if not t:
+            t = fkeys[owner_table] = {}
+        t[column] = (referenced_table, referenced_column)
+    return fkeys
+
+def _iter_foreign_keys(conn, tables=None, schemas=None):
+    """Yield (table, column, referenced table, referenced column) for each
+       column of each foreign key from or to the tables in scope.  The
+       columns of a multi-column key are paired up with the referenced
+       columns by unnesting conkey and confkey together.
+    """
+    scope = _Scope(schemas, tables)
+    where = scope.schema_condition('n.nspname')
+    if scope.relnames is not None:
+        where = "((%s) OR (%s))" % (scope.condition('n.nspname', 'c.relname'),
+                                    scope.condition('rn.nspname', 'rc.relname'))
+    Q = """SELECT n.nspname, c.relname, a.attname,
+                  rn.nspname, rc.relname, ra.attname
+           FROM pg_constraint con
+           JOIN pg_class c ON c.oid = con.conrelid
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           JOIN pg_class rc ON rc.oid = con.confrelid
+           JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+           CROSS JOIN LATERAL unnest(con.conkey, con.confkey)
+                 WITH ORDINALITY AS k(attnum, refattnum, keypos)
+           JOIN pg_attribute a ON a.attrelid = con.conrelid
+                              AND a.attnum = k.attnum
+           JOIN pg_attribute ra ON ra.attrelid = con.confrelid
+                               AND ra.attnum = k.refattnum
+           WHERE con.contype = 'f'
+           AND %s
+           ORDER BY n.nspname, c.relname, con.conname, k.keypos""" % where
+    for nspname, relname, column, ref_nspname, ref_relname, ref_column in \
+            _query(conn, Q, label='foreign keys'):
+        table = scope.name(nspname, relname)
+        referenced = scope.name(ref_nspname, ref_relname)
+        if scope.wanted(table) or scope.wanted(referenced):
+            yield table, column, referenced, ref_column
+
+def _get_column_defaults(conn, tables=None, schemas=None):
+    scope = _Scope(schemas, tables)
+    Q = """SELECT n.nspname, c.relname, a.attname,
+                  pg_get_expr(d.adbin, d.adrelid)
+           FROM pg_attrdef d
+           JOIN pg_class c ON c.oid = d.adrelid
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           JOIN pg_attribute a ON a.attrelid = d.adrelid
+                              AND a.attnum = d.adnum
+           WHERE NOT a.attisdropped
+           AND %s""" % scope.condition('n.nspname', 'c.relname')
+    defaults = {}
+    results = _query(conn, Q, label='column defaults')
+    for nspname, relname, attr, default in results:
+        table = scope.name(nspname, relname)
+        if not scope.wanted(table):
+            continue
+        t = defaults.get(table, None)
+        if not t:
+            t = defaults[table] = {}
+        t[attr] = default
+    return defaults
+
+def _get_primary_keys(conn, tables=None, schemas=None):
+    """Get a dictionary of {table: primary key column names}, the names
+       of the columns of a multi-column key being joined with ', '
+    """
+    scope = _Scope(schemas, tables)
+    Q = """SELECT n.nspname, c.relname, a.attname
+           FROM pg_constraint con
+           JOIN pg_class c ON c.oid = con.conrelid
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           CROSS JOIN LATERAL unnest(con.conkey)
+                 WITH ORDINALITY AS k(attnum, keypos)
+           JOIN pg_attribute a ON a.attrelid = con.conrelid
+                              AND a.attnum = k.attnum
+           WHERE con.contype = 'p'
+           AND %s
+           ORDER BY n.nspname, c.relname, k.keypos""" % \
+        scope.condition('n.nspname', 'c.relname')
+    pkeys = {}
+    for nspname, relname, column in _query(conn, Q, label='primary keys'):
+        table = scope.name(nspname, relname)
+        if not scope.wanted(table):
+            continue
+        pkey = pkeys.get(table, None)
+        if not pkey:
+            pkeys[table] = column
+        else:
+            pkeys[table] = pkey + ', ' + column
+    return pkeys
+
+def _get_indexes(conn, tables=None, schemas=None):
+    """Get a dictionary of {table: {index name: ([column names], unique)}},
+       with the columns in key order.  Expression keys are shown as their
+       expressions.
+    """
+    scope = _Scope(schemas, tables)
+    Q = """SELECT n.nspname, c.relname, i.relname, x.indisunique,
+                  CASE WHEN k.attnum = 0
+                       THEN pg_get_indexdef(x.indexrelid, k.keypos::int, true)
+                       ELSE a.attname END
+           FROM pg_index x
+           JOIN pg_class i ON i.oid = x.indexrelid
+           JOIN pg_class c ON c.oid = x.indrelid
+           JOIN pg_namespace n ON n.oid = c.relnamespace
+           CROSS JOIN LATERAL unnest(x.indkey::int2[])
+                 WITH ORDINALITY AS k(attnum, keypos)
+           LEFT JOIN pg_attribute a ON a.attrelid = x.indrelid
+                                   AND a.attnum = k.attnum
+           WHERE %s
+           ORDER BY n.nspname, c.relname, i.relname, k.keypos""" % \
+        scope.condition('n.nspname', 'c.relname')
+    indices = {}
+    results = _query(conn, Q, label='indexes')
+    for nspname, relname, index_name, unique, column in results:
+        table = scope.name(nspname, relname)
+        if not scope.wanted(table):
+            continue
+        t = indices.get(table, None)
+        if not t:
+            t = indices[table] = {}
+        index = t.get(index_name, None)
+        if not index:
+            t[index_name] = index = ([], unique in ('t', 1, True))
+        index[0].append(column)
+    return indices
+
+def _query(conn, querystr, label, arraysize=None):
+    """Execute querystr and yield the result rows one at a time, fetching
+       them from the cursor in batches of arraysize (default ARRAYSIZE).
+       The query is labelled in any stats as label.
+    """
+    return introspect.query(conn, querystr, arraysize or ARRAYSIZE, label)
+
+
+if __name__ == '__main__':
+    import psycopg2
+    conn = psycopg2.connect('dbname=postgres')
+    s = PgCatalogSchema(conn, 'postgres')
@@ -18,63 +18,123 @@ __author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
 __version__ = '$Version: $'[11:-2]
 
 import string
+import introspect
+
+# Number of rows fetched per round trip by _query
+ARRAYSIZE = 1000
 
 class PostgresSchema:
     schema_api_version = 1
 
-    def __init__(self, conn, name):
+    def __init__(self, conn, name, connect=None, workers=None, tables=None):
+        """Read the catalog using conn, or if a connect function returning
+           new connections is supplied, run the catalog queries
+           concurrently on up to 'workers' connections of their own.
+
+           If a sequence of table names is given, only those tables are
+           read, along with the foreign keys that refer to them.
+        """
         self.name = name
-        self._column_info = _get_column_info(conn)
-        self._foreign_keys = _get_foreign_keys(conn)
-        self._column_defaults = _get_column_defaults(conn)
-        self._primary_keys = _get_primary_keys(conn)
-        self._indexes = _get_indexes(conn)
+        if tables is not None:
+            tables = list(tables)
+        self._tables = {}   # table objects, built on first use
+        (self._column_info, self._foreign_keys, self._column_defaults,
+         self._primary_keys, self._indexes) = introspect.run_loaders(
+            conn, (_get_column_info, _get_foreign_keys, _get_column_defaults,
+                   _get_primary_keys, _get_indexes), connect, workers,
+            (tables,))
 
     def get_tables(self):
         return map(self.get_table, self._column_info.keys())
 
     def get_table(self, name):
-        cols = self._column_info.get(name)
-        if not cols: return None
-        indexes = self._indexes.get(name, {})
-        fkeys = self._foreign_keys.get(name, {})
-        pkey = self._primary_keys.get(name, None)
-        defaults = self._column_defaults.get(name, {})
-        return _PostgresTable(name, cols, pkey, fkeys, defaults, indexes)
-
-class _PostgresTable:
+        table = self._tables.get(name)
+        if table is None:
+            cols = self._column_info.get(name)
+            if not cols: return None
+            indexes = self._indexes.get(name, {})
+            fkeys = self._foreign_keys.get(name, {})
+            pkey = self._primary_keys.get(name, None)
+            defaults = self._column_defaults.get(name, {})
+            table = _PostgresTable(name, cols, pkey, fkeys, defaults, indexes)
+            self._tables[name] = table
+        return table
+
+    def __getstate__(self):
+        # the table objects are cheap to rebuild, so leave them out of
+        # pickles (such as snapshot files)
+        state = self.__dict__.copy()
+        state['_tables'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_tables', {})
+
+    def get_foreign_keys(self):
+        for table, fkeys in self._foreign_keys.items():
+            for column, (other_table, other_column) in fkeys.items():
+                yield table, column, other_table, other_column
+
+class PostgresSchemaStream(introspect.SchemaStream):
+    """Reads a Postgres catalog a batch of tables at a time; see
+       introspect.SchemaStream
+    """
+
+    def _read_table_names(self, conn):
+        return [name for (name,) in _query(conn, """SELECT c.relname
+           FROM pg_class c
+           WHERE
+           c.relname !~ '^pg_' and
+           c.relname !~ '^Inv' and
+           c.relkind = 'r'""", label='table names')]
+
+    def _read_foreign_keys(self, conn, tables):
+        return _iter_foreign_keys(conn, tables)
+
+    def _read_batch(self, tables, connect):
+        return PostgresSchema(self.conn, self.name, connect, self.workers,
+                              tables=tables)
+
+class _PostgresTable(object):
+    __slots__ = ('name', 'primary_key_name', '_columns', '_coldict',
+                 '_indexes', '_indexdict')
+
     def __init__(self, name, cols, pkey, fkeys, defaults, indexes):
         self.name = name
+        self.primary_key_name = pkey
+        self._columns = []
         self._coldict = {}
         for attr, typ, nullable, hasdef, length in cols:
-            self._coldict[attr] = (typ, nullable, hasdef, length)
-        self._colnames = map(lambda c: c[0], cols)
-        self.primary_key_name = pkey
-        self._fkeys = fkeys
-        self._defaults = defaults
-        self._indexes = indexes
+            col = _PostgresColumn(attr, name, (typ, nullable, hasdef, length),
+                                  fkeys.get(attr, None), defaults.get(attr))
+            self._columns.append(col)
+            self._coldict[attr] = col
+        self._indexes = []
+        self._indexdict = {}
+        for index_name, (colnames, unique) in indexes.items():
+            index = _PostgresIndex(index_name, name, colnames, unique)
+            self._indexes.append(index)
+            self._indexdict[index_name] = index
+
+    # The sequences returned are shared, and must not be modified
 
     def get_columns(self):
-        return map(self.get_column, self._colnames)
+        return self._columns
 
     def get_column(self, name):
-        colinfo = self._coldict.get(name, None)
-        if not colinfo: return None
-        return _PostgresColumn(name, self.name, colinfo,
-                               self._fkeys.get(name, None),
-                               self._defaults.get(name))
+        return self._coldict.get(name, None)
 
     def get_indexes(self):
-        return map(self.get_index, self._indexes.keys())
+        return self._indexes
 
     def get_index(self, name):
-        index_info = self._indexes.get(name, None)
-        if not index_info: return None
-        colnames, unique = index_info
-        return _PostgresIndex(name, self.name, colnames, unique)
+        return self._indexdict.get(name, None)
 
+class _PostgresColumn(object):
+    __slots__ = ('name', 'table_name', 'type', 'nullable', 'length',
+                 'references', 'default_value')
 
-class _PostgresColumn:
     def __init__(self, name, table_name, colinfo, references, default):
         self.name = name
         self.table_name = table_name
@@ -82,7 +142,9 @@ class _PostgresColumn:
         self.references = references
         self.default_value = default
 
-class _PostgresIndex:
+class _PostgresIndex(object):
+    __slots__ = ('name', 'table_name', '_col_names', 'unique')
+
     def __init__(self, name, table_name, col_names, unique):
         self.name = name
         self.table_name = table_name
@@ -93,7 +155,27 @@ class _PostgresIndex:
         return self._col_names
 
 
-def _get_column_info(conn):
+def get_fingerprint(conn):
+    """Return a cheap summary of the catalog tables read by PostgresSchema
+       which changes whenever any of them does: the row count and newest
+       row version (xmin) of each, since DDL inserts or updates rows in them.
+    """
+    catalogs = ('pg_class', 'pg_attribute', 'pg_attrdef', 'pg_index',
+                'pg_trigger', 'pg_type')
+    Q = string.join(["""select '%s', count(*), max(xmin::text::bigint)
+                        from %s""" % (catalog, catalog)
+                     for catalog in catalogs], ' union all ')
+    Q = "select current_database(), 0, 0 union all " + Q
+    return tuple(map(tuple, _query(conn, Q, label='fingerprint')))
+
+
+def _restrict(column, tables):
+    "Return an extra WHERE condition limiting a query to the given tables"
+    if tables is None:
+        return ''
+    return ' and ' + introspect.sql_in(column, tables)
+
+def _get_column_info(conn, tables=None):
     Q = """SELECT c.relname, a.attname, t.typname, a.attlen, a.attnotnull,
            a.atthasdef, a.atttypmod
            FROM pg_class c, pg_attribute a, pg_type t
@@ -103,9 +185,10 @@ def _get_column_info(conn):
            c.relkind = 'r' and
            a.attnum > 0 and
            a.attrelid = c.oid and
-           a.atttypid = t.oid"""
+           a.atttypid = t.oid""" + _restrict('c.relname', tables)
     tables = {}
-    for table, attr, typ, length, notnull, hasdef, typmod in _query(conn, Q):
+    results = _query(conn, Q, label='column info')
+    for table, attr, typ, length, notnull, hasdef, typmod in results:
         t = tables.get(table, None)
         if not t:
             t = []
@@ -118,12 +201,30 @@ def _get_column_info(conn):
         t.append((attr, typ, nullable, hasdef, length))
     return tables
 
-def _get_foreign_keys(conn):
-    """Find foreign keys by looking at triggers. (Query adapted from
+def _get_foreign_keys(conn, tables=None):
+    fkeys = {}
+    for owner_table, column, referenced_table, referenced_column in \
+            _iter_foreign_keys(conn, tables):
+        t = fkeys.get(owner_table, None)
+        if not t:
+            t = {}
+            fkeys[owner_table] = t
+        t[column] = (referenced_table, referenced_column)
+    return fkeys
+
+def _iter_foreign_keys(conn, tables=None):
+    """Find foreign keys by looking at triggers, yielding (table, column,
+       referenced table, referenced column) for each. (Query adapted from
        query posted to pgsql-general by Michael Fork according to
        http://www.geocrawler.com/mail/msg.php3?msg_id=4895586&list=12)
     """
-    fkeys = {}
+    # pc is the referencing table; pt.tgconstrrelid the referenced one
+    restriction = ''
+    if tables is not None:
+        restriction = """ AND (%s OR pt.tgconstrrelid IN
+                                   (SELECT oid FROM pg_class WHERE %s))""" % \
+                      (introspect.sql_in('pc.relname', tables),
+                       introspect.sql_in('relname', tables))
     for (tgargs,) in _query(conn, '''
   SELECT pt.tgargs FROM pg_class pc,
         pg_proc pg_proc, pg_proc pg_proc_1, pg_trigger pg_trigger,
@@ -137,7 +238,8 @@ def _get_foreign_keys(conn):
         AND (pg_proc.proname LIKE '%upd')
         AND (pg_proc_1.proname LIKE '%del')
         AND (pg_trigger.tgrelid=pt.tgconstrrelid)
-        AND (pg_trigger_1.tgrelid = pt.tgconstrrelid))'''):
+        AND (pg_trigger_1.tgrelid = pt.tgconstrrelid))''' + restriction,
+                            label='foreign keys'):
         # Varies between psycopg and other DB APIs.
         if string.find(tgargs, '\000') != -1:
             tgargs = string.split(tgargs, '\000')
@@ -148,21 +250,18 @@ def _get_foreign_keys(conn):
                   % repr(tgargs)
         (name, owner_table, referenced_table,
          unknown, column, referenced_table_pkey, blank) = tgargs
-        t = fkeys.get(owner_table, None)
-        if not t:
-            t = {}
-            fkeys[owner_table] = t
-        t[column] = (referenced_table, referenced_table_pkey)
-    return fkeys
+        yield owner_table, column, referenced_table, referenced_table_pkey
 
 
-def _get_column_defaults(conn):
+def _get_column_defaults(conn, tables=None):
     results = _query(conn, """select pg_class.relname, pg_attribute.attname,
                               pg_attrdef.adsrc from pg_attrdef,
                               pg_class, pg_attribute where
                               pg_attribute.attrelid = pg_class.oid and
                               pg_attrdef.adnum = pg_attribute.attnum and
-                              pg_attrdef.adrelid = pg_class.oid""")
+                              pg_attrdef.adrelid = pg_class.oid""" +
+                             _restrict('pg_class.relname', tables),
+                     label='column defaults')
     defaults = {}
     for table, attr, default in results:
         t = defaults.get(table, None)
@@ -170,28 +269,41 @@ def _get_column_defaults(conn):
         t[attr] = default
     return defaults
 
-def _get_indexes(conn):
-    results = _query(conn, """select t.relname, i.relname, pg_index.indkey, pg_index.indisunique from
-              pg_class i, pg_class t, pg_index where
-              i.oid = pg_index.indexrelid and
-              t.oid = pg_index.indrelid""")
+def _get_indexes(conn, tables=None):
+    """Find all indexes and their columns in a single query, expanding
+       each pg_index.indkey vector into one row per key column so that
+       the columns come back in index order.  Expression index keys
+       (attnum 0) have no pg_attribute row and are omitted.
+    """
+    where = ''
+    if tables is not None:
+        where = 'where ' + introspect.sql_in('t.relname', tables)
+    results = _query(conn, """select t.relname, i.relname, x.indisunique, a.attname
+              from pg_index x
+              join pg_class i on i.oid = x.indexrelid
+              join pg_class t on t.oid = x.indrelid
+              left join (select indexrelid, indrelid,
+                                unnest(indkey) as attnum,
+                                generate_subscripts(indkey, 1) as keypos
+                         from pg_index) k on k.indexrelid = x.indexrelid
+              left join pg_attribute a on a.attrelid = k.indrelid and
+                                          a.attnum = k.attnum
+              %s
+              order by t.relname, i.relname, k.keypos""" % where,
+                     label='indexes')
     indices = {}
-    for table, index_name, cols, unique in results:
-        # this looped query is another opportunity for optimisation
-        def first(row): return row[0]
-        cols = string.replace(cols, ' ', ',')
-        colnames = map(first, _query(conn,
-            """select a.attname from pg_attribute a, pg_class where
-               a.attrelid = pg_class.oid and
-               pg_class.relname = '%s' and
-               a.attnum in (%s)""" % (table, cols)))
+    for table, index_name, unique, attr in results:
         t = indices.get(table, None)
         if not t:
             indices[table] = t = {}
-        t[index_name] = (colnames, unique == 't')
+        index = t.get(index_name, None)
+        if not index:
+            t[index_name] = index = ([], unique == 't')
+        if attr is not None:
+            index[0].append(attr)
     return indices
 
-def _get_primary_keys(conn):
+def _get_primary_keys(conn, tables=None):
     pkeys = {}
     results = _query(conn, """select
               pg_class.relname, pg_attribute.attname from pg_class,
@@ -199,17 +311,19 @@ def _get_primary_keys(conn):
               pg_class.oid = pg_attribute.attrelid and
               pg_class.oid = pg_index.indrelid and
               pg_index.indkey[0] = pg_attribute.attnum and
-              pg_index.indisprimary = 't'""")
+              pg_index.indisprimary = 't'""" +
+                     _restrict('pg_class.relname', tables),
+                     label='primary keys')
     for table, attr in results:
         pkeys[table] = attr
     return pkeys
 
-def _query(conn, querystr):
-    cur = conn.cursor()
-    cur.execute(querystr)
-    results = cur.fetchall()
-    cur.close()
-    return results
+def _query(conn, querystr, label, arraysize=None):
+    """Execute querystr and yield the result rows one at a time, fetching
+       them from the cursor in batches of arraysize (default ARRAYSIZE).
+       The query is labelled in any stats as label.
+    """
+    return introspect.query(conn, querystr, arraysize or ARRAYSIZE, label)
 
 
 if __name__ == '__main__':
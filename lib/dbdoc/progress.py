@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Reports the progress of a run: how far each task (such as writing the
+# table pages, or a long catalog query) has got, how fast it is going and
+# when it should finish.  Updates are rate-limited, so a task can be
+# updated as often as it likes at the cost of a time.time() call.  A task
+# blocked before it can count anything (such as a query being executed)
+# says so with waiting(), and is then reported from a timer thread.
+#
+# Code reporting progress goes through progress.reporter, which by default
+# writes plain lines to stdout (redrawing a single line on a terminal).
+# The scripts install Quiet() for --quiet or Reporter(json_lines=1) for
+# --log-json, which writes one JSON object per line.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import sys, time, json, threading
+
+class Reporter:
+    def __init__(self, out=None, interval=None, json_lines=0):
+        """Report to the file out (default: whatever sys.stdout is at the
+           time) at most every 'interval' seconds per task, by default
+           every half second on a terminal and every 5 seconds otherwise.
+        """
+        self.out = out
+        self.json_lines = json_lines
+        if interval is None:
+            if not json_lines and self._isatty():
+                interval = 0.5
+            else:
+                interval = 5.0
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._redraw = 0    # whether the last line written is to be redrawn
+
+    def task(self, name, total=None, unit='', brief=0):
+        """Start a task, returning a Task to update as it progresses.  The
+           unit names what is being counted.  A brief task (such as one
+           catalog query among many) is only reported if it takes longer
+           than the reporting interval.
+        """
+        return Task(self, name, total, unit, brief)
+
+    def message(self, text):
+        if self.json_lines:
+            self._write_json({'event': 'message', 'text': text})
+        else:
+            self._write_line(text, 0)
+
+    def _report_waiting(self, task, activity):
+        elapsed = time.time() - task.start
+        if self.json_lines:
+            self._write_json({'event': 'waiting', 'task': task.name,
+                              'activity': activity,
+                              'elapsed': round(elapsed, 3)})
+        else:
+            self._write_line('%s: %s' % (task.name, activity), 1)
+
+    def _report(self, task, now, done):
+        elapsed = now - task.start
+        rate = None
+        if elapsed > 0:
+            rate = task.done / elapsed
+        eta = None
+        if not done and task.total and rate:
+            eta = max(task.total - task.done, 0) / rate
+        if self.json_lines:
+            self._write_json({'event': done and 'done' or 'progress',
+                              'task': task.name, 'done': task.done,
+                              'total': task.total, 'unit': task.unit,
+                              'elapsed': round(elapsed, 3),
+                              'rate': rate and round(rate, 1),
+                              'eta': eta and round(eta, 1)})
+            return
+        unit = task.unit and ' ' + task.unit
+        if done:
+            text = '%s: %d%s in %s' % (task.name, task.done, unit,
+                                       _duration(elapsed))
+            if rate and elapsed >= 1:
+                text = text + ' (%d%s/s)' % (rate, unit)
+        else:
+            if task.total:
+                text = '%s: %d of %d%s (%d%%)' % (task.name, task.done,
+                                                 task.total, unit,
+                                                 100 * task.done / task.total)
+            else:
+                text = '%s: %d%s' % (task.name, task.done, unit)
+            if rate:
+                text = text + ', %d%s/s' % (rate, unit)
+            if eta is not None:
+                text = text + ', ETA %s' % _duration(eta)
+        self._write_line(text, not done)
+
+    def _write_line(self, text, redraw):
+        out = self.out or sys.stdout
+        self._lock.acquire()
+        try:
+            if self._isatty():
+                # Overwrite any line being redrawn, and leave this one to be
+                # overwritten if it is a progress line
+                if self._redraw:
+                    out.write('\r\033[K')
+                out.write(text)
+                if not redraw:
+                    out.write('\n')
+                self._redraw = redraw
+            else:
+                out.write(text + '\n')
+            out.flush()
+        finally:
+            self._lock.release()
+
+    def _write_json(self, record):
+        record['time'] = round(time.time(), 3)
+        out = self.out or sys.stdout
+        self._lock.acquire()
+        try:
+            out.write(json.dumps(record, sort_keys=True) + '\n')
+            out.flush()
+        finally:
+            self._lock.release()
+
+    def _isatty(self):
+        out = self.out or sys.stdout
+        return hasattr(out, 'isatty') and out.isatty()
+
+class Task:
+    def __init__(self, reporter, name, total, unit, brief):
+        self.reporter = reporter
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.brief = brief
+        self.done = 0
+        self.start = time.time()
+        self._next_report = self.start + reporter.interval
+        self._timer = None
+
+    def waiting(self, activity):
+        """Note that the task is blocked on activity (such as 'executing'
+           a query) before it can count anything.  This is reported if it
+           lasts longer than the reporting interval (straight away for a
+           task that isn't brief), until the task is next updated or
+           stop_waiting() is called.
+        """
+        self.stop_waiting()
+        if not self.brief:
+            self.reporter._report_waiting(self, activity)
+            return
+        # The thread waiting for the activity can't report, so a timer does
+        self._timer = threading.Timer(self.reporter.interval,
+                                      self.reporter._report_waiting,
+                                      (self, activity))
+        self._timer.start()
+
+    def stop_waiting(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def update(self, n=1):
+        "Count n more units done"
+        if self._timer is not None:
+            self.stop_waiting()
+        self.done = self.done + n
+        now = time.time()
+        if now >= self._next_report:
+            self._next_report = now + self.reporter.interval
+            self.reporter._report(self, now, 0)
+
+    def finish(self):
+        self.stop_waiting()
+        now = time.time()
+        if not self.brief or now - self.start >= self.reporter.interval:
+            self.reporter._report(self, now, 1)
+
+class Quiet(Reporter):
+    "Reports nothing"
+    def __init__(self):
+        Reporter.__init__(self, interval=0)
+
+    def task(self, name, total=None, unit='', brief=0):
+        return _QUIET_TASK
+
+    def message(self, text):
+        pass
+
+class _QuietTask:
+    done = 0
+
+    def waiting(self, activity):
+        pass
+
+    def stop_waiting(self):
+        pass
+
+    def update(self, n=1):
+        pass
+
+    def finish(self):
+        pass
+
+_QUIET_TASK = _QuietTask()
+
+reporter = Reporter()   # the Reporter in use
+
+def _duration(seconds):
+    "Format a number of seconds as [h:]m:ss"
+    seconds = int(seconds + 0.5)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '%d:%02d:%02d' % (hours, minutes, seconds)
+    return '%d:%02d' % (minutes, seconds)
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    from StringIO import StringIO
+    out = StringIO()
+    r = Reporter(out, interval=0)
+    task = r.task('table pages', 4, 'tables')
+    task.update()
+    task.update(3)
+    task.finish()
+    r.message('removing table-x.html')
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 4, lines
+    assert lines[0].startswith('table pages: 1 of 4 tables (25%), '), lines
+    assert lines[1].startswith('table pages: 4 of 4 tables (100%)'), lines
+    assert lines[2].startswith('table pages: 4 tables in 0:00'), lines
+    assert lines[3] == 'removing table-x.html'
+
+    out = StringIO()
+    r = Reporter(out, interval=60)
+    task = r.task('indexes', unit='rows', brief=1)
+    task.update(1000)
+    task.finish()   # too quick to report
+    task = r.task('symbol index', 10)
+    task.update(10)
+    task.finish()
+    assert out.getvalue().startswith('symbol index: 10 in 0:00\n'), out.getvalue()
+
+    out = StringIO()
+    r = Reporter(out, interval=0.05)
+    task = r.task('column info', unit='rows', brief=1)
+    task.waiting('executing')
+    task.update(0)      # an answer in time cancels the report
+    task.waiting('executing')
+    time.sleep(0.2)     # a slow one is reported while it blocks
+    assert out.getvalue() == 'column info: executing\n', out.getvalue()
+    task.update(5)
+    task.finish()
+    assert out.getvalue().endswith('column info: 5 rows in 0:00\n'), \
+           out.getvalue()
+
+    out = StringIO()
+    r = Reporter(out, json_lines=1)
+    task = r.task('table pages', 2, 'tables')
+    task.update(2)
+    task.finish()
+    record = json.loads(out.getvalue())
+    assert record['event'] == 'done' and record['done'] == 2, record
+
+    task = Quiet().task('anything', 3)
+    task.update()
+    task.finish()
+    assert _duration(3725) == '1:02:05' and _duration(65) == '1:05'
+
+
+if __name__ == '__main__':
+    test()
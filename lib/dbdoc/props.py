@@ -12,7 +12,7 @@
 __author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
 __version__ = "$Revision: 1.2 $"[11:-2] 
 
-import UserDict, re, string, os
+import UserDict, re, string, os, mmap, struct
 
 class Properties(UserDict.UserDict):
     """All-purpose wrapper for properties files. Handles most sanely-
@@ -21,6 +21,10 @@ class Properties(UserDict.UserDict):
     """
 
     PROPERTY_RE = re.compile(r'^\s*([\w\.\-]+)\s*=\s*(\"?)(.*)\2$')
+    # the same, applied to a whole file at once by load()
+    _LOAD_RE = re.compile(r'^[ \t\f]*([\w\.\-]+)[ \t\f]*=[ \t\f]*(\"?)([^\r\n]*)\2\r?$',
+                          re.M)
+    _ESCAPE_RE = re.compile(r'\\(?:u(.{0,4})|(.?))', re.S)
     ATTR_KEYS = () # keys that will look like instance attributes
     # translations for \-escaped characters
     _LOAD_TRANSLATIONS = {'=':'=', ':':':', ' ':' ', 't':'\t',
@@ -42,6 +46,33 @@ class Properties(UserDict.UserDict):
         for key, value in items:
             stream.write("%s=%s%s" % (key, self.escape_value(value), os.linesep))
 
+    def save_compiled(self, path):
+        """Write these properties to path in the compiled format read by
+           CompiledProperties.  The file is written under a temporary name
+           and renamed into place.
+        """
+        keys = sorted(self.data.keys(), None, _compiled_sort_key)
+        values = [self.data[key] for key in keys]
+        start = len(COMPILED_MAGIC) + _COUNT.size + _ENTRY.size * (len(keys) + 1)
+        entries = []
+        key_offset = start
+        value_offset = start + sum(map(len, keys))
+        for key, value in zip(keys, values) + [('', '')]:
+            entries.append(_ENTRY.pack(key_offset, value_offset))
+            key_offset = key_offset + len(key)
+            value_offset = value_offset + len(value)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        f = open(tmp_path, 'wb')
+        try:
+            f.write(COMPILED_MAGIC)
+            f.write(_COUNT.pack(len(keys)))
+            f.write(string.join(entries, ''))
+            f.write(string.join(keys, ''))
+            f.write(string.join(values, ''))
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+
     def __getattr__(self, attr):
         if self.known_keys.has_key(attr):
             try:
@@ -57,29 +88,20 @@ class Properties(UserDict.UserDict):
             self.__dict__[attr] = value
 
     def unescape_value(self, value):
-        chars = []
-        i = 0
-        while i < len(value):
-            c = value[i]
-            if c == '\\':
-                i = i + 1
-                c = value[i]
-                replacement = self._LOAD_TRANSLATIONS.get(c, None)
-                if replacement:
-                    chars.append(replacement)
-                    i = i + 1
-                elif c == 'u':
-                    code = value[i+1:i+5]
-                    if len(code) != 4:
-                        raise ValueError, "illegal unicode escape sequence"
-                    chars.append(chr(string.atoi(code, 16)))
-                    i = i + 5
-                else:
-                    raise ValueError, "unknown escape \\%s" % c
-            else:
-                chars.append(c)
-                i = i + 1
-        return string.join(chars, '')
+        if '\\' not in value:
+            return value
+        return self._ESCAPE_RE.sub(self._unescape_match, value)
+
+    def _unescape_match(self, match):
+        code, c = match.groups()
+        if code is not None:
+            if len(code) != 4:
+                raise ValueError, "illegal unicode escape sequence"
+            return chr(string.atoi(code, 16))
+        replacement = self._LOAD_TRANSLATIONS.get(c, None)
+        if not replacement:
+            raise ValueError, "unknown escape \\%s" % c
+        return replacement
 
     def escape_value(self, value):
         chars = []
@@ -94,14 +116,158 @@ class Properties(UserDict.UserDict):
         return string.join(chars, '')
 
     def load(self, stream):
-        while 1:
-            line = stream.readline()
-            if not line: break
-            m = self.PROPERTY_RE.match(line)
-            if m:
-                name, quote, value = m.groups()
-                self[name] = self.unescape_value(value)
+        """Read properties from stream.  The whole stream is read at once
+           and scanned with a single regular expression, so this copes with
+           files of millions of entries.  Lines starting with '#' or '!'
+           are comments, and a line ending in a backslash is continued on
+           the next line (without its leading whitespace), as in Java.
+        """
+        text = stream.read()
+        if '\\\n' in text or '\\\r\n' in text:
+            text = self._join_continuations(text)
+        data = self.data
+        unescape = self.unescape_value
+        for name, quote, value in self._LOAD_RE.findall(text):
+            if '\\' in value:
+                value = unescape(value)
+            data[name] = value
+
+    def _join_continuations(self, text):
+        lines = []
+        pending = None
+        for line in string.split(text, '\n'):
+            if line[-1:] == '\r':
+                line = line[:-1]
+            if pending is not None:
+                line = pending + string.lstrip(line)
+            elif string.lstrip(line)[:1] in ('#', '!'):
+                lines.append(line)
+                continue
+            # an odd number of trailing backslashes continues the line
+            if (len(line) - len(string.rstrip(line, '\\'))) % 2:
+                pending = line[:-1]
+            else:
+                pending = None
+                lines.append(line)
+        if pending is not None:
+            lines.append(pending)
+        return string.join(lines, '\n')
+
+#
+# Compiled properties files hold the same keys and (unescaped) values as a
+# properties file, in a form that can be searched in place:
+#
+#   COMPILED_MAGIC
+#   number of entries, n                       (little-endian 64-bit)
+#   n+1 (key offset, value offset) pairs       (little-endian 64-bit)
+#   the n keys, concatenated
+#   the n values, concatenated
+#
+# Entries are sorted by lowercased key, then by key, and each key or value
+# runs from its offset to the next entry's; the extra last pair marks the
+# ends of the keys and values.
+#
+
+COMPILED_MAGIC = '#!dbdoc compiled properties 1\n'
+_COUNT = struct.Struct('<Q')
+_ENTRY = struct.Struct('<QQ')
+
+def _compiled_sort_key(key):
+    return (string.lower(key), key)
+
+def is_compiled(path):
+    "Return true if path is a compiled properties file"
+    f = open(path, 'rb')
+    try:
+        return f.read(len(COMPILED_MAGIC)) == COMPILED_MAGIC
+    finally:
+        f.close()
+
+class CompiledProperties:
+    """Read-only mapping over a file written by Properties.save_compiled().
+    The file is memory-mapped and keys are found by binary search, so
+    opening it costs next to nothing, and processes reading the same file
+    share its pages instead of each holding its own copy of every entry.
+    """
+
+    def __init__(self, path):
+        f = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if self._map[:len(COMPILED_MAGIC)] != COMPILED_MAGIC:
+            self._map.close()
+            raise ValueError, "not a compiled properties file: %s" % path
+        self._count, = _COUNT.unpack_from(self._map, len(COMPILED_MAGIC))
+        self._entries = len(COMPILED_MAGIC) + _COUNT.size
 
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, i):
+        start = self._entries + _ENTRY.size * i
+        return self._map[_ENTRY.unpack_from(self._map, start)[0]:
+                         _ENTRY.unpack_from(self._map, start + _ENTRY.size)[0]]
+
+    def _value(self, i):
+        start = self._entries + _ENTRY.size * i
+        return self._map[_ENTRY.unpack_from(self._map, start)[1]:
+                         _ENTRY.unpack_from(self._map, start + _ENTRY.size)[1]]
+
+    def _search(self, sort_key):
+        "Return the index of the first entry not sorting before sort_key"
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if _compiled_sort_key(self._key(mid)) < sort_key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def get(self, key, default=None):
+        i = self._search(_compiled_sort_key(key))
+        if i < self._count and self._key(i) == key:
+            return self._value(i)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError, key
+        return value
+
+    def has_key(self, key):
+        return self.get(key, self) is not self
+
+    __contains__ = has_key
+
+    def iteritems(self):
+        for i in xrange(self._count):
+            yield self._key(i), self._value(i)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return map(self._key, xrange(self._count))
+
+    def iter_prefix(self, prefix):
+        """Yield (key, value) for each key starting with prefix, ignoring
+           case, in sorted order.
+        """
+        prefix = string.lower(prefix)
+        i = self._search((prefix,))
+        while i < self._count:
+            key = self._key(i)
+            if string.lower(key[:len(prefix)]) != prefix:
+                break
+            yield key, self._value(i)
+            i = i + 1
 
 
 ##############################################################################
@@ -135,6 +301,60 @@ def test():
     p.save(o)
     assert o.getvalue() == 'key=%s\n' % quoted
 
+    p = Properties()
+    p.load(StringIO('# comment=1\n'
+                    '! comment=2\n'
+                    'plain = value\r\n'
+                    '\n'
+                    '  quoted="a b "\n'
+                    'long=one \\\n'
+                    '      two\\\\\n'
+                    'next=\\u0041\\tb\n'
+                    'comment.ends=x\n'
+                    '# not continued \\\n'
+                    'last=y'))
+    assert p.data == {'plain': 'value', 'quoted': 'a b ', 'long': 'one two\\',
+                      'next': 'A\tb', 'comment.ends': 'x', 'last': 'y'}, p.data
+    for bad in ('\\q', '\\u12', 'x\\'):
+        try:
+            Properties().load(StringIO('key=' + bad))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError, "accepted %r" % bad
+
+    # compiled properties round trip
+    import tempfile
+    p = Properties()
+    p.load(StringIO('b.key=2\nA.Key=\\u00A71\na.key=1\nempty=\n'
+                    'key=%s\nz=last\n' % quoted))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        p.save_compiled(path)
+        assert is_compiled(path)
+        c = CompiledProperties(path)
+        assert len(c) == len(p.data)
+        assert dict(c.items()) == p.data
+        assert c.keys() == ['A.Key', 'a.key', 'b.key', 'empty', 'key', 'z']
+        for key, value in p.items():
+            assert c[key] == value and c.has_key(key)
+        assert c.get('missing') is None and not c.has_key('A.KEY')
+        assert c.get('empty', 'x') == ''
+        assert list(c.iter_prefix('A.')) == [('A.Key', '\xa71'), ('a.key', '1')]
+        assert list(c.iter_prefix('c')) == []
+        q = Properties()
+        q.update(c.items())
+        o1, o2 = StringIO(), StringIO()
+        p.save(o1)
+        q.save(o2)
+        assert o1.getvalue() == o2.getvalue()
+        c.close()
+        Properties().save_compiled(path)
+        assert len(CompiledProperties(path)) == 0
+    finally:
+        os.remove(path)
+
 
 
 if __name__ == '__main__':
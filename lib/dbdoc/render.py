@@ -0,0 +1,684 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Renderers turn what the doclet has found out about a schema into the
+# text of its pages.  The doclet decides which pages there are, gathers
+# what goes into them and writes them out; the renderer chosen for a run
+# decides what they look like and which file extension they have.
+#
+# HTMLRenderer writes the classic pages, MarkdownRenderer writes Markdown
+# and JSONRenderer writes a JSON document per page.  The first two are
+# made of templates (see template.py) compiled when this module is
+# imported and shared by every page, so a subclass can change the look of
+# a page by replacing one of its template attributes.  A renderer from
+# another module can be named on the command line as module.ClassName.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import template, string, datetime, json, os
+
+class TablePage:
+    """What a table page shows: the table and its TableDescriptions, plus
+       what the doclet has worked out about it from the other tables
+    """
+    def __init__(self, table, descs, refs, dependencies, dependents, cycle,
+                 diagram, diagram_name):
+        self.table = table
+        self.descs = descs
+        # (referring table, column, that table's TableDescriptions)
+        self.refs = refs
+        # (table names, complete) for the tables this one depends on, and
+        # those that depend on it, directly or through other tables
+        self.dependencies = dependencies
+        self.dependents = dependents
+        # (table names, cycle size) for the foreign key cycle the table is
+        # in, or None
+        self.cycle = cycle
+        self.diagram = diagram          # erdiagram.Diagram, or None
+        self.diagram_name = diagram_name  # of its group's diagram, or None
+
+class Renderer:
+    """Base class of renderers.  Each method returns the text of a page,
+       or of part of a page for the pages written a piece at a time.
+    """
+    name = None
+    extension = None    # of the page files, such as '.html'
+    search = 0          # whether the symbol index uses the search shards
+    # Change this whenever the rendered pages change, so that incremental
+    # runs know to regenerate every page
+    page_format = 1
+
+    def __init__(self, schema_name):
+        self.schema_name = schema_name
+        self.year = datetime.date.today().year
+
+    def layout(self):
+        "Return whatever, besides its inputs, affects the text of every page"
+        return (self.__class__.__name__, self.page_format)
+
+    def table_page(self, page):
+        "Return the page for a TablePage"
+        raise NotImplementedError
+
+    def front_page(self, notes, table_names, descs):
+        """Return the page listing the tables, given the schema notes (or
+           None) and the Descriptions
+        """
+        raise NotImplementedError
+
+    def symbol_page_start(self, heading):
+        "Return the start of the symbol index page for one initial"
+        raise NotImplementedError
+
+    def symbol_entries(self, entries, first):
+        """Return the text for a block of (symbol, description, href)
+           entries; first is true for the page's first block
+        """
+        raise NotImplementedError
+
+    def symbol_page_end(self):
+        raise NotImplementedError
+
+    def symbol_index(self, letters):
+        """Return the page linking to the symbol index pages, given
+           (initial, page filename, number of symbols) for each
+        """
+        raise NotImplementedError
+
+    def diagrams_page_start(self, cluster_size):
+        raise NotImplementedError
+
+    def diagram_entry(self, name, names, clusters, first):
+        """Return the entry on the diagrams page for the diagram called
+           name, of the group of tables names, drawn as clusters (lists of
+           table names) or, if that is None, table by table
+        """
+        raise NotImplementedError
+
+    def diagrams_page_end(self, undrawn):
+        "undrawn is the number of tables too unconnected to draw"
+        raise NotImplementedError
+
+class TemplateRenderer(Renderer):
+    """A renderer whose pages are made by its template attributes (see
+       template.Template), each called with the renderer and then the
+       arguments of the method
+    """
+
+    def table_page(self, page):
+        return self.table_template.render(self, page, page.table, page.descs)
+
+    def front_page(self, notes, table_names, descs):
+        return self.front_template.render(self, notes, table_names, descs)
+
+    def symbol_page_start(self, heading):
+        return self.symbol_page_start_template.render(self, heading)
+
+    def symbol_entries(self, entries, first):
+        return self.symbol_entries_template.render(self, entries)
+
+    def symbol_page_end(self):
+        return self.footer()
+
+    def symbol_index(self, letters):
+        return self.symbol_index_template.render(self, letters)
+
+    def diagrams_page_start(self, cluster_size):
+        return self.diagrams_page_start_template.render(self, cluster_size)
+
+    def diagram_entry(self, name, names, clusters, first):
+        return self.diagram_entry_template.render(self, name, names, clusters)
+
+    def diagrams_page_end(self, undrawn):
+        return self.diagrams_page_end_template.render(self, undrawn)
+
+    def header(self, title, nav):
+        return self.header_template.render(self, title, nav)
+
+    def footer(self):
+        return self.footer_template.render(self)
+
+
+##############################################################################
+# HTML
+##############################################################################
+
+def _html_column_name(col, primary_key_name):
+    if col.name == primary_key_name:
+        name = '<strong>%s</strong>' % col.name
+    else:
+        name = col.name
+    if col.references is not None:
+        other_table, other_col = col.references
+        name = '<a href="table-%s.html#col-%s">%s</a>' % (other_table, other_col, name)
+    return name
+
+def _html_table_list(names, complete):
+    if not names:
+        return 'none.'
+    text = string.join(['<a href="table-%s.html">%s</a>' % (name, name)
+                        for name in names], ', ')
+    if not complete:
+        text = text + ' and others'
+    return text
+
+_HTML = {'string': string, 'column_name': _html_column_name,
+         'table_list': _html_table_list}
+
+class HTMLRenderer(TemplateRenderer):
+    name = 'html'
+    extension = '.html'
+    search = 1
+    heading_bg_colour = "#CCCCFF" # like javadoc...
+
+    def layout(self):
+        return TemplateRenderer.layout(self) + (self.heading_bg_colour,)
+
+    header_template = template.Template('''\
+<html><head><title>DBDoc: {{title}} ({{r.schema_name}})</title></head>
+        <body bgcolor="#ffffff">
+        <table width="100%" border=0>
+        <tr><td align="left"><small>{{nav}}</small></td>
+        <td align="right"><strong>{{r.schema_name}}</strong></td></tr></table>
+''', 'r, title, nav', _HTML, 'html header')
+
+    footer_template = template.Template('''\
+<br><hr size=1 noshade>
+        <small>Generated by <a href="https://github.com/purcell/dbdoc">dbdoc</a>,
+        (c) 2001-{{r.year}} Steve Purcell</small>
+</body></html>
+''', 'r', _HTML, 'html footer')
+
+    table_template = template.Template('''\
+{{r.header(table.name, '<a href="index.html">Table index</a> | <a href="symbol-index.html">Symbol index</a> | ' + table.name)}}<h1>Table {{table.name}}</h1>
+<hr noshade size=1>
+{% if descs.get('shortdesc') %}
+<p>{{descs.get('shortdesc')}}</p>
+{% endif %}
+{% if descs.get('notes') %}
+<h2>Notes</h2>
+{{descs.get('notes')}}{% endif %}
+<h2>Columns</h2>
+<table border=1>
+<tr bgcolor="{{r.heading_bg_colour}}"><th>Column</th><th>Type</th><th>Nullable</th><th>Default</th><th>Description</th></tr>
+{% for col in table.get_columns() %}
+<tr><td>{{column_name(col, table.primary_key_name)}}</td><td>{{col.type}} ({{col.length}})</td><td>{{col.nullable and 'yes' or 'no'}}</td><td>{{col.default_value}}</td><td>{{descs.get_column(col.name, 'shortdesc', "&nbsp;")}}</td></tr>
+{% endfor %}
+</table>
+{% if table.primary_key_name %}
+<p>(primary key column name in <strong>bold</strong>)</p>
+{% endif %}
+<h2>Referenced by</h2>
+{% if page.refs %}
+<table border=1>
+<tr bgcolor="{{r.heading_bg_colour}}"><th>Table</th><th>Column</th><th>Description</th></tr>
+{% for other_table, other_col, other_descs in page.refs %}
+<tr><td><a href="table-{{other_table}}.html">{{other_table}}</a></td><td>{{other_col}}</td><td>{{other_descs.get_column(other_col, 'shortdesc', "&nbsp;")}}</td></tr>
+{% endfor %}
+</table>
+{% else %}
+<p>None.</p>
+{% endif %}
+<h2>Dependencies</h2>
+<p>Depends on, directly or through other tables: {{table_list(*page.dependencies)}}</p>
+<p>Depended on by, directly or through other tables: {{table_list(*page.dependents)}}</p>
+{% if page.cycle %}
+<p>In a foreign key cycle of {{page.cycle[1]}} tables: {{table_list(page.cycle[0], len(page.cycle[0]) == page.cycle[1])}}</p>
+{% endif %}
+<h2>Diagram</h2>
+{% if page.diagram %}
+{{page.diagram.svg(0)}}<p>See also the <a href="er/{{page.diagram_name}}.svg">diagram of its group of tables</a> (<a href="er/{{page.diagram_name}}.dot">DOT</a>)</p>
+{% else %}
+<p>None.</p>
+{% endif %}
+<h2>Indexes</h2>
+{% if table.get_indexes() %}
+<table border=1>
+<tr bgcolor="{{r.heading_bg_colour}}"><th>Index name</th><th>Unique</th><th>Columns</th><th>Description</th></tr>
+{% for index in table.get_indexes() %}
+<tr><td>{{index.name}}</td><td>{{index.unique and 'yes' or 'no'}}</td><td>{{string.join(index.get_column_names(), ', ')}}</td><td>{{descs.get_index(index.name, 'shortdesc', '&nbsp;')}}</td></tr>
+{% endfor %}
+</table>
+{% else %}
+<p>None.</p>
+{% endif %}
+{{r.footer()}}''', 'r, page, table, descs', _HTML, 'html table page')
+
+    front_template = template.Template('''\
+{{r.header("Table index", 'Table index | <a href="symbol-index.html">Symbol index</a>')}}<h1>Table index</h1>
+<hr noshade size=1>
+{% if notes %}
+<h2>Notes</h2>
+{{notes}}{% endif %}
+<p>See also the <a href="diagrams.html">diagrams</a> of the tables joined by foreign keys.</p>
+<h2>Tables</h2>
+<table border=1><tr bgcolor="{{r.heading_bg_colour}}"><th>Table</th><th>Summary</th></tr>
+{% for name in table_names %}
+<tr><td><a href="table-{{name}}.html">{{name}}</a></td><td>{{descs.get_table(name).get('shortdesc', "no summary available")}}</td></tr>
+{% endfor %}
+</table>{{r.footer()}}''', 'r, notes, table_names, descs', _HTML, 'html front page')
+
+    symbol_page_start_template = template.Template('''\
+{{r.header("Symbol index: " + heading, '<a href="index.html">Table index</a> | <a href="symbol-index.html">Symbol index</a> | ' + heading)}}<h1>Symbol index: {{heading}}</h1>
+<hr noshade size=1>
+''', 'r, heading', _HTML, 'html symbol page')
+
+    symbol_entries_template = template.Template('''\
+{% for item, descr, href in entries %}
+<a href="{{href}}">{{item}}</a> ({{descr}})<br>
+{% endfor %}
+''', 'r, entries', _HTML, 'html symbol entries')
+
+    symbol_index_template = template.Template('''\
+{{r.header("Symbol index", '<a href="index.html">Table index</a> | Symbol index')}}<h1>Symbol index</h1>
+<hr noshade size=1>
+<p>Search: <input id="search" size=30> <small>(type at least two characters)</small></p>
+<div id="results"></div>
+<h2>Symbols by initial</h2>
+<table border=1><tr bgcolor="{{r.heading_bg_colour}}"><th>Initial</th><th>Symbols</th></tr>
+{% for initial, filename, count in letters %}
+<tr><td><a href="{{filename}}">{{string.upper(initial)}}</a></td><td>{{count}}</td></tr>
+{% endfor %}
+</table>
+<script src="search.js"></script>
+<script>dbdocSearch.init("search", "results");</script>
+{{r.footer()}}''', 'r, letters', _HTML, 'html symbol index')
+
+    diagrams_page_start_template = template.Template('''\
+{{r.header("Diagrams", '<a href="index.html">Table index</a> | <a href="symbol-index.html">Symbol index</a> | Diagrams')}}<h1>Diagrams</h1>
+<hr noshade size=1>
+<p>Each group of tables joined by foreign keys has a diagram; groups of more than {{cluster_size}} tables have a diagram of their clusters of tables, each of which has a diagram of its own.</p>
+<table border=1><tr bgcolor="{{r.heading_bg_colour}}"><th>First table</th><th>Tables</th><th>Diagram</th><th>Clusters</th></tr>
+''', 'r, cluster_size', _HTML, 'html diagrams page')
+
+    diagram_entry_template = template.Template('''\
+<tr><td>{{names[0]}}</td><td>{{len(names)}}</td><td><a href="er/{{name}}.svg">SVG</a> | <a href="er/{{name}}.dot">DOT</a></td><td>\
+{% if clusters is None %}
+&nbsp;\
+{% else %}
+{{string.join(['<a href="er/cluster-%s.svg">%s</a>' % (cluster[0], cluster[0]) for cluster in clusters], ', ')}}\
+{% endif %}
+</td></tr>
+''', 'r, name, names, clusters', _HTML, 'html diagram entry')
+
+    diagrams_page_end_template = template.Template('''\
+</table>
+<p>{{undrawn}} tables with no foreign keys are not drawn.</p>
+{{r.footer()}}''', 'r, undrawn', _HTML, 'html diagrams page end')
+
+
+##############################################################################
+# Markdown
+##############################################################################
+
+def _md_cell(value):
+    "Return value as the text of a table cell"
+    if value is None:
+        return ''
+    return string.replace(string.replace(str(value), '|', '\\|'), '\n', ' ')
+
+def _md_column_name(col, primary_key_name):
+    if col.name == primary_key_name:
+        name = '**%s**' % col.name
+    else:
+        name = col.name
+    if col.references is not None:
+        other_table, other_col = col.references
+        name = '[%s](table-%s.md#col-%s)' % (name, other_table, other_col)
+    return name
+
+def _md_table_list(names, complete):
+    if not names:
+        return 'none.'
+    text = string.join(['[%s](table-%s.md)' % (name, name) for name in names],
+                       ', ')
+    if not complete:
+        text = text + ' and others'
+    return text
+
+_MARKDOWN = {'string': string, 'cell': _md_cell,
+             'column_name': _md_column_name, 'table_list': _md_table_list}
+
+class MarkdownRenderer(TemplateRenderer):
+    name = 'markdown'
+    extension = '.md'
+
+    header_template = template.Template('''\
+{{nav}} | *{{r.schema_name}}*
+
+# {{title}}
+
+''', 'r, title, nav', _MARKDOWN, 'markdown header')
+
+    footer_template = template.Template('''\
+
+---
+Generated by [dbdoc](https://github.com/purcell/dbdoc), (c) 2001-{{r.year}} Steve Purcell
+''', 'r', _MARKDOWN, 'markdown footer')
+
+    table_template = template.Template('''\
+{{r.header('Table ' + table.name, '[Table index](index.md) | [Symbol index](symbol-index.md) | ' + table.name)}}\
+{% if descs.get('shortdesc') %}
+{{descs.get('shortdesc')}}
+
+{% endif %}
+{% if descs.get('notes') %}
+## Notes
+
+{{descs.get('notes')}}
+
+{% endif %}
+## Columns
+
+| Column | Type | Nullable | Default | Description |
+| --- | --- | --- | --- | --- |
+{% for col in table.get_columns() %}
+| <a name="col-{{col.name}}"></a>{{column_name(col, table.primary_key_name)}} | {{col.type}} ({{col.length}}) | {{col.nullable and 'yes' or 'no'}} | {{cell(col.default_value)}} | {{cell(descs.get_column(col.name, 'shortdesc'))}} |
+{% endfor %}
+{% if table.primary_key_name %}
+
+(primary key column name in **bold**)
+{% endif %}
+
+## Referenced by
+
+{% if page.refs %}
+| Table | Column | Description |
+| --- | --- | --- |
+{% for other_table, other_col, other_descs in page.refs %}
+| [{{other_table}}](table-{{other_table}}.md) | {{other_col}} | {{cell(other_descs.get_column(other_col, 'shortdesc'))}} |
+{% endfor %}
+{% else %}
+None.
+{% endif %}
+
+## Dependencies
+
+Depends on, directly or through other tables: {{table_list(*page.dependencies)}}
+
+Depended on by, directly or through other tables: {{table_list(*page.dependents)}}
+
+{% if page.cycle %}
+In a foreign key cycle of {{page.cycle[1]}} tables: {{table_list(page.cycle[0], len(page.cycle[0]) == page.cycle[1])}}
+
+{% endif %}
+## Diagram
+
+{% if page.diagram_name %}
+See the [diagram of its group of tables](er/{{page.diagram_name}}.svg) ([DOT](er/{{page.diagram_name}}.dot)).
+{% else %}
+None.
+{% endif %}
+
+## Indexes
+
+{% if table.get_indexes() %}
+| Index name | Unique | Columns | Description |
+| --- | --- | --- | --- |
+{% for index in table.get_indexes() %}
+| <a name="ind-{{index.name}}"></a>{{index.name}} | {{index.unique and 'yes' or 'no'}} | {{string.join(index.get_column_names(), ', ')}} | {{cell(descs.get_index(index.name, 'shortdesc'))}} |
+{% endfor %}
+{% else %}
+None.
+{% endif %}
+{{r.footer()}}''', 'r, page, table, descs', _MARKDOWN, 'markdown table page')
+
+    front_template = template.Template('''\
+{{r.header("Table index", 'Table index | [Symbol index](symbol-index.md)')}}\
+{% if notes %}
+## Notes
+
+{{notes}}
+
+{% endif %}
+See also the [diagrams](diagrams.md) of the tables joined by foreign keys.
+
+## Tables
+
+| Table | Summary |
+| --- | --- |
+{% for name in table_names %}
+| [{{name}}](table-{{name}}.md) | {{cell(descs.get_table(name).get('shortdesc', "no summary available"))}} |
+{% endfor %}
+{{r.footer()}}''', 'r, notes, table_names, descs', _MARKDOWN, 'markdown front page')
+
+    symbol_page_start_template = template.Template('''\
+{{r.header("Symbol index: " + heading, '[Table index](index.md) | [Symbol index](symbol-index.md) | ' + heading)}}\
+''', 'r, heading', _MARKDOWN, 'markdown symbol page')
+
+    symbol_entries_template = template.Template('''\
+{% for item, descr, href in entries %}
+* [{{item}}]({{href}}) ({{descr}})
+{% endfor %}
+''', 'r, entries', _MARKDOWN, 'markdown symbol entries')
+
+    symbol_index_template = template.Template('''\
+{{r.header("Symbol index", '[Table index](index.md) | Symbol index')}}\
+## Symbols by initial
+
+| Initial | Symbols |
+| --- | --- |
+{% for initial, filename, count in letters %}
+| [{{cell(string.upper(initial))}}]({{filename}}) | {{count}} |
+{% endfor %}
+{{r.footer()}}''', 'r, letters', _MARKDOWN, 'markdown symbol index')
+
+    diagrams_page_start_template = template.Template('''\
+{{r.header("Diagrams", '[Table index](index.md) | [Symbol index](symbol-index.md) | Diagrams')}}\
+Each group of tables joined by foreign keys has a diagram; groups of more than {{cluster_size}} tables have a diagram of their clusters of tables, each of which has a diagram of its own.
+
+| First table | Tables | Diagram | Clusters |
+| --- | --- | --- | --- |
+''', 'r, cluster_size', _MARKDOWN, 'markdown diagrams page')
+
+    diagram_entry_template = template.Template('''\
+| {{names[0]}} | {{len(names)}} | [SVG](er/{{name}}.svg) \\| [DOT](er/{{name}}.dot) | \
+{% if clusters is not None %}
+{{string.join(['[%s](er/cluster-%s.svg)' % (cluster[0], cluster[0]) for cluster in clusters], ', ')}}\
+{% endif %}
+ |
+''', 'r, name, names, clusters', _MARKDOWN, 'markdown diagram entry')
+
+    diagrams_page_end_template = template.Template('''\
+
+{{undrawn}} tables with no foreign keys are not drawn.
+{{r.footer()}}''', 'r, undrawn', _MARKDOWN, 'markdown diagrams page end')
+
+
+##############################################################################
+# JSON
+##############################################################################
+
+def dumps_json(data, **options):
+    """Return data as JSON text, as json.dumps(data, **options) would with
+       the names and descriptions in it treated as Latin-1, like the
+       unlabelled pages, so that each byte is one character and no name
+       can fail to encode.  Encoding as UTF-8 is much quicker, and gives
+       the same result unless there are \\u escapes for characters beyond
+       ASCII or a string isn't valid UTF-8.
+    """
+    try:
+        text = json.dumps(data, **options)
+    except UnicodeDecodeError:
+        text = '\\u'
+    if '\\u' in text:
+        options['encoding'] = 'latin-1'
+        text = json.dumps(data, **options)
+    return text
+
+class JSONRenderer(Renderer):
+    """Writes each page as a JSON document, for other programs to read.
+       Names are treated as Latin-1, as for fkgraph.json.
+    """
+    name = 'json'
+    extension = '.json'
+
+    def _dumps(self, data):
+        # Sorting the keys would be slow
+        return dumps_json(data, separators=(',', ':'))
+
+    def table_page(self, page):
+        table = page.table
+        descs = page.descs
+        columns = []
+        for col in table.get_columns():
+            columns.append({'name': col.name, 'type': col.type,
+                            'length': col.length,
+                            'nullable': bool(col.nullable),
+                            'default': col.default_value,
+                            'references': col.references and list(col.references),
+                            'primary_key': col.name == table.primary_key_name,
+                            'shortdesc': descs.get_column(col.name, 'shortdesc')})
+        indexes = []
+        for index in table.get_indexes():
+            indexes.append({'name': index.name, 'unique': bool(index.unique),
+                            'columns': list(index.get_column_names()),
+                            'shortdesc': descs.get_index(index.name, 'shortdesc')})
+        refs = [{'table': other_table, 'column': other_col,
+                 'shortdesc': other_descs.get_column(other_col, 'shortdesc')}
+                for other_table, other_col, other_descs in page.refs]
+        cycle = None
+        if page.cycle:
+            cycle = {'tables': page.cycle[0], 'size': page.cycle[1]}
+        diagram = None
+        if page.diagram_name:
+            diagram = 'er/%s.svg' % page.diagram_name
+        data = {'schema': self.schema_name, 'table': table.name,
+                'shortdesc': descs.get('shortdesc'),
+                'notes': descs.get('notes'),
+                'primary_key': table.primary_key_name,
+                'columns': columns, 'referenced_by': refs,
+                'dependencies': {'tables': page.dependencies[0],
+                                 'complete': bool(page.dependencies[1])},
+                'dependents': {'tables': page.dependents[0],
+                               'complete': bool(page.dependents[1])},
+                'cycle': cycle, 'diagram': diagram,
+                'indexes': indexes}
+        return self._dumps(data) + '\n'
+
+    def front_page(self, notes, table_names, descs):
+        tables = [{'name': name, 'href': 'table-%s.json' % name,
+                   'shortdesc': descs.get_table(name).get('shortdesc')}
+                  for name in table_names]
+        return self._dumps({'schema': self.schema_name, 'notes': notes,
+                            'tables': tables}) + '\n'
+
+    def symbol_page_start(self, heading):
+        return '{"initial":%s,"symbols":[' % self._dumps(heading)
+
+    def symbol_entries(self, entries, first):
+        text = self._dumps([{'name': item, 'description': descr, 'href': href}
+                            for item, descr, href in entries])[1:-1]
+        if first:
+            return text
+        return ',' + text
+
+    def symbol_page_end(self):
+        return ']}\n'
+
+    def symbol_index(self, letters):
+        return self._dumps({'schema': self.schema_name,
+                            'initials': [{'initial': string.upper(initial),
+                                          'href': filename, 'count': count}
+                                         for initial, filename, count in letters]}) + '\n'
+
+    def diagrams_page_start(self, cluster_size):
+        return '{"cluster_size":%d,"diagrams":[' % cluster_size
+
+    def diagram_entry(self, name, names, clusters, first):
+        data = {'first_table': names[0], 'tables': len(names),
+                'svg': 'er/%s.svg' % name, 'dot': 'er/%s.dot' % name,
+                'clusters': clusters and ['er/cluster-%s.svg' % cluster[0]
+                                          for cluster in clusters]}
+        if first:
+            return self._dumps(data)
+        return ',' + self._dumps(data)
+
+    def diagrams_page_end(self, undrawn):
+        return '],"undrawn":%d}\n' % undrawn
+
+
+RENDERERS = {}
+for _class in (HTMLRenderer, MarkdownRenderer, JSONRenderer):
+    RENDERERS[_class.name] = _class
+del _class
+
+def get_renderer(name):
+    """Return the renderer class called name, which is either one of
+       RENDERERS or the dotted name of a class in some other module
+    """
+    if RENDERERS.has_key(name):
+        return RENDERERS[name]
+    if '.' not in name:
+        raise ValueError, "unknown output format %s (not one of %s)" % \
+              (name, string.join(sorted(RENDERERS.keys()), ', '))
+    module_name, class_name = name.rsplit('.', 1)
+    try:
+        module = __import__(module_name, {}, {}, [class_name])
+        return getattr(module, class_name)
+    except (ImportError, AttributeError), e:
+        raise ValueError, "cannot load renderer %s: %s" % (name, e)
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    assert get_renderer('html') is HTMLRenderer
+    assert get_renderer(__name__ + '.JSONRenderer') is JSONRenderer
+    for bad in ('pdf', 'nosuchmodule.Renderer'):
+        try:
+            get_renderer(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError, "no error for %s" % bad
+
+    entries = [('a|b', 'column in table t', 'table-t.html#col-a|b')]
+    for cls in RENDERERS.values():
+        r = cls('shop')
+        text = r.symbol_page_start('A') + r.symbol_entries(entries, 1) + \
+               r.symbol_entries(entries, 0) + r.symbol_page_end()
+        assert text.count('a|b') == 4, (cls, text)
+        text = r.diagrams_page_start(50) + \
+               r.diagram_entry('component-a', ['a', 'b'], None, 1) + \
+               r.diagram_entry('component-c', ['c'] * 60,
+                               [['c'], ['d']], 0) + \
+               r.diagrams_page_end(3)
+        assert 'er/cluster-d.svg' in text and 'component-a' in text, text
+    data = json.loads(JSONRenderer('shop').symbol_page_start('A') +
+                      JSONRenderer('shop').symbol_entries(entries, 1) + ']}')
+    assert data['symbols'][0]['name'] == 'a|b'
+    assert _md_cell('x|y\nz') == 'x\\|y z'
+    assert _html_table_list(['a', 'b'], 0) == \
+           '<a href="table-a.html">a</a>, <a href="table-b.html">b</a> and others'
+
+    # Names that aren't UTF-8 are taken as Latin-1
+    assert dumps_json(['caf\xe9']) == '["caf\\u00e9"]'
+    assert dumps_json({'a': 'b'}, separators=(',', ':')) == '{"a":"b"}'
+    import dbdoc, fakedb, pgschema, progress, tempfile, shutil
+    schema = pgschema.PostgresSchema(fakedb.connect(fakedb.SyntheticCatalog(
+        'postgres', 5, 3)), 'test')
+    cols = schema._column_info['tab_000002']
+    cols[1] = ('caf\xe9',) + cols[1][1:]
+    progress.reporter = progress.Quiet()
+    directory = tempfile.mkdtemp()
+    try:
+        for cls in RENDERERS.values():
+            dbdoc.StandardDoclet(schema, directory, None, renderer=cls)
+        data = json.load(open(os.path.join(directory, 'table-tab_000002.json')))
+        assert data['columns'][1]['name'] == u'caf\xe9', data['columns'][1]
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Compares two schemas (see schema_api.txt), finding the tables added,
+# removed and altered, and for each altered table the columns (type,
+# length, nullability, default and foreign key), primary key and indexes
+# that changed.
+#
+# The tables of both schemas are walked together in name order, so
+# streaming schemas (with iter_tables()) are compared a table at a time.
+# Each table is first reduced to a digest of a tuple of its attributes,
+# and only tables whose digests differ are described and compared in
+# detail.  A schema's digests can be recorded with it (record_digests(),
+# which snapshot.save() calls), and are then compared as they are, so an
+# unchanged table costs a string comparison; otherwise its table object
+# is built and digested during the comparison, at the cost of a tuple, its
+# repr() and an md5.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import render
+import hashlib, json, os, string, datetime
+
+COLUMN_ATTRIBUTES = ('type', 'length', 'nullable', 'default', 'references')
+
+# Changed whenever table_digest() does, so that recorded digests made the
+# old way are not compared with new ones
+DIGEST_VERSION = 2
+
+def describe_table(table):
+    """Return a dictionary describing table in plain values:
+       {'columns': [{'name': ..., 'type': ..., 'length': ..., 'nullable':
+       ..., 'default': ..., 'references': [table, column] or None}],
+       'primary_key': ..., 'indexes': [{'name': ..., 'unique': ...,
+       'columns': [...]}]}, with the columns in table order and the indexes
+       in name order
+    """
+    columns = []
+    for col in table.get_columns():
+        references = col.references
+        if references is not None:
+            references = list(references)
+        columns.append({'name': col.name, 'type': col.type,
+                        'length': col.length, 'nullable': bool(col.nullable),
+                        'default': col.default_value,
+                        'references': references})
+    indexes = [{'name': index.name, 'unique': bool(index.unique),
+                'columns': list(index.get_column_names())}
+               for index in table.get_indexes()]
+    indexes.sort(lambda a, b: cmp(a['name'], b['name']))
+    return {'columns': columns, 'primary_key': table.primary_key_name,
+            'indexes': indexes}
+
+def table_digest(table):
+    """Return a digest of table's definition which changes when it does.
+       Values are normalised first, so that the same definition read
+       through different drivers (giving 4L for 4, or u'x' for 'x') has
+       the same digest.
+    """
+    columns = tuple([(_plain(col.name), _plain(col.type), _plain(col.length),
+                      bool(col.nullable), _plain(col.default_value),
+                      col.references and tuple(map(_plain, col.references)))
+                     for col in table.get_columns()])
+    indexes = [(_plain(index.name), bool(index.unique),
+                tuple(map(_plain, index.get_column_names())))
+               for index in table.get_indexes()]
+    indexes.sort()
+    return hashlib.md5(repr((columns, _plain(table.primary_key_name),
+                             tuple(indexes)))).digest()
+
+def _plain(value):
+    if isinstance(value, unicode):
+        # Names are treated as Latin-1 elsewhere (see render.dumps_json)
+        try:
+            return value.encode('latin-1')
+        except UnicodeError:
+            return value.encode('utf-8')
+    if isinstance(value, long):
+        return int(value)
+    return value
+
+def record_digests(schema):
+    """Digest every table of schema and keep the digests with it, so that
+       they are saved in its pickle and diff_schemas() needn't build its
+       tables again.  The schema must not change afterwards.
+    """
+    digests = {}
+    for table in schema.get_tables():
+        digests[table.name] = table_digest(table)
+    schema._table_digests = (DIGEST_VERSION, digests)
+
+def _recorded_digests(schema):
+    recorded = getattr(schema, '_table_digests', None)
+    if recorded is None or recorded[0] != DIGEST_VERSION:
+        return None
+    return recorded[1]
+
+class SchemaDiff:
+    def __init__(self):
+        self.added = []         # names of tables only in the new schema
+        self.removed = []       # names of tables only in the old schema
+        self.altered = []       # (table name, changes) as from diff_tables
+        self.unchanged = 0      # number of tables the same in both
+
+    def is_empty(self):
+        return not (self.added or self.removed or self.altered)
+
+    def to_json(self):
+        "Return the differences as a dictionary of plain values"
+        return {'added_tables': self.added, 'removed_tables': self.removed,
+                'altered_tables': [dict(changes, table=name)
+                                   for name, changes in self.altered],
+                'unchanged_tables': self.unchanged}
+
+    def write_json(self, path):
+        _write_file(path, render.dumps_json(self.to_json(), indent=1,
+                                            sort_keys=True, default=repr) + '\n')
+
+    def summary(self):
+        return "%d tables added, %d removed, %d altered, %d unchanged" % \
+               (len(self.added), len(self.removed), len(self.altered),
+                self.unchanged)
+
+    def write_html(self, path, old_name, new_name):
+        "Write the differences as an HTML page at path"
+        title = 'Schema changes: %s to %s' % (_escape(old_name), _escape(new_name))
+        out = []
+        w = out.append
+        w('<html><head><title>DBDoc: %s</title></head>\n'
+          '<body bgcolor="#ffffff">\n' % title)
+        w('<h1>%s</h1>\n' % title)
+        w('<hr noshade size=1>\n')
+        w('<p>%s</p>\n' % self.summary())
+        for heading, names in (('Added tables', self.added),
+                               ('Removed tables', self.removed)):
+            if names:
+                w('<h2>%s</h2>\n<ul>\n' % heading)
+                for name in names:
+                    w('<li>%s</li>\n' % _escape(name))
+                w('</ul>\n')
+        if self.altered:
+            w('<h2>Altered tables</h2>\n')
+        for name, changes in self.altered:
+            w('<h3>%s</h3>\n' % _escape(name))
+            w('<table border=1>\n<tr bgcolor="#CCCCFF"><th>Kind</th><th>Name</th>'
+              '<th>Change</th><th>Old</th><th>New</th></tr>\n')
+            for kind, item, change, old, new in _change_rows(changes):
+                w('<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td>%s</td></tr>\n' %
+                  (kind, _escape(item), change, _show(old), _show(new)))
+            w('</table>\n')
+        w('<br><hr size=1 noshade>\n'
+          '<small>Generated by <a href="https://github.com/purcell/dbdoc">dbdoc</a>,\n'
+          '(c) 2001-%d Steve Purcell</small>\n</body></html>\n' %
+          datetime.date.today().year)
+        _write_file(path, string.join(out, ''))
+
+def diff_schemas(old, new):
+    """Return a SchemaDiff of the changes from schema old to schema new.
+       The digests recorded with either schema by record_digests() are
+       used in place of its tables wherever they can be.
+    """
+    diff = SchemaDiff()
+    old_entries = _iter_entries(old)
+    new_entries = _iter_entries(new)
+    old_entry = _next(old_entries)
+    new_entry = _next(new_entries)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None or \
+               (old_entry is not None and old_entry[0] < new_entry[0]):
+            diff.removed.append(old_entry[0])
+            old_entry = _next(old_entries)
+        elif old_entry is None or new_entry[0] < old_entry[0]:
+            diff.added.append(new_entry[0])
+            new_entry = _next(new_entries)
+        else:
+            name = new_entry[0]
+            changes = None
+            if old_entry[1] != new_entry[1]:
+                old_table = old_entry[2] or old.get_table(name)
+                new_table = new_entry[2] or new.get_table(name)
+                changes = diff_tables(describe_table(old_table),
+                                      describe_table(new_table))
+            if changes:
+                diff.altered.append((name, changes))
+            else:
+                # The digests can differ over values that compare equal
+                diff.unchanged = diff.unchanged + 1
+            old_entry = _next(old_entries)
+            new_entry = _next(new_entries)
+    return diff
+
+def diff_tables(old, new):
+    """Return the changes between two table descriptions (as from
+       describe_table): {'columns': {'added': [column], 'removed':
+       [column], 'altered': [{'name': ..., attribute: [old, new], ...}]},
+       'indexes': likewise, 'primary_key': [old, new]}, leaving out
+       anything that didn't change
+    """
+    changes = {}
+    columns = _diff_named(old['columns'], new['columns'], COLUMN_ATTRIBUTES)
+    if columns:
+        changes['columns'] = columns
+    indexes = _diff_named(old['indexes'], new['indexes'], ('unique', 'columns'))
+    if indexes:
+        changes['indexes'] = indexes
+    if old['primary_key'] != new['primary_key']:
+        changes['primary_key'] = [old['primary_key'], new['primary_key']]
+    return changes
+
+def _diff_named(old, new, attributes):
+    old_by_name = dict([(item['name'], item) for item in old])
+    new_by_name = dict([(item['name'], item) for item in new])
+    added = [item for item in new if not old_by_name.has_key(item['name'])]
+    removed = [item for item in old if not new_by_name.has_key(item['name'])]
+    altered = []
+    for item in new:
+        before = old_by_name.get(item['name'])
+        if before is None:
+            continue
+        change = {}
+        for attr in attributes:
+            if before[attr] != item[attr]:
+                change[attr] = [before[attr], item[attr]]
+        if change:
+            change['name'] = item['name']
+            altered.append(change)
+    changes = {}
+    for key, value in (('added', added), ('removed', removed),
+                       ('altered', altered)):
+        if value:
+            changes[key] = value
+    return changes
+
+def _change_rows(changes):
+    "Yield (kind, name, change, old, new) rows describing a table's changes"
+    for kind, attributes in (('column', COLUMN_ATTRIBUTES),
+                             ('index', ('unique', 'columns'))):
+        named = changes.get(kind == 'column' and 'columns' or 'indexes', {})
+        for item in named.get('added', []):
+            yield kind, item['name'], 'added', None, _summary(item, attributes)
+        for item in named.get('removed', []):
+            yield kind, item['name'], 'removed', _summary(item, attributes), None
+        for item in named.get('altered', []):
+            for attr in attributes:
+                if item.has_key(attr):
+                    old, new = item[attr]
+                    yield kind, item['name'], attr, old, new
+    if changes.has_key('primary_key'):
+        old, new = changes['primary_key']
+        yield 'primary key', '', 'columns', old, new
+
+def _summary(item, attributes):
+    return string.join(['%s=%s' % (attr, _plain(item[attr]))
+                        for attr in attributes], ', ')
+
+def _plain(value):
+    if isinstance(value, list):
+        return string.join(map(str, value), '.')
+    return str(value)
+
+def _show(value):
+    if value is None:
+        return '&nbsp;'
+    return _escape(_plain(value))
+
+def _iter_entries(schema):
+    """Yield (table name, digest, table or None) for the tables of schema
+       in name order, the table being None when the digest was recorded
+    """
+    digests = _recorded_digests(schema)
+    if digests is not None:
+        for name in sorted(digests.keys()):
+            yield name, digests[name], None
+        return
+    if hasattr(schema, 'iter_tables'):
+        tables = schema.iter_tables()
+    else:
+        tables = sorted(schema.get_tables(), None, lambda t: t.name)
+    for table in tables:
+        yield table.name, table_digest(table), table
+
+def _next(iterator):
+    for item in iterator:
+        return item
+    return None
+
+def _escape(text):
+    return string.replace(string.replace(string.replace(str(text), '&', '&amp;'),
+                                         '<', '&lt;'), '>', '&gt;')
+
+def _write_file(path, text):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    f = open(tmp_path, 'w')
+    try:
+        f.write(text)
+    finally:
+        f.close()
+    os.rename(tmp_path, path)
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import fakedb, pgschema, tempfile, pickle
+    def schema(ntables):
+        return pgschema.PostgresSchema(fakedb.connect(fakedb.SyntheticCatalog(
+            'postgres', ntables, 6, fk_density=0, indexes=2)), 'test')
+    old, new = schema(20), schema(22)
+    del new._column_info['tab_000004']
+    cols = new._column_info['tab_000007']
+    attr, typ, nullable, hasdef, length = cols[2]
+    cols[2] = (attr, 'text', not nullable, hasdef, length)
+    cols.append(('extra', 'int4', 1, 0, 4))
+    cols.append(('caf\xe9', 'int4', 1, 0, 4))     # not UTF-8
+    new._foreign_keys['tab_000009'] = {'col_001': ('tab_000001', 'id')}
+    new._primary_keys['tab_000011'] = 'col_002'
+    indexes = new._indexes['tab_000012']
+    index_name = sorted(indexes.keys())[-1]
+    indexes[index_name] = (indexes[index_name][0], not indexes[index_name][1])
+
+    diff = diff_schemas(old, new)
+    assert diff.added == ['tab_000020', 'tab_000021'], diff.added
+    assert diff.removed == ['tab_000004'], diff.removed
+    assert [table for table, changes in diff.altered] == \
+           ['tab_000007', 'tab_000009', 'tab_000011', 'tab_000012']
+    assert diff.unchanged == 15, diff.unchanged
+    changes = dict(diff.altered)
+    assert changes['tab_000007']['columns']['added'][0]['name'] == 'extra'
+    altered = changes['tab_000007']['columns']['altered'][0]
+    assert altered['name'] == attr and altered['type'] == [typ, 'text']
+    assert altered['nullable'] == [bool(nullable), not nullable]
+    assert changes['tab_000009']['columns']['altered'] == \
+           [{'name': 'col_001', 'references': [None, ['tab_000001', 'id']]}]
+    assert changes['tab_000011'] == {'primary_key': ['id', 'col_002']}
+    assert changes['tab_000012']['indexes']['altered'][0]['name'] == index_name
+    assert diff_schemas(old, old).is_empty()
+
+    # Recorded digests give the same answer, without building the tables
+    old = pickle.loads(pickle.dumps(old))
+    record_digests(old)
+    old = pickle.loads(pickle.dumps(old))
+    assert old._tables == {}
+    recorded = diff_schemas(old, new)
+    assert recorded.to_json() == diff.to_json()
+    assert sorted(old._tables.keys()) == [name for name, changes in diff.altered]
+    record_digests(new)
+    assert diff_schemas(old, new).to_json() == diff.to_json()
+    old._table_digests = (DIGEST_VERSION + 1, {})
+    assert diff_schemas(old, new).to_json() == diff.to_json()
+
+    # The same definitions, as another driver might give them
+    old, other = schema(5), schema(5)
+    for table, cols in other._column_info.items():
+        other._column_info[table] = [(unicode(attr), unicode(typ), nullable,
+                                      hasdef, length is not None and long(length))
+                                     for attr, typ, nullable, hasdef, length in cols]
+    assert table_digest(old.get_table('tab_000001')) == \
+           table_digest(other.get_table('tab_000001'))
+    other._column_info['tab_000002'][0] = ('id', 'int4', 1, 0, 4L)
+    old._table_digests = (DIGEST_VERSION, {'tab_000001': 'x', 'tab_000002': 'y',
+                                           'tab_000003': 'z', 'tab_000004': '',
+                                           'tab_000000': ''})
+    other_diff = diff_schemas(old, other)
+    assert other_diff.unchanged == 4, other_diff.to_json()
+    assert [name for name, changes in other_diff.altered] == ['tab_000002']
+
+    directory = tempfile.mkdtemp()
+    try:
+        diff.write_json(os.path.join(directory, 'diff.json'))
+        diff.write_html(os.path.join(directory, 'diff.html'), 'old', 'new')
+        data = json.load(open(os.path.join(directory, 'diff.json')))
+        assert data['removed_tables'] == ['tab_000004']
+        assert len(data['altered_tables']) == 4
+        assert [col['name'] for col in
+                data['altered_tables'][0]['columns']['added']] == \
+               ['extra', u'caf\xe9']
+        assert 'tab_000012' in open(os.path.join(directory, 'diff.html')).read()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    test()
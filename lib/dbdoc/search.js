@@ -0,0 +1,72 @@
+// Symbol search box for dbdoc output.
+//
+// The symbol index is split into shards holding the names that start with
+// the same two characters (lowercased), written as search/<token>.js by
+// StandardDoclet._generate_index.  Each shard calls dbdocSearch.load(); a
+// shard is only fetched once something starting with its two characters
+// is typed.  Shards are loaded with script tags rather than as JSON over
+// XMLHttpRequest so that the search also works for pages opened straight
+// from disk.
+
+var dbdocSearch = (function () {
+    var shards = {}, requested = {}, input, results, limit = 200;
+
+    function lower(s) {
+        return s.replace(/[A-Z]+/g, function (c) { return c.toLowerCase(); });
+    }
+
+    // Must match _search_token in dbdoc.py
+    function token(s) {
+        return s.replace(/[^a-z0-9]/g, function (c) {
+            var hex = c.charCodeAt(0).toString(16);
+            return '_' + (hex.length < 2 ? '0' + hex : hex);
+        });
+    }
+
+    function request(t) {
+        var script = document.createElement('script');
+        requested[t] = 1;
+        script.src = 'search/' + t + '.js';
+        script.onerror = function () { load(t, []); };
+        document.body.appendChild(script);
+    }
+
+    function show() {
+        var query = lower(input.value), t, entries, html = [], i;
+        if (query.length < 2) {
+            results.innerHTML = '';
+            return;
+        }
+        t = token(query.substring(0, 2));
+        entries = shards[t];
+        if (entries === undefined) {
+            if (!requested[t]) {
+                request(t);
+            }
+            return;
+        }
+        for (i = 0; i < entries.length && html.length < limit; i++) {
+            if (lower(entries[i][0]).indexOf(query) === 0) {
+                html.push('<a href="' + entries[i][2] + '">' + entries[i][0] +
+                          '</a> (' + entries[i][1] + ')<br>');
+            }
+        }
+        results.innerHTML = html.length ? html.join('\n') : 'No matches.';
+    }
+
+    function load(t, entries) {
+        shards[t] = entries;
+        if (input) {
+            show();
+        }
+    }
+
+    function init(inputId, resultsId) {
+        input = document.getElementById(inputId);
+        results = document.getElementById(resultsId);
+        input.onkeyup = show;
+        show();
+    }
+
+    return {init: init, load: load};
+})();
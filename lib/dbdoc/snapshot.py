@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Saves schema objects to disk and reloads them, so that the catalog only
+# needs to be read again when it has changed.
+#
+# A snapshot file holds a short header identifying the format and the
+# catalog fingerprint it was taken at, followed by the zlib-compressed
+# pickle of the schema object.  The fingerprint is whatever the schema
+# implementation's get_fingerprint(conn) returns (plus anything else the
+# caller wants to key on); it is checked before the schema is unpickled.
+# The schema is saved with the digests of its tables (see
+# schemadiff.record_digests), so that comparing a snapshot with another
+# schema needn't rebuild its unchanged tables.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import schemadiff
+import cPickle, zlib, gc, os
+
+MAGIC = 'dbdoc-snapshot\n'
+FORMAT_VERSION = 1
+
+def save(path, schema, fingerprint):
+    """Write schema to path, tagged with fingerprint.  The file is written
+       under a temporary name and renamed into place, so a concurrent
+       load() never sees a partial snapshot.
+    """
+    schemadiff.record_digests(schema)
+    body = zlib.compress(cPickle.dumps(schema, cPickle.HIGHEST_PROTOCOL), 1)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    f = open(tmp_path, 'wb')
+    try:
+        f.write(MAGIC)
+        cPickle.dump((FORMAT_VERSION, fingerprint), f, cPickle.HIGHEST_PROTOCOL)
+        f.write(body)
+    finally:
+        f.close()
+    os.rename(tmp_path, path)
+
+def load(path, fingerprint):
+    """Return the schema saved in path if it was saved with an equal
+       fingerprint, otherwise None.  A missing file, or one written by a
+       different snapshot format version, also gives None.
+    """
+    return _load(path, lambda saved: saved == fingerprint)
+
+def load_any(path):
+    """Return the schema saved in path whatever its fingerprint, or None
+       as for load()
+    """
+    return _load(path, lambda saved: 1)
+
+def _load(path, accept):
+    try:
+        f = open(path, 'rb')
+    except IOError:
+        return None
+    try:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        version, saved_fingerprint = cPickle.load(f)
+        if version != FORMAT_VERSION or not accept(saved_fingerprint):
+            return None
+        body = zlib.decompress(f.read())
+    finally:
+        f.close()
+    # Unpickling creates millions of small containers, each of which would
+    # otherwise count towards triggering a (pointless) collection
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return cPickle.loads(body)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Sorts a stream of items too large to hold in memory at once.  Items are
+# added in small runs (such as the symbols of one table), which are sorted
+# together and spilled to a temporary file once enough have built up;
+# iterating over the spool then does a k-way merge of the spilled files.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import heapq, marshal, tempfile
+
+class SortSpool:
+    """Collects items (which must be marshallable, such as tuples of
+       strings) and yields them back in sorted order.  At most about
+       'run_size' items are held in memory while adding.
+    """
+    chunk_size = 4096   # items per marshalled record in a spill file
+
+    def __init__(self, run_size=100000):
+        self.run_size = run_size
+        self._items = []        # items not yet spilled
+        self._files = []        # spill files, each holding one sorted run
+
+    def __len__(self):
+        return len(self._items) + sum([n for f, n in self._files])
+
+    def add_run(self, items):
+        "Add a list of items (which needn't be sorted)"
+        self._items.extend(items)
+        if len(self._items) >= self.run_size:
+            self._spill()
+
+    def _spill(self):
+        # One sort of everything buffered is much quicker than a heapq
+        # merge of that many small runs
+        self._items.sort()
+        f = tempfile.TemporaryFile()
+        for i in range(0, len(self._items), self.chunk_size):
+            marshal.dump(self._items[i:i+self.chunk_size], f)
+        self._files.append((f, len(self._items)))
+        self._items = []
+
+    def __iter__(self):
+        "Yield every item added, in sorted order"
+        self._items.sort()
+        if not self._files:
+            return iter(self._items)
+        return heapq.merge(*(map(_read_run, [f for f, n in self._files]) +
+                             [self._items]))
+
+    def close(self):
+        "Discard the items and remove the spill files"
+        for f, n in self._files:
+            f.close()
+        self._files = []
+        self._items = []
+
+def _read_run(f):
+    f.seek(0)
+    while 1:
+        try:
+            chunk = marshal.load(f)
+        except EOFError:
+            return
+        for item in chunk:
+            yield item
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import random
+    items = [(random.random(), str(i)) for i in range(50000)]
+    spool = SortSpool(run_size=7000)
+    for i in range(0, len(items), 37):
+        spool.add_run(items[i:i+37])
+    assert len(spool._files) == 7, len(spool._files)
+    assert len(spool) == len(items)
+    assert list(spool) == sorted(items)
+    assert list(spool) == sorted(items)   # can be iterated again
+    spool.close()
+    assert list(SortSpool()) == []
+
+
+if __name__ == '__main__':
+    test()
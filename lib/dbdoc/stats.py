@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Records where the time goes in a run: each catalog query, each phase of
+# the doclet, and the rendering and writing of each page.
+#
+# Recording is off unless a Recorder is installed as stats.recorder.  The
+# instrumented code looks the recorder up once per query, phase or page,
+# so when it is off the cost is one global lookup and test each time.
+# Pages written by forked worker processes (StandardDoclet's jobs > 1)
+# aren't recorded individually, though the phase they belong to is.
+#
+# The events can be printed as a summary table, or saved in the Chrome
+# trace event format for viewing in chrome://tracing or Perfetto.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import time, os, json, thread
+
+recorder = None     # the Recorder in use, if any
+
+class Recorder:
+    def __init__(self):
+        self.start = time.time()
+        # (category, name, start, duration, thread id, {argument: value});
+        # list.append is atomic, so loader threads can add to this safely
+        self.events = []
+
+    def add(self, category, name, start, duration, args=None):
+        self.events.append((category, name, start, duration,
+                            thread.get_ident(), args or {}))
+
+    def timed(self, category, name, function, args=()):
+        start = time.time()
+        try:
+            return function(*args)
+        finally:
+            self.add(category, name, start, time.time() - start)
+
+    def summary(self):
+        "Return a list of lines summarising the events"
+        phases = []
+        totals = {}     # {(category, name): [count, seconds, rows, bytes, max]}
+        for category, name, start, duration, tid, args in self.events:
+            if category == 'phase':
+                phases.append((start, name, duration))
+                continue
+            if category != 'query':
+                name = None     # pages and writes are summed together
+            total = totals.get((category, name))
+            if total is None:
+                total = totals[category, name] = [0, 0.0, 0, 0, 0.0]
+            total[0] = total[0] + 1
+            total[1] = total[1] + duration
+            total[2] = total[2] + args.get('rows', 0)
+            total[3] = total[3] + args.get('bytes', 0)
+            total[4] = max(total[4], duration)
+        lines = ['%-36s %10s' % ('phase', 'seconds')]
+        for start, name, duration in sorted(phases):
+            lines.append('%-36s %10.3f' % (name, duration))
+        lines.append('')
+        lines.append('%-36s %8s %10s %10s %12s %10s' %
+                     ('query / page / write', 'count', 'seconds', 'rows',
+                      'bytes', 'max'))
+        for (category, name), (count, seconds, rows, bytes, longest) in \
+                sorted(totals.items()):
+            lines.append('%-36s %8d %10.3f %10d %12d %10.3f' %
+                         ('%s %s' % (category, name or ''), count, seconds,
+                          rows, bytes, longest))
+        return lines
+
+    def print_summary(self):
+        for line in self.summary():
+            print line
+
+    def write_trace(self, path):
+        "Save the events to path as a Chrome trace (JSON object format)"
+        pid = os.getpid()
+        events = []
+        for category, name, start, duration, tid, args in self.events:
+            events.append({'name': name, 'cat': category, 'ph': 'X',
+                           'ts': int((start - self.start) * 1e6),
+                           'dur': int(duration * 1e6),
+                           'pid': pid, 'tid': tid, 'args': args})
+        f = open(path, 'w')
+        try:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        finally:
+            f.close()
+
+def add(category, name, start, duration, args=None):
+    "Record an event, if recording"
+    if recorder is not None:
+        recorder.add(category, name, start, duration, args)
+
+def timed(category, name, function, *args):
+    "Return function(*args), recording how long it took if recording"
+    if recorder is None:
+        return function(*args)
+    return recorder.timed(category, name, function, args)
+
+def report(summary=0, trace_file=None):
+    "Print the summary and/or write the trace of the events recorded, if any"
+    if recorder is None:
+        return
+    if summary:
+        recorder.print_summary()
+    if trace_file:
+        recorder.write_trace(trace_file)
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    import tempfile
+    global recorder
+    assert timed('phase', 'off', lambda x: x + 1, 1) == 2
+    recorder = Recorder()
+    try:
+        assert timed('phase', 'sum', lambda x, y: x + y, 1, 2) == 3
+        add('query', 'indexes', time.time(), 0.5, {'rows': 10, 'bytes': 99})
+        add('query', 'indexes', time.time(), 0.25, {'rows': 5, 'bytes': 1})
+        add('page', 'table-a.html', time.time(), 0.125)
+        lines = recorder.summary()
+        assert lines[1][:3] == 'sum', lines
+        assert ('%-36s %8d %10.3f %10d %12d %10.3f' %
+                ('query indexes', 2, 0.75, 15, 100, 0.5)) in lines, lines
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            recorder.write_trace(path)
+            trace = json.load(open(path))
+            assert len(trace['traceEvents']) == 4
+            assert trace['traceEvents'][1]['args'] == {'rows': 10, 'bytes': 99}
+            assert trace['traceEvents'][1]['dur'] == 500000
+        finally:
+            os.remove(path)
+    finally:
+        recorder = None
+
+
+if __name__ == '__main__':
+    test()
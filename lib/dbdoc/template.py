@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Page templates, compiled once into Python functions.  A template is
+# text containing
+#
+#   {{expression}}                      the expression's value, as by %s
+#   {% for target in expression %}      a loop, ended by {% endfor %}
+#   {% if expression %}                 a conditional, which may have
+#   {% elif expression %}               {% elif %} and {% else %} parts
+#   {% else %}                          and is ended by {% endif %}
+#
+# where the expressions are Python, in terms of the template's parameters
+# and the names in its namespace.  A newline straight after a {% %} tag
+# is dropped, so that tags can sit on lines of their own.
+#
+# Each run of text and {{ }} values between tags compiles to a single %
+# format operation, and a loop around just one such run compiles to a list
+# comprehension, so a template renders at least as quickly as the
+# equivalent hand-written formatting code.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import re, string
+
+class TemplateError(Exception): pass
+
+_TAG_RE = re.compile(r'(\{\{.*?\}\}|\{%.*?%\})', re.DOTALL)
+
+class Template:
+    def __init__(self, text, params='', namespace=None, name='template'):
+        """Compile text into a function taking the given parameters (a
+           string, as for a def statement), which can also use the names
+           in the namespace dictionary
+        """
+        self.text = text
+        self.params = params
+        self.name = name
+        source = _translate(text, params, name)
+        scope = dict(namespace or {})
+        try:
+            code = compile(source, '<%s>' % name, 'exec')
+        except SyntaxError, e:
+            raise TemplateError, "%s: %s" % (name, e)
+        exec code in scope
+        self.render = scope['_render']
+        self.source = source
+
+    def __call__(self, *args, **kwargs):
+        return self.render(*args, **kwargs)
+
+def _translate(text, params, name):
+    "Return the source of a function _render(params) which renders text"
+    lines = ['def _render(%s):' % params]
+    blocks = []         # the kinds of the blocks open
+    starts = []         # the index in lines of each open block's statement
+    run = []            # (is expression, text) since the last tag
+    writes = [0]        # how many _w() calls have been made
+    def flush():
+        if not run:
+            return
+        if [1 for is_expr, value in run if is_expr]:
+            fmt = string.join([is_expr and '%s' or string.replace(value, '%', '%%')
+                               for is_expr, value in run], '')
+            args = [value for is_expr, value in run if is_expr]
+            expr = '%r %% (%s,)' % (fmt, string.join(args, ', '))
+        else:
+            expr = repr(string.join([value for is_expr, value in run], ''))
+        lines.append('%s_w(%s)' % ('    ' * (len(blocks) + 1), expr))
+        writes[0] = writes[0] + 1
+        del run[:]
+    def statement(text):
+        lines.append('%s%s' % ('    ' * (len(blocks) + 1), text))
+
+    trim = 0
+    for token in _TAG_RE.split(text):
+        if trim and token.startswith('\n'):
+            token = token[1:]
+        trim = 0
+        if token.startswith('{{') and token.endswith('}}'):
+            run.append((1, '(%s)' % string.strip(token[2:-2])))
+        elif token.startswith('{%') and token.endswith('%}'):
+            trim = 1
+            flush()
+            words = string.split(string.strip(token[2:-2]), None, 1)
+            keyword = words and words[0] or ''
+            if keyword in ('for', 'if'):
+                statement('%s:' % string.strip(token[2:-2]))
+                blocks.append(keyword)
+                starts.append(len(lines) - 1)
+                statement('pass')
+            elif keyword in ('elif', 'else'):
+                if not blocks or blocks[-1] != 'if':
+                    raise TemplateError, "%s: %s outside if" % (name, keyword)
+                del blocks[-1]
+                statement('%s:' % string.strip(token[2:-2]))
+                blocks.append('if')
+                statement('pass')
+            elif keyword in ('endfor', 'endif'):
+                if not blocks or blocks[-1] != keyword[3:]:
+                    raise TemplateError, "%s: unexpected %s" % (name, keyword)
+                del blocks[-1]
+                start = starts.pop()
+                body = lines[start + 1:]
+                if keyword == 'endfor' and len(body) == 2 and \
+                       string.strip(body[1]).startswith('_w('):
+                    # for ...: _w(expr) becomes _x([expr for ...])
+                    loop = string.strip(lines[start])[:-1]
+                    expr = string.strip(body[1])[3:-1]
+                    lines[start:] = ['%s_x([%s %s])' % ('    ' * (len(blocks) + 1),
+                                                        expr, loop)]
+            else:
+                raise TemplateError, "%s: unknown tag %s" % (name, token)
+        elif token:
+            run.append((0, token))
+    if blocks:
+        raise TemplateError, "%s: unclosed %s" % (name, blocks[-1])
+    if writes[0] == 0 and len(lines) == 1:
+        # No tags: just the one format operation
+        if not run:
+            lines.append("    return ''")
+        else:
+            flush()
+            lines[-1] = lines[-1].replace('_w(', 'return (', 1)
+        return string.join(lines, '\n') + '\n'
+    flush()
+    lines[1:1] = ['    _out = []', '    _w = _out.append', '    _x = _out.extend']
+    lines.append("    return ''.join(_out)")
+    return string.join(lines, '\n') + '\n'
+
+
+##############################################################################
+# Test code that runs when the module is executed
+##############################################################################
+
+def test():
+    t = Template('<p>{{name}} is {{ 100 * n }}% done</p>\n', 'name, n')
+    assert t('x', 0.5) == '<p>x is 50.0% done</p>\n', t('x', 0.5)
+    assert 'return (' in t.source
+
+    t = Template('''<ul>
+{% for item, count in items %}
+<li>{{item}}{% if count > 1 %} ({{count}}){% endif %}</li>
+{% endfor %}
+</ul>
+{% if not items %}
+<p>None.</p>
+{% elif total %}
+<p>{{fmt(total)}} in all</p>
+{% else %}
+<p>100%</p>
+{% endif %}
+''', 'items, total=None', {'fmt': lambda n: '%.1f' % n})
+    assert t([('a', 1), ('b', 3)], 4) == \
+           '<ul>\n<li>a</li>\n<li>b (3)</li>\n</ul>\n<p>4.0 in all</p>\n', \
+           repr(t([('a', 1), ('b', 3)], 4))
+    assert t([('a', 1)]) == '<ul>\n<li>a</li>\n</ul>\n<p>100%</p>\n'
+    assert t([]) == '<ul>\n</ul>\n<p>None.</p>\n'
+    t = Template('{% for i in range(n) %}{{i}},{% endfor %}{{i}}', 'n, i=None')
+    assert '_x([' in t.source and t(3) == '0,1,2,2', t.source
+    assert Template('', '')() == ''
+    assert Template('{% if 1 %}{% endif %}', '')() == ''
+    for bad in ('{% if x %}', '{% endfor %}', '{% while 1 %}{% endwhile %}',
+                '{{ ) }}'):
+        try:
+            Template(bad, 'x')
+        except TemplateError:
+            pass
+        else:
+            raise AssertionError, "no error from %r" % bad
+
+
+if __name__ == '__main__':
+    test()
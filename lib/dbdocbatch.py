@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Generates HTML information for every database listed in a manifest; see
+# dbdoc/batch.py for the manifest format
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import dbdoc.batch
+import dbdoc.progress
+import getopt, sys, os, time
+
+def usage_exit(progname, msg=None):
+    if msg:
+        print msg
+        print
+    print "usage: %s [-j workers] [-o indexfile] [-q] [--log-json] manifest" % progname
+    sys.exit(2)
+
+def main(argv):
+    progname = os.path.basename(argv[0])
+    workers = None
+    index_file = None
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hj:o:q', ['help', 'jobs=', 'index=',
+                                                        'quiet', 'log-json'])
+        for opt, value in opts:
+            if opt in ('-h','--help'):
+                usage_exit(progname)
+            if opt in ('-j','--jobs'):
+                try:
+                    workers = int(value)
+                except ValueError:
+                    usage_exit(progname, "jobs must be an integer: %s" % value)
+            if opt in ('-o','--index'):
+                index_file = value
+            if opt in ('-q','--quiet'):
+                dbdoc.progress.reporter = dbdoc.progress.Quiet()
+            if opt == '--log-json':
+                dbdoc.progress.reporter = dbdoc.progress.Reporter(json_lines=1)
+    except getopt.error, e:
+        usage_exit(progname, e)
+    if len(args) != 1:
+        usage_exit(progname)
+
+    try:
+        settings, limits, jobs = dbdoc.batch.read_manifest(args[0])
+    except dbdoc.batch.ManifestError, e:
+        print e
+        sys.exit(1)
+    if not jobs:
+        print "no databases listed in %s" % args[0]
+        sys.exit(1)
+    start = time.time()
+    results = dbdoc.batch.run(jobs, workers or settings['workers'], limits)
+    seconds = time.time() - start
+    index_file = index_file or settings['index']
+    if index_file:
+        dbdoc.batch.write_index(index_file, results, seconds)
+    dbdoc.progress.reporter.message(dbdoc.batch.summary(results, seconds))
+    if [result for result in results if result.error]:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
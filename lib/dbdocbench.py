@@ -0,0 +1,491 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Times each phase of a dbdoc run against a synthetic catalog served by
+# dbdoc.fakedb, and writes the timings to a JSON results file; results
+# files from two revisions can then be compared with --compare.
+#
+# Each catalog loader is run once untimed to fetch its rows from the
+# synthetic catalog, and then timed (-r times) against a replay of those
+# rows, so that the time taken to make up the catalog isn't counted.
+#
+# With --model, the schema model is walked the way a doclet run walks
+# it instead, counting the table, column and index objects built (-t 1000
+# -c 100 gives a 100,000-column schema).  With --props LINES, a properties
+# file of that many lines is written and loaded both by
+# props.Properties.load and by the line-at-a-time loader it replaced.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import dbdoc.dbdoc
+import dbdoc.fakedb
+import dbdoc.pgschema
+import dbdoc.pgcatalog
+import dbdoc.oraschema
+import dbdoc.progress
+import dbdoc.render
+import dbdoc.props
+import getopt, sys, os, time, json, tempfile, shutil, platform, subprocess
+import random, string
+
+FORMAT_VERSION = 1
+
+# Differences smaller than this many seconds are put down to noise
+NOISE = 0.005
+
+BACKENDS = {
+    'postgres': (dbdoc.pgschema, dbdoc.pgschema.PostgresSchema,
+                 dbdoc.pgschema.PostgresSchemaStream),
+    'pgcatalog': (dbdoc.pgcatalog, dbdoc.pgcatalog.PgCatalogSchema,
+                  dbdoc.pgcatalog.PgCatalogSchemaStream),
+    'oracle': (dbdoc.oraschema, dbdoc.oraschema.OracleSchema,
+               dbdoc.oraschema.OracleSchemaStream),
+}
+
+LOADERS = ('_get_column_info', '_get_foreign_keys', '_get_column_defaults',
+           '_get_primary_keys', '_get_indexes')
+
+def usage_exit(progname, msg=None):
+    if msg:
+        print msg
+        print
+    print "usage: %s [-b postgres|pgcatalog|oracle] [-t tables] [-c columns] [-f fkdensity] [-x indexes] [-l latency] [-L fetchlatency] [-a arraysize] [-r repeat] [-p propsfile] [--format html|markdown|json] [--stream | --model | --props lines] resultsfile" % progname
+    print "       %s --compare [-T threshold] oldresults newresults" % progname
+    sys.exit(2)
+
+class Replay:
+    """A responder giving back the rows a catalog gave for each query the
+       first time it was asked
+    """
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.results = {}
+
+    def __call__(self, querystr):
+        rows = self.results.get(querystr)
+        if rows is None:
+            rows = self.results[querystr] = list(self.catalog(querystr))
+        return rows
+
+class TimedDoclet(dbdoc.dbdoc.StandardDoclet):
+    "Records how long each phase of generating the pages takes"
+
+    def __init__(self, timings, *args, **kwargs):
+        self.timings = timings
+        dbdoc.dbdoc.StandardDoclet.__init__(self, *args, **kwargs)
+
+    def _timed(self, phase, method):
+        start = time.time()
+        try:
+            return method(self)
+        finally:
+            self.timings.append((phase, time.time() - start))
+
+    def _get_fkeys(self):
+        return self._timed('fkeys', dbdoc.dbdoc.StandardDoclet._get_fkeys)
+
+    def _generate_table_pages(self):
+        return self._timed('table pages',
+                           dbdoc.dbdoc.StandardDoclet._generate_table_pages)
+
+    def _generate_front_page(self):
+        return self._timed('front page',
+                           dbdoc.dbdoc.StandardDoclet._generate_front_page)
+
+    def _generate_index(self):
+        return self._timed('symbol index',
+                           dbdoc.dbdoc.StandardDoclet._generate_index)
+
+def run_once(params):
+    "Return a list of (phase, seconds) for one run"
+    module, schema_class, stream_class = BACKENDS[params['backend']]
+    catalog = dbdoc.fakedb.SyntheticCatalog(
+        params['backend'], params['tables'], params['columns'],
+        params['fk_density'], params['indexes'], params['seed'])
+    if params['stream']:
+        # Streaming interleaves reading the catalog with writing pages, so
+        # there are no separate introspection phases to replay
+        responder = catalog
+    else:
+        responder = Replay(catalog)
+    def connect():
+        return dbdoc.fakedb.connect(responder, params['latency'],
+                                    params['fetch_latency'])
+    timings = []
+    if not params['stream']:
+        for name in LOADERS:
+            loader = getattr(module, name)
+            loader(connect())   # fill the replay
+            start = time.time()
+            loader(connect())
+            timings.append(('introspect.' + name, time.time() - start))
+        start = time.time()
+        schema = schema_class(connect(), params['backend'])
+        timings.append(('schema', time.time() - start))
+    else:
+        start = time.time()
+        schema = stream_class(connect(), params['backend'])
+        timings.append(('schema', time.time() - start))
+
+    outdir = tempfile.mkdtemp(prefix='dbdocbench')
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        TimedDoclet(timings, schema, outdir, params['props_file'],
+                    renderer=dbdoc.render.get_renderer(params['format']))
+        timings.append(('pages', time.time() - start))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(outdir)
+    return timings
+
+class ConstructionCounter:
+    "Counts the instances made of some classes, until stopped"
+
+    def __init__(self, classes):
+        self.count = 0
+        self.saved = []
+        for cls in classes:
+            self.saved.append((cls, cls.__dict__.get('__init__')))
+            cls.__init__ = self._counting(cls.__init__)
+
+    def _counting(self, init):
+        def counting_init(obj, *args, **kwargs):
+            self.count = self.count + 1
+            init(obj, *args, **kwargs)
+        return counting_init
+
+    def stop(self):
+        for cls, init in self.saved:
+            if init is None:
+                del cls.__init__
+            else:
+                cls.__init__ = init
+
+def walk_model(schema):
+    # As a doclet run does: the foreign key walk, three passes over each
+    # table's columns and two over its indexes while its page is built,
+    # and a lookup of the referencing column for each "Referenced by" entry
+    for table in schema.get_tables():
+        for col in table.get_columns():
+            col.references
+    for table in schema.get_tables():
+        for i in range(3):
+            for col in table.get_columns():
+                col.name
+        for i in range(2):
+            for index in table.get_indexes():
+                index.name
+        for col in table.get_columns():
+            if col.references:
+                schema.get_table(col.references[0]).get_column(col.references[1])
+
+def run_model_once(params):
+    """Return [('model', seconds)] and the number of model objects built
+       by walk_model() for one run
+    """
+    module, schema_class, stream_class = BACKENDS[params['backend']]
+    catalog = Replay(dbdoc.fakedb.SyntheticCatalog(
+        params['backend'], params['tables'], params['columns'],
+        params['fk_density'], params['indexes'], params['seed']))
+    # Another schema shows which classes the model objects are
+    sample = schema_class(dbdoc.fakedb.connect(catalog), params['backend'])
+    table = sample.get_tables()[0]
+    classes = [table.__class__, table.get_columns()[0].__class__]
+    if table.get_indexes():
+        classes.append(table.get_indexes()[0].__class__)
+    schema = schema_class(dbdoc.fakedb.connect(catalog), params['backend'])
+    counter = ConstructionCounter(classes)
+    try:
+        start = time.time()
+        walk_model(schema)
+        seconds = time.time() - start
+    finally:
+        counter.stop()
+    return [('model', seconds)], counter.count
+
+def write_props_file(path, lines, seed):
+    """Write a descriptions file of the given number of lines: a comment
+       every thousand lines and otherwise column shortdescs, a few of them
+       with escapes
+    """
+    generator = random.Random(seed)
+    f = open(path, 'w')
+    try:
+        for i in range(lines):
+            if i % 1000 == 0:
+                f.write('# tables %d on\n' % (i / 100))
+            elif generator.random() < 0.02:
+                f.write('table.tab_%06d.column.col_%03d.shortdesc='
+                        'Amount in \\u00A4,\\tsee the notes\n' % (i / 100, i % 100))
+            else:
+                f.write('table.tab_%06d.column.col_%03d.shortdesc='
+                        'Column %d of table %d, the customer reference\n' %
+                        (i / 100, i % 100, i % 100, i / 100))
+    finally:
+        f.close()
+
+_LOAD_TRANSLATIONS = dbdoc.props.Properties._LOAD_TRANSLATIONS
+
+def load_by_line(properties, stream):
+    "Load properties from stream a line at a time, as props.py used to"
+    while 1:
+        line = stream.readline()
+        if not line:
+            break
+        m = properties.PROPERTY_RE.match(line)
+        if m:
+            name, quote, value = m.groups()
+            properties[name] = _unescape_by_char(value)
+
+def _unescape_by_char(value):
+    chars = []
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '\\':
+            i = i + 1
+            c = value[i]
+            replacement = _LOAD_TRANSLATIONS.get(c, None)
+            if replacement:
+                chars.append(replacement)
+                i = i + 1
+            elif c == 'u':
+                code = value[i+1:i+5]
+                if len(code) != 4:
+                    raise ValueError, "illegal unicode escape sequence"
+                chars.append(chr(string.atoi(code, 16)))
+                i = i + 5
+            else:
+                raise ValueError, "unknown escape \\%s" % c
+        else:
+            chars.append(c)
+            i = i + 1
+    return string.join(chars, '')
+
+def run_props_once(params, path):
+    "Return [(phase, seconds)] for loading the properties file at path"
+    timings = []
+    loaded = []
+    for phase, load in (('props.load', dbdoc.props.Properties.load),
+                        ('props.load_by_line', load_by_line)):
+        properties = dbdoc.props.Properties()
+        f = open(path)
+        try:
+            start = time.time()
+            load(properties, f)
+            timings.append((phase, time.time() - start))
+        finally:
+            f.close()
+        loaded.append(properties.data)
+    if loaded[0] != loaded[1]:
+        raise AssertionError, "the loaders read %s differently" % path
+    return timings, None
+
+def run(params, repeat):
+    phases = []
+    times = {}
+    objects = None
+    for i in range(repeat):
+        if params['bench'] == 'model':
+            timings, objects = run_model_once(params)
+        elif params['bench'] == 'props':
+            timings, objects = run_props_once(params, params['props_file'])
+        else:
+            timings = run_once(params)
+        for phase, seconds in timings:
+            if not times.has_key(phase):
+                phases.append(phase)
+                times[phase] = []
+            times[phase].append(seconds)
+    return {
+        'format': FORMAT_VERSION,
+        'revision': _revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params,
+        'objects': objects,
+        'phases': [{'name': phase, 'min': min(times[phase]),
+                    'median': _median(times[phase]), 'times': times[phase]}
+                   for phase in phases],
+    }
+
+def compare(old, new, threshold):
+    """Print the phases' best times side by side, and return the number
+       of phases more than threshold (a fraction) slower in new than in old
+    """
+    if old['params'] != new['params']:
+        print "warning: the results were run with different parameters"
+        for key in sorted(new['params'].keys()):
+            if old['params'].get(key) != new['params'][key]:
+                print "  %s: %s -> %s" % (key, old['params'].get(key),
+                                          new['params'][key])
+        print
+    old_times = {}
+    for phase in old['phases']:
+        old_times[phase['name']] = phase['min']
+    print "%-32s %10s %10s %8s" % ('phase', old.get('revision') or 'old',
+                                   new.get('revision') or 'new', 'change')
+    slower = 0
+    for phase in new['phases']:
+        name, seconds = phase['name'], phase['min']
+        if not old_times.has_key(name):
+            print "%-32s %10s %10.3f" % (name, '-', seconds)
+            continue
+        before = old_times[name]
+        change = (seconds - before) / max(before, 1e-6)
+        flag = ''
+        if abs(seconds - before) < NOISE:
+            pass
+        elif change > threshold:
+            flag = 'SLOWER'
+            slower = slower + 1
+        elif change < -threshold:
+            flag = 'faster'
+        print "%-32s %10.3f %10.3f %+7.1f%% %s" % (name, before, seconds,
+                                                   change * 100, flag)
+    if old.get('objects') is not None and new.get('objects') is not None:
+        print "%-32s %10d %10d" % ('model objects built', old['objects'],
+                                   new['objects'])
+    return slower
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) / 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def _revision():
+    "Return the git revision of the source tree, if it is a checkout"
+    try:
+        process = subprocess.Popen(['git', 'describe', '--always', '--dirty'],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    output = process.communicate()[0].strip()
+    if process.returncode != 0:
+        return None
+    return output
+
+def _load(path):
+    f = open(path)
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def main(argv):
+    progname = os.path.basename(argv[0])
+    params = {'backend': 'postgres', 'tables': 1000, 'columns': 10,
+              'fk_density': 0.2, 'indexes': 1, 'seed': 1, 'latency': 0.0,
+              'fetch_latency': 0.0, 'arraysize': None, 'props_file': None,
+              'stream': 0, 'format': 'html', 'bench': 'doclet',
+              'props_lines': None}
+    repeat = 3
+    comparing = 0
+    threshold = 0.1
+    numeric = {'-t': ('tables', int), '-c': ('columns', int),
+               '-f': ('fk_density', float), '-x': ('indexes', int),
+               '-l': ('latency', float), '-L': ('fetch_latency', float),
+               '-a': ('arraysize', int)}
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hb:t:c:f:x:l:L:a:r:p:T:',
+                                   ['help', 'stream', 'compare', 'format=',
+                                    'model', 'props='])
+        for opt, value in opts:
+            if opt in ('-h', '--help'):
+                usage_exit(progname)
+            if opt == '-b':
+                if not BACKENDS.has_key(value):
+                    usage_exit(progname, "unknown backend: %s" % value)
+                params['backend'] = value
+            if numeric.has_key(opt):
+                key, convert = numeric[opt]
+                try:
+                    params[key] = convert(value)
+                except ValueError:
+                    usage_exit(progname, "%s must be a number: %s" % (opt, value))
+            if opt == '-r':
+                try:
+                    repeat = int(value)
+                except ValueError:
+                    usage_exit(progname, "repeat must be an integer: %s" % value)
+            if opt == '-T':
+                try:
+                    threshold = float(value)
+                except ValueError:
+                    usage_exit(progname, "threshold must be a number: %s" % value)
+            if opt == '-p':
+                params['props_file'] = value
+            if opt == '--stream':
+                params['stream'] = 1
+            if opt == '--format':
+                try:
+                    dbdoc.render.get_renderer(value)
+                except ValueError, e:
+                    usage_exit(progname, e)
+                params['format'] = value
+            if opt == '--model':
+                params['bench'] = 'model'
+            if opt == '--props':
+                try:
+                    params['props_lines'] = int(value)
+                except ValueError:
+                    usage_exit(progname, "lines must be an integer: %s" % value)
+                params['bench'] = 'props'
+            if opt == '--compare':
+                comparing = 1
+    except getopt.error, e:
+        usage_exit(progname, e)
+
+    if comparing:
+        if len(args) != 2:
+            usage_exit(progname)
+        if compare(_load(args[0]), _load(args[1]), threshold):
+            sys.exit(1)
+        return
+    if len(args) != 1 or repeat < 1:
+        usage_exit(progname)
+    if params['stream'] and params['bench'] != 'doclet':
+        usage_exit(progname, "--stream is for timing the doclet")
+    if params['arraysize']:
+        BACKENDS[params['backend']][0].ARRAYSIZE = params['arraysize']
+    dbdoc.progress.reporter = dbdoc.progress.Quiet()
+    if params['bench'] == 'props':
+        directory = tempfile.mkdtemp(prefix='dbdocbench')
+        try:
+            params['props_file'] = os.path.join(directory, 'bench.properties')
+            write_props_file(params['props_file'], params['props_lines'],
+                             params['seed'])
+            results = run(params, repeat)
+        finally:
+            shutil.rmtree(directory)
+        params['props_file'] = None
+    else:
+        results = run(params, repeat)
+    f = open(args[0], 'w')
+    try:
+        json.dump(results, f, indent=1, sort_keys=True)
+        f.write('\n')
+    finally:
+        f.close()
+    for phase in results['phases']:
+        print "%-32s %10.3f" % (phase['name'], phase['min'])
+    if results['objects'] is not None:
+        print "%-32s %10d" % ('model objects built', results['objects'])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Reports the changes between two schemas, each given either as a snapshot
+# file (as saved by pgdbdoc.py or oradbdoc.py -s) or as a live database in
+# the form backend:[dbmodule]:connstring, where backend is postgres,
+# pgcatalog or oracle, e.g. "pgcatalog::dbname=shop".  As with diff(1),
+# the exit status is 1 if the schemas differ.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import dbdoc.schemadiff
+import dbdoc.snapshot
+import dbdoc.batch
+import dbdoc.stats
+import getopt, sys, os
+
+def usage_exit(progname, msg=None):
+    if msg:
+        print msg
+        print
+    print "usage: %s [-o htmlfile] [--json jsonfile] [--stats] old new" % progname
+    sys.exit(2)
+
+def read_schema(source):
+    "Return the schema at source, a snapshot file or live database spec"
+    database = dbdoc.batch.parse_database(source)
+    if database is not None:
+        conn = database.connect()
+        try:
+            return database.schema_class(conn, database.label())
+        finally:
+            conn.close()
+    if not os.path.exists(source):
+        raise IOError, "no such snapshot file: %s" % source
+    schema = dbdoc.snapshot.load_any(source)
+    if schema is None:
+        raise IOError, "not a snapshot file: %s" % source
+    return schema
+
+def source_label(source):
+    """Return the name to show for source in the report, leaving out a
+       live database's connection settings (such as its password)
+    """
+    database = dbdoc.batch.parse_database(source)
+    if database is not None:
+        return database.label()
+    return source
+
+def main(argv):
+    progname = os.path.basename(argv[0])
+    html_file = None
+    json_file = None
+    show_stats = 0
+    try:
+        opts, args = getopt.getopt(argv[1:], 'ho:', ['help', 'html=', 'json=',
+                                                     'stats'])
+        for opt, value in opts:
+            if opt in ('-h','--help'):
+                usage_exit(progname)
+            if opt in ('-o','--html'):
+                html_file = value
+            if opt == '--json':
+                json_file = value
+            if opt == '--stats':
+                show_stats = 1
+    except getopt.error, e:
+        usage_exit(progname, e)
+    if len(args) != 2:
+        usage_exit(progname)
+    old_source, new_source = args
+
+    if show_stats:
+        dbdoc.stats.recorder = dbdoc.stats.Recorder()
+    try:
+        old = dbdoc.stats.timed('phase', 'read old schema', read_schema, old_source)
+        new = dbdoc.stats.timed('phase', 'read new schema', read_schema, new_source)
+    except IOError, e:
+        print e
+        sys.exit(1)
+    diff = dbdoc.stats.timed('phase', 'compare', dbdoc.schemadiff.diff_schemas,
+                             old, new)
+    if html_file:
+        diff.write_html(html_file, source_label(old_source),
+                        source_label(new_source))
+    if json_file:
+        diff.write_json(json_file)
+    print diff.summary()
+    dbdoc.stats.report(show_stats, None)
+    if not diff.is_empty():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
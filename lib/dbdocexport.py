@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#
+# Use of this software is subject to the terms specified in the LICENCE
+# file included in the distribution package, and also available via
+# https://github.com/purcell/dbdoc
+#
+
+#
+# Exports a schema, with its descriptions, as newline-delimited JSON with
+# one record per table (see dbdoc/export.py), for data catalogs and
+# warehouses to load.  The schema is either a snapshot file (as saved by
+# pgdbdoc.py or oradbdoc.py -s) or a live database in the form
+# backend:[dbmodule]:connstring, where backend is postgres, pgcatalog or
+# oracle, e.g. "pgcatalog::dbname=shop".  A live database is read a batch
+# of tables at a time, so memory use doesn't grow with the schema.
+#
+
+__author__ = 'Steve Purcell <stephen_purcell at yahoo dot com>'
+__version__ = '$Version: $'[11:-2]
+
+import dbdoc.export
+import dbdoc.descriptions
+import dbdoc.snapshot
+import dbdoc.batch
+import dbdoc.stats
+import dbdoc.progress
+import getopt, sys, os
+
+def usage_exit(progname, msg=None):
+    if msg:
+        print >>sys.stderr, msg
+        print >>sys.stderr
+    print >>sys.stderr, "usage: %s [-p propsfile] [-o outfile] [-z] [-q] [--stats] source [table_name ...]" % progname
+    sys.exit(2)
+
+def main(argv):
+    progname = os.path.basename(argv[0])
+    props_file = None
+    out_file = '-'
+    compress = 0
+    quiet = 0
+    show_stats = 0
+    try:
+        opts, args = getopt.getopt(argv[1:], 'hp:o:zq', ['help', 'props=', 'output=',
+                                                         'gzip', 'quiet', 'stats'])
+        for opt, value in opts:
+            if opt in ('-h','--help'):
+                usage_exit(progname)
+            if opt in ('-p','--props'):
+                props_file = value
+            if opt in ('-o','--output'):
+                out_file = value
+            if opt in ('-z','--gzip'):
+                compress = 1
+            if opt in ('-q','--quiet'):
+                quiet = 1
+            if opt == '--stats':
+                show_stats = 1
+    except getopt.error, e:
+        usage_exit(progname, e)
+    if len(args) < 1:
+        usage_exit(progname)
+    source = args[0]
+    table_names = args[1:] or None
+
+    # Progress and stats go to stderr, leaving stdout for the records
+    if quiet:
+        dbdoc.progress.reporter = dbdoc.progress.Quiet()
+    else:
+        dbdoc.progress.reporter = dbdoc.progress.Reporter(sys.stderr)
+    if show_stats:
+        dbdoc.stats.recorder = dbdoc.stats.Recorder()
+    if props_file:
+        descs = dbdoc.descriptions.load_file(props_file)
+    else:
+        descs = dbdoc.descriptions.Descriptions()
+
+    database = dbdoc.batch.parse_database(source)
+    if database is not None:
+        conn = database.connect()
+        try:
+            try:
+                schema = database.stream_class(conn, database.backend,
+                                               tables=table_names)
+            except ValueError, e:
+                print >>sys.stderr, e
+                sys.exit(1)
+            count = dbdoc.export.export(out_file, schema, descs, table_names,
+                                        compress)
+        finally:
+            conn.close()
+    else:
+        schema = dbdoc.snapshot.load_any(source)
+        if schema is None:
+            print >>sys.stderr, "not a snapshot file: %s" % source
+            sys.exit(1)
+        for name in table_names or ():
+            if schema.get_table(name) is None:
+                print >>sys.stderr, "no such table in schema: %s" % name
+                sys.exit(1)
+        count = dbdoc.export.export(out_file, schema, descs, table_names,
+                                    compress)
+    dbdoc.progress.reporter.message("exported %d tables" % count)
+    if table_names and count < len(table_names):
+        print >>sys.stderr, "%d of the named tables not found" % \
+              (len(table_names) - count)
+        sys.exit(1)
+    if show_stats:
+        for line in dbdoc.stats.recorder.summary():
+            print >>sys.stderr, line
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -6,20 +6,25 @@
 #
 
 #
-# Generates HTML information from an Oracle schema (and a properties file)
+# Generates HTML information from an Oracle schema (and a properties file),
+# or Markdown or JSON with -f
 
 __author__ = 'Andy Todd <andy47@halfcooked.com>'
 __version__ = '$Revision $'[11:-2]
 
 import dbdoc.dbdoc
+import dbdoc.render
 import dbdoc.oraschema
-import getopt, sys, os
+import dbdoc.snapshot
+import dbdoc.stats
+import dbdoc.progress
+import getopt, sys, os, time
 
 def usage_exit(progname, msg=None):
     if msg:
         print msg
         print
-    print "usage: %s [-d dbmodule] [-p propsfile] connstring outdir [table_name ...]" % progname
+    print "usage: %s [-d dbmodule] [-p propsfile] [-c connections] [-a arraysize] [-s snapshotfile] [-i] [-j jobs] [-f html|markdown|json|module.Class] [--atomic] [--stream] [--stats] [--trace tracefile] [-q] [--log-json] connstring outdir [table_name ...]" % progname
     sys.exit(2)
 
 def main(argv):
@@ -27,8 +32,21 @@ def main(argv):
     dblib = "cx_Oracle"
     props_file = None
     table_names = None
+    connections = 1
+    snapshot_file = None
+    incremental = 0
+    jobs = 1
+    atomic = 0
+    renderer = dbdoc.render.HTMLRenderer
+    stream = 0
+    show_stats = 0
+    trace_file = None
     try:
-        opts, args = getopt.getopt(sys.argv[1:], 'hd:p:', ['help', 'dblib=', 'props='])
+        opts, args = getopt.getopt(sys.argv[1:], 'hd:p:a:c:s:ij:f:q', ['help', 'dblib=', 'props=',
+                                                                    'arraysize=', 'connections=',
+                                                                    'snapshot=', 'incremental', 'jobs=', 'format=',
+                                                                    'atomic', 'stream', 'stats', 'trace=',
+                                                                    'quiet', 'log-json'])
         for opt, value in opts:
             if opt in ('-h','--help'):
                 usage_exit(progname)
@@ -36,10 +54,48 @@ def main(argv):
                 dblib = value
             if opt in ('-p','--props'):
                 props_file = value
+            if opt in ('-s','--snapshot'):
+                snapshot_file = value
+            if opt in ('-i','--incremental'):
+                incremental = 1
+            if opt in ('-j','--jobs'):
+                try:
+                    jobs = int(value)
+                except ValueError:
+                    usage_exit(progname, "jobs must be an integer: %s" % value)
+            if opt in ('-f','--format'):
+                try:
+                    renderer = dbdoc.render.get_renderer(value)
+                except ValueError, e:
+                    usage_exit(progname, e)
+            if opt == '--atomic':
+                atomic = 1
+            if opt == '--stream':
+                stream = 1
+            if opt == '--stats':
+                show_stats = 1
+            if opt == '--trace':
+                trace_file = value
+            if opt in ('-q','--quiet'):
+                dbdoc.progress.reporter = dbdoc.progress.Quiet()
+            if opt == '--log-json':
+                dbdoc.progress.reporter = dbdoc.progress.Reporter(json_lines=1)
+            if opt in ('-c','--connections'):
+                try:
+                    connections = int(value)
+                except ValueError:
+                    usage_exit(progname, "connections must be an integer: %s" % value)
+            if opt in ('-a','--arraysize'):
+                try:
+                    dbdoc.oraschema.ARRAYSIZE = int(value)
+                except ValueError:
+                    usage_exit(progname, "arraysize must be an integer: %s" % value)
     except getopt.error, e:
         usage_exit(progname, e)
     if len(args) < 2:
         usage_exit(progname)
+    if stream and (snapshot_file or jobs > 1):
+        usage_exit(progname, "--stream can't be combined with -s or -j")
 
     conn_string, outdir = args[:2]
     if len(args) > 2:
@@ -51,9 +107,45 @@ def main(argv):
         print "couldn't find Oracle access module '%s': %s" % (dblib, e)
         sys.exit(1)
 
-    conn = connector.connect(conn_string)
-    schema = dbdoc.oraschema.OracleSchema(conn, 'Oracle')
-    dbdoc.dbdoc.main(schema, outdir, props_file, table_names)
+    if show_stats or trace_file:
+        dbdoc.stats.recorder = dbdoc.stats.Recorder()
+
+    def connect():
+        return connector.connect(conn_string)
+    start = time.time()
+    # -s needs a connection of its own to fingerprint the catalog
+    if stream or snapshot_file or connections <= 1:
+        conn = connect()
+    else:
+        conn = None     # the loaders open their own connections
+    try:
+        schema = None
+        if stream:
+            if connections > 1:
+                schema = dbdoc.oraschema.OracleSchemaStream(conn, 'Oracle', connect, connections,
+                                                             tables=table_names)
+            else:
+                schema = dbdoc.oraschema.OracleSchemaStream(conn, 'Oracle', tables=table_names)
+        if snapshot_file:
+            fingerprint = (dbdoc.oraschema.get_fingerprint(conn), table_names)
+            schema = dbdoc.snapshot.load(snapshot_file, fingerprint)
+        if schema is None:
+            if connections > 1:
+                schema = dbdoc.oraschema.OracleSchema(None, 'Oracle', connect, connections,
+                                                      tables=table_names)
+            else:
+                schema = dbdoc.oraschema.OracleSchema(conn, 'Oracle',
+                                                      tables=table_names)
+            if snapshot_file:
+                dbdoc.snapshot.save(snapshot_file, schema, fingerprint)
+        dbdoc.stats.add('phase', 'read catalog', start, time.time() - start)
+        dbdoc.dbdoc.main(schema, outdir, props_file, table_names,
+                         incremental=incremental, jobs=jobs, atomic=atomic,
+                         renderer=renderer)
+    finally:
+        if conn is not None:
+            conn.close()
+    dbdoc.stats.report(show_stats, trace_file)
 
 
 if __name__ == '__main__':